@@ -0,0 +1,49 @@
+import functools
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import upgrade
+
+# migrations are loaded once per configuration, modules imported by
+# previous calls stay imported as well
+load_migrations = functools.lru_cache(maxsize=None)(loader.load_migrations)
+
+
+async def migrate(
+    pool: t.Union[asyncpg.pool.Pool, asyncpg.Connection],
+    config: model.Config,
+    target: t.Union[str, int] = 'head',
+    **kwargs: t.Any,
+) -> t.Optional[model.Revision]:
+    """Upgrades database to target revision, i.e. at application start-up.
+
+    Single connection is borrowed from the pool for the time of upgrade
+    and released back afterwards, no new connection is opened.
+    A connection can be passed instead of pool as well.
+    Remaining keyword arguments are passed to engine.upgrade.run.
+    """
+    logger.debug('Migrating to {target} using {pool}', target=target, pool=pool)
+
+    migrations = load_migrations(config)
+
+    if not isinstance(pool, asyncpg.pool.Pool):
+        return await upgrade.run(
+            config=config,
+            target_revision=target,
+            connection=pool,
+            migrations=migrations,
+            **kwargs,
+        )
+
+    async with pool.acquire() as connection:
+        return await upgrade.run(
+            config=config,
+            target_revision=target,
+            connection=connection,
+            migrations=migrations,
+            **kwargs,
+        )
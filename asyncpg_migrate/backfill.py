@@ -0,0 +1,194 @@
+import asyncio
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import constants
+from asyncpg_migrate.engine import tenants
+
+_Range = t.Tuple[int, int, int]
+Connect = t.Callable[[], t.Awaitable[asyncpg.Connection]]
+
+
+async def run(
+    connection: asyncpg.Connection,
+    name: str,
+    table: str,
+    statement: str,
+    key: str = 'id',
+    chunk_size: int = 10000,
+    parallel: int = 1,
+    connect: t.Optional[Connect] = None,
+    table_schema: t.Optional[str] = None,
+    table_name: str = constants.MIGRATIONS_TABLE,
+) -> int:
+    """Runs statement over table chunk by chunk, i.e. to backfill a column.
+
+    Statement receives lower (inclusive) and upper (exclusive) bound of
+    integer key as $1 and $2, for example::
+
+        update users set email_lower = lower(email)
+        where id >= $1 and id < $2
+
+    Every chunk of at most chunk_size rows is committed on its own
+    together with a checkpoint, hence the backfill must be called from
+    migration declaring ``transactional = False``. Backfill that has been
+    interrupted resumes from its last checkpoint when run again under the
+    same name. Checkpoints are kept next to the migrations table, in
+    current schema unless table_schema is given, so that tenant schemas
+    do not share them.
+
+    With parallel > 1 key space is split into as many ranges, each walked
+    over own connection opened with connect, i.e.
+    ``functools.partial(asyncpg.connect, dsn)``. Those connections get
+    search_path of connection.
+
+    Returns number of rows affected by statement.
+    """
+    if chunk_size < 1:
+        raise ValueError(f'Chunk size must be positive, got {chunk_size}')
+    elif parallel < 1:
+        raise ValueError(f'Parallel must be positive, got {parallel}')
+    elif parallel > 1 and connect is None:
+        raise ValueError('Parallel backfill needs connect to open more connections')
+    elif connection.is_in_transaction():
+        raise ValueError(
+            f'Backfill {name} commits every chunk and cannot run in a transaction, '
+            f'declare transactional = False in the migration',
+        )
+
+    if table_schema is None:
+        current_schema = await connection.fetchval('select current_schema()')
+        table_schema = tenants.quote_ident(current_schema or constants.MIGRATIONS_SCHEMA)
+    checkpoints = f'{table_schema}.{table_name}_backfill'
+    await connection.execute(
+        f"""
+        create table if not exists {checkpoints} (
+            name text not null,
+            range_start bigint not null,
+            range_end bigint not null,
+            position bigint not null,
+
+            primary key (name, range_start)
+        );
+        """,
+    )
+
+    ranges = await _ranges(connection, checkpoints, name, table, key, parallel)
+
+    async def _walk_range(
+        walk_connection: asyncpg.Connection,
+        key_range: _Range,
+    ) -> int:
+        range_start, range_end, position = key_range
+        affected = 0
+
+        while position < range_end:
+            upper = await walk_connection.fetchval(
+                f'select {key} from {table} where {key} >= $1 and {key} < $2 '
+                f'order by {key} offset $3 limit 1',
+                position,
+                range_end,
+                chunk_size,
+            )
+            if upper is None:
+                upper = range_end
+
+            async with walk_connection.transaction():
+                status = await walk_connection.execute(statement, position, upper)
+                await walk_connection.execute(
+                    f'update {checkpoints} set position = $3 '
+                    f'where name = $1 and range_start = $2',
+                    name,
+                    range_start,
+                    upper,
+                )
+
+            affected += _affected_rows(status)
+            position = upper
+            logger.debug(
+                'Backfill {name} reached {position} of [{start}, {end})',
+                name=name,
+                position=position,
+                start=range_start,
+                end=range_end,
+            )
+
+        return affected
+
+    if parallel == 1 or len(ranges) < 2:
+        affected = 0
+        for key_range in ranges:
+            affected += await _walk_range(connection, key_range)
+    else:
+        search_path = await connection.fetchval("select current_setting('search_path')")
+        slots = asyncio.Semaphore(parallel)
+
+        async def _walk_range_on_own_connection(key_range: _Range) -> int:
+            async with slots:
+                own_connection = await t.cast(Connect, connect)()
+                try:
+                    await own_connection.execute(
+                        "select set_config('search_path', $1, false)",
+                        search_path,
+                    )
+                    return await _walk_range(own_connection, key_range)
+                finally:
+                    await own_connection.close()
+
+        affected = sum(
+            await asyncio.gather(*(_walk_range_on_own_connection(r) for r in ranges)),
+        )
+
+    # finished backfill is forgotten, so that migration can be re-applied
+    await connection.execute(f'delete from {checkpoints} where name = $1', name)
+
+    logger.info(
+        'Backfill {name} finished, {affected} rows affected',
+        name=name,
+        affected=affected,
+    )
+    return affected
+
+
+async def _ranges(
+    connection: asyncpg.Connection,
+    checkpoints: str,
+    name: str,
+    table: str,
+    key: str,
+    parallel: int,
+) -> t.List[_Range]:
+    records = await connection.fetch(
+        f'select range_start, range_end, position from {checkpoints} '
+        f'where name = $1 order by range_start',
+        name,
+    )
+    if records:
+        logger.info('Resuming backfill {name}', name=name)
+        return [(r['range_start'], r['range_end'], r['position']) for r in records]
+
+    lowest, highest = await connection.fetchrow(
+        f'select min({key}), max({key}) from {table}',
+    )
+    if lowest is None:
+        return []
+
+    step = -(-(highest + 1 - lowest) // parallel)
+    ranges = [(start, min(start + step, highest + 1), start)
+              for start in range(lowest, highest + 1, step)]
+
+    async with connection.transaction():
+        await connection.executemany(
+            f'insert into {checkpoints} (name, range_start, range_end, position) '
+            f'values ($1, $2, $3, $4)',
+            [(name, *key_range) for key_range in ranges],
+        )
+    return ranges
+
+
+def _affected_rows(status: str) -> int:
+    # command tags look like UPDATE 10 or INSERT 0 10
+    count = status.rsplit(' ', 1)[-1]
+    return int(count) if count.isdigit() else 0
@@ -1,2 +1,3 @@
 MIGRATIONS_TABLE = '_migrations_'
 MIGRATIONS_SCHEMA = 'public'
+MIGRATIONS_MANIFEST_SUFFIX = '.manifest.json'
@@ -0,0 +1,413 @@
+import asyncio
+import datetime as dt
+import itertools
+import random
+import time
+import typing as t
+
+import asyncpg
+import asyncpg.exceptions
+from loguru import logger
+
+from asyncpg_migrate import hooks as lifecycle_hooks
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import lock
+from asyncpg_migrate.engine import migration
+
+Planner = t.Callable[[model.Migrations, t.Optional[model.Revision], t.Union[str, int]],
+                     t.Optional[model.MigrationsView],
+                     ]
+
+# upper bound of delay between retries of migration that timed out on a lock
+MAX_RETRY_DELAY = 30.0
+_jitter = random.SystemRandom()
+
+
+async def migrate(
+    config: model.Config,
+    target_revision: t.Union[str, int],
+    connection: asyncpg.Connection,
+    direction: model.MigrationDir,
+    plan: Planner,
+    migrations: t.Optional[model.Migrations],
+    options: model.RunOptions,
+) -> t.Optional[model.Revision]:
+    """Runs upgrade or downgrade planned by plan, see engine.upgrade.run."""
+    logger.info(
+        'Migrating {direction} to revision {target_revision}',
+        direction=direction.value,
+        target_revision=target_revision,
+    )
+
+    events = lifecycle_hooks.Emitter(
+        lifecycle_hooks.resolve(config, options.hooks, options.table_schema),
+        direction,
+        connection,
+    )
+    async with events, lock.advisory_lock(
+            connection,
+            key=lock.default_key(options.table_schema, options.table_name)
+            if options.lock_key is None else options.lock_key,
+            mode=options.lock_mode,
+            timeout=options.lock_timeout,
+    ) as acquired:
+        lock_wait = events.elapsed()
+        if not acquired:
+            return None
+        # revision is read only once lock is held, hence whoever waited for
+        # another node to finish sees its outcome and has nothing left to do
+        await migration.create_table(connection, options.table_schema, options.table_name)
+        db_revision = await migration.latest_revision(
+            connection,
+            options.table_schema,
+            options.table_name,
+        )
+        events.revision = db_revision
+        await events.emit(
+            model.EventType.BEFORE_PLAN,
+            revision=db_revision,
+            duration=lock_wait,
+        )
+
+        if migrations is None:
+            migrations = loader.load_migrations(config)
+        if not migrations:
+            logger.info('There are no migrations scripts, skipping')
+            return None
+
+        to_apply = plan(migrations, db_revision, target_revision)
+        if to_apply is None:
+            return None
+        loader.import_migrations(to_apply)
+
+        previous = migrations.previous
+        if direction == model.MigrationDir.UP:
+            ordered = list(to_apply.upgrade_iterator())
+        else:
+            ordered = list(to_apply.downgrade_iterator())
+        logger.debug(
+            'Applying migrations {revisions}',
+            revisions=[mig.revision for mig in ordered],
+        )
+
+        history = migration.HistoryWriter(
+            connection,
+            batch=options.batch_history,
+            table_schema=options.table_schema,
+            table_name=options.table_name,
+        )
+        try:
+            last_completed_revision = await run(
+                connection,
+                ordered,
+                direction,
+                history,
+                revision_after=lambda mig: mig.revision
+                if direction == model.MigrationDir.UP else previous(mig.revision),
+                pacing=options.pacing,
+                transaction_batch=options.transaction_batch,
+                timeouts=config.timeouts,
+                events=events,
+                measure_wal=config.measure_wal,
+            )
+        except Exception as ex:
+            logger.exception('Failed to migrate {direction}', direction=direction.value)
+            raise RuntimeError(str(ex))
+
+        if last_completed_revision is not None:
+            events.revision = last_completed_revision
+            if options.reload_schema_state:
+                await connection.reload_schema_state()
+
+        logger.info(
+            'Migrating {direction} did manage to finish at {revision} revision',
+            direction=direction.value,
+            revision=last_completed_revision,
+        )
+        return last_completed_revision
+
+
+async def run(
+    connection: asyncpg.Connection,
+    migrations: t.Iterable[model.Migration],
+    direction: model.MigrationDir,
+    history: migration.HistoryWriter,
+    revision_after: t.Callable[[model.Migration], model.Revision],
+    pacing: t.Optional[model.PacingCallable] = None,
+    transaction_batch: t.Optional[int] = None,
+    timeouts: t.Optional[model.Timeouts] = None,
+    events: t.Optional[lifecycle_hooks.Emitter] = None,
+    measure_wal: bool = False,
+) -> t.Optional[model.Revision]:
+    """Applies migrations in given order.
+
+    Consecutive transactional migrations are applied in a single
+    transaction together with their history, or in transactions of at
+    most transaction_batch migrations. Committing more often releases
+    locks taken by migrations early and lets next run resume from the
+    last commit instead of starting over if any migration fails.
+    Migrations declaring ``transactional = False`` run outside of
+    any transaction and their history is written on its own right after
+    each of them.
+
+    Each migration runs with lock_timeout and statement_timeout out of
+    timeouts, unless its module overrides them. Transactional migration
+    that failed to acquire a lock in time is rolled back to a savepoint
+    taken right before it and retried, up to lock_retries times, after
+    jittered exponential delay.
+
+    BEFORE_MIGRATION and AFTER_MIGRATION are emitted to events around
+    every migration. With measure_wal WAL written by each migration is
+    measured at the cost of two more round trips per migration.
+    """
+    if transaction_batch is not None and transaction_batch < 1:
+        raise ValueError(f'Transaction batch must be positive, got {transaction_batch}')
+
+    if timeouts is None:
+        timeouts = model.Timeouts()
+    if events is None:
+        events = lifecycle_hooks.Emitter((), direction, connection)
+
+    last_completed_revision = None
+
+    try:
+        for transactional, chunk in chunks(migrations, transaction_batch):
+            if transactional:
+                async with connection.transaction():
+                    for mig in chunk:
+                        revision = await _apply(
+                            connection,
+                            mig,
+                            direction,
+                            history,
+                            revision_after(mig),
+                            pacing,
+                            timeouts,
+                            events,
+                            measure_wal,
+                        )
+                    await history.flush()
+                last_completed_revision = revision
+            else:
+                for mig in chunk:
+                    revision = await _apply_non_transactional(
+                        connection,
+                        mig,
+                        direction,
+                        history,
+                        revision_after(mig),
+                        pacing,
+                        timeouts,
+                        events,
+                        measure_wal,
+                    )
+                    await history.flush()
+                    last_completed_revision = revision
+    except Exception:
+        if last_completed_revision is not None:
+            logger.error(
+                'Revision {revision} has been committed, '
+                'next run continues from there',
+                revision=last_completed_revision,
+            )
+        raise
+
+    return last_completed_revision
+
+
+def chunks(
+    migrations: t.Iterable[model.Migration],
+    transaction_batch: t.Optional[int],
+) -> t.Iterator[t.Tuple[bool, t.List[model.Migration]]]:
+    """Groups migrations into chunks applied in one transaction each.
+
+    Yields whether chunk is transactional together with its migrations,
+    migrations of non transactional chunk run on their own.
+    """
+    for transactional, group in itertools.groupby(
+            migrations,
+            key=lambda mig: mig.transactional,
+    ):
+        if not transactional or transaction_batch is None:
+            yield transactional, list(group)
+            continue
+
+        while True:
+            chunk = list(itertools.islice(group, transaction_batch))
+            if not chunk:
+                break
+            yield transactional, chunk
+
+
+async def _apply(
+    connection: asyncpg.Connection,
+    mig: model.Migration,
+    direction: model.MigrationDir,
+    history: migration.HistoryWriter,
+    revision: model.Revision,
+    pacing: t.Optional[model.PacingCallable],
+    timeouts: model.Timeouts,
+    events: lifecycle_hooks.Emitter,
+    measure_wal: bool,
+) -> model.Revision:
+    logger.debug(f'Applying {mig.revision}/{mig.label}')
+
+    events.migration = mig
+    await events.emit(
+        model.EventType.BEFORE_MIGRATION,
+        revision=mig.revision,
+        migration=mig,
+    )
+
+    wal_position = await migration.wal_position(connection) if measure_wal else None
+    started = time.monotonic()
+    await execute(
+        connection,
+        mig,
+        direction,
+        loader.migration_timeouts(mig, timeouts),
+    )
+    stats = model.MigrationStats(
+        duration=dt.timedelta(seconds=time.monotonic() - started),
+        wal_bytes=None if wal_position is None else
+        await migration.wal_position(connection) - wal_position,
+    )
+    logger.debug(
+        '{revision}/{label} took {duration} and wrote {wal_bytes} WAL bytes',
+        revision=mig.revision,
+        label=mig.label,
+        duration=stats.duration,
+        wal_bytes=stats.wal_bytes,
+    )
+
+    await history.save(
+        migration=mig,
+        direction=direction,
+        revision=revision,
+        stats=stats,
+    )
+    await events.emit(
+        model.EventType.AFTER_MIGRATION,
+        revision=mig.revision,
+        migration=mig,
+        duration=stats.duration,
+        wal_bytes=stats.wal_bytes,
+    )
+    events.migration = None
+    if pacing is not None:
+        await pacing(mig, direction)
+
+    return revision
+
+
+async def execute(
+    connection: asyncpg.Connection,
+    mig: model.Migration,
+    direction: model.MigrationDir,
+    timeouts: model.Timeouts,
+) -> None:
+    """Calls upgrade or downgrade of single migration, history is left alone.
+
+    Lock and statement timeouts are set for the call only, transactional
+    migration is retried on lock timeout, see run.
+    """
+    func = mig.upgrade if direction == model.MigrationDir.UP else mig.downgrade
+    settings = {
+        name: f"'{max(int(seconds * 1000), 1)}ms'"
+        for name, seconds in (
+            ('lock_timeout', timeouts.lock_timeout),
+            ('statement_timeout', timeouts.statement_timeout),
+        ) if seconds is not None
+    }
+
+    if not mig.transactional:
+        # session level settings, there is no transaction to scope them
+        for name, value in settings.items():
+            await connection.execute(f'set {name} = {value}')
+        try:
+            await func(connection)
+        finally:
+            for name in settings:
+                await connection.execute(f'reset {name}')
+        return
+
+    attempt = 0
+    while True:
+        try:
+            # savepoint, rolling back to it keeps migrations applied before
+            async with connection.transaction():
+                for name, value in settings.items():
+                    await connection.execute(f'set local {name} = {value}')
+                await func(connection)
+                # local settings outlive the savepoint, next migration
+                # must not inherit them
+                for name in settings:
+                    await connection.execute(f'set local {name} to default')
+            return
+        except asyncpg.exceptions.LockNotAvailableError:
+            if attempt >= timeouts.lock_retries:
+                raise
+            delay = _jitter.uniform(
+                0,
+                min(MAX_RETRY_DELAY, timeouts.lock_retry_delay * 2**attempt),
+            )
+            attempt += 1
+            logger.warning(
+                '{revision}/{label} could not acquire a lock in time, '
+                'retry {attempt} of {retries} in {delay:.2f} seconds',
+                revision=mig.revision,
+                label=mig.label,
+                attempt=attempt,
+                retries=timeouts.lock_retries,
+                delay=delay,
+            )
+            await asyncio.sleep(delay)
+
+
+async def _apply_non_transactional(
+    connection: asyncpg.Connection,
+    mig: model.Migration,
+    direction: model.MigrationDir,
+    history: migration.HistoryWriter,
+    revision: model.Revision,
+    pacing: t.Optional[model.PacingCallable],
+    timeouts: model.Timeouts,
+    events: lifecycle_hooks.Emitter,
+    measure_wal: bool,
+) -> model.Revision:
+    logger.debug(f'{mig.revision}/{mig.label} runs outside of transaction')
+
+    invalid_before = await migration.invalid_indexes(connection)
+    try:
+        return await _apply(
+            connection,
+            mig,
+            direction,
+            history,
+            revision,
+            pacing,
+            timeouts,
+            events,
+            measure_wal,
+        )
+    except Exception as ex:
+        if connection.is_in_transaction():
+            raise
+
+        # failed CREATE INDEX CONCURRENTLY leaves INVALID index behind,
+        # it is not used by queries but still has to be maintained
+        left_behind = await migration.invalid_indexes(connection) - invalid_before
+        if not left_behind:
+            raise
+
+        logger.error(
+            '{revision}/{label} left invalid indexes {indexes}',
+            revision=mig.revision,
+            label=mig.label,
+            indexes=sorted(left_behind),
+        )
+        raise RuntimeError(
+            f'{ex}; {mig.revision}/{mig.label} left invalid indexes behind: '
+            f'{", ".join(sorted(left_behind))}, drop them before retrying',
+        ) from ex
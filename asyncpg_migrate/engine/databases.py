@@ -0,0 +1,105 @@
+import typing as t
+from urllib.parse import urlsplit, urlunsplit
+import zlib
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import tenants
+from asyncpg_migrate.engine import upgrade
+
+
+def dsn_for(dsn: str, database_name: str) -> str:
+    """Returns dsn pointing to another database of the same server."""
+    return urlunsplit(urlsplit(dsn)._replace(path=f'/{database_name}'))
+
+
+async def create(
+    connection: asyncpg.Connection,
+    name: str,
+    template: t.Optional[str] = None,
+) -> None:
+    """Creates database, as a copy of template if given.
+
+    Copying a template takes as long as copying its files, regardless
+    of how many migrations it took to create it. Template must not have
+    any other connections open.
+    """
+    logger.debug('Creating database {name} from {template}', name=name, template=template)
+    statement = f'create database {tenants.quote_ident(name)}'
+    if template:
+        statement += f' template {tenants.quote_ident(template)}'
+    await connection.execute(statement)
+
+
+async def drop(connection: asyncpg.Connection, name: str) -> None:
+    """Drops database, terminating connections that are still open to it."""
+    is_template = await connection.fetchval(
+        'select datistemplate from pg_database where datname = $1',
+        name,
+    )
+    if is_template is None:
+        return
+
+    logger.debug('Dropping database {name}', name=name)
+    if is_template:
+        await connection.execute(
+            f'alter database {tenants.quote_ident(name)} is_template false',
+        )
+    await connection.execute(
+        'select pg_terminate_backend(pid) from pg_stat_activity '
+        'where datname = $1 and pid <> pg_backend_pid()',
+        name,
+    )
+    await connection.execute(f'drop database {tenants.quote_ident(name)}')
+
+
+async def template(
+    connection: asyncpg.Connection,
+    config: model.Config,
+    name: str,
+) -> bool:
+    """Ensures that template database of given name is migrated to head.
+
+    Template is migrated only if it does not exist yet, hence name should
+    change whenever migrations do, see loader.migrations_hash. Template is
+    marked as such only once migrated, so that one left behind by
+    interrupted run is recreated. Concurrent callers, i.e. pytest-xdist
+    workers, wait for the one creating the template.
+
+    Returns whether template has been created.
+    """
+    key = zlib.crc32(f'asyncpg-migrate:{name}'.encode())
+    await connection.execute('select pg_advisory_lock($1)', key)
+    try:
+        is_template = await connection.fetchval(
+            'select datistemplate from pg_database where datname = $1',
+            name,
+        )
+        if is_template:
+            return False
+        elif is_template is not None:
+            logger.info('Recreating incomplete template {name}', name=name)
+            await drop(connection, name)
+
+        logger.info('Migrating template {name}', name=name)
+        await create(connection, name)
+        template_connection = await asyncpg.connect(
+            dsn=dsn_for(config.database_dsn, name),
+        )
+        try:
+            await upgrade.run(
+                config=config,
+                target_revision='head',
+                connection=template_connection,
+                lock_mode=model.LockMode.NONE,
+            )
+        finally:
+            await template_connection.close()
+        await connection.execute(
+            f'alter database {tenants.quote_ident(name)} is_template true',
+        )
+        return True
+    finally:
+        await connection.execute('select pg_advisory_unlock($1)', key)
@@ -1,93 +1,94 @@
-import asyncio
 import typing as t
 
 import asyncpg
 from loguru import logger
 
-from asyncpg_migrate import loader
 from asyncpg_migrate import model
-from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import apply
 
 
 async def run(
     config: model.Config,
     target_revision: t.Union[str, int],
     connection: asyncpg.Connection,
+    migrations: t.Optional[model.Migrations] = None,
+    **options: t.Any,
 ) -> t.Optional[model.Revision]:
-    logger.info(
-        'Downgrading to revision {target_revision} has been triggered',
-        target_revision=target_revision,
+    """Downgrades database to target_revision, i.e. ``base`` or ``-1``.
+
+    Counterpart of engine.upgrade.run, taking the same arguments.
+    """
+    return await apply.migrate(
+        config,
+        target_revision,
+        connection,
+        model.MigrationDir.DOWN,
+        plan,
+        migrations,
+        model.RunOptions(**options),
     )
 
-    await migration.create_table(connection)
 
-    migrations = loader.load_migrations(config)
-    if not migrations:
-        logger.info('There are no migrations scripts, skipping')
-        return None
-    elif str(target_revision).lower() == 'head':
+def plan(
+    migrations: model.Migrations,
+    db_revision: t.Optional[model.Revision],
+    target_revision: t.Union[str, int],
+) -> t.Optional[model.MigrationsView]:
+    """Returns migrations that downgrade database from db_revision.
+
+    Migrations are to be applied in reverse order, None is returned
+    if there is nothing to apply.
+    """
+    if str(target_revision).lower() == 'head':
         # although revision can be decoded from 'head' string
         # in downgraded only 'base' is supported
         raise ValueError('Cannot downgrade using "head"')
-    else:
-        to_revision = 1 if str(
-            target_revision,
-        ).lower() == 'base' else int(target_revision)
-
-    maybe_db_revision = await migration.latest_revision(connection)
+    to_revision = migrations.base if str(
+        target_revision,
+    ).lower() == 'base' else int(target_revision)
 
-    if maybe_db_revision is None:
+    if db_revision is None:
         logger.debug('No migration has ever happened, skipping...')
         return None
-    elif maybe_db_revision == 0:
-        logger.debug('Dowgraded everything there could have been migrated, skipping...')
+    elif db_revision == 0:
+        logger.debug('Downgraded everything there could have been, skipping...')
         return None
-    else:
-        db_revision = maybe_db_revision
-        to_revision = 1 if abs(to_revision) == 0 else to_revision
 
-        if to_revision > 0:
-            if to_revision > len(migrations):
-                logger.error('Cannot downgrade further than I know scripts for')
-                return None
-        else:
-            previous_db_revision = db_revision - (abs(to_revision) - 1)
-            if previous_db_revision <= 0:
-                to_revision = 1
-            else:
-                to_revision = previous_db_revision
+    base = migrations[migrations.base]
+    if 0 < db_revision < base.revision and base.baseline:
+        raise ValueError(
+            f'Database is at revision {db_revision} that has been squashed into '
+            f'baseline {base.label}, it cannot be downgraded with it',
+        )
 
-        if db_revision == 1:
-            # special case, we are about to go back to the state as-if no
-            # migration has happened, we will remove all the scripts apart
-            # from first one
-            migrations_to_apply = migrations.slice(start=1, end=1)
+    to_revision = migrations.base if abs(to_revision) == 0 else to_revision
+    if to_revision > 0:
+        if to_revision > migrations.head:
+            logger.error('Cannot downgrade further than I know scripts for')
+            return None
+    else:
+        # stepping back by abs(to_revision) migrations that precede
+        # db_revision, revisions may not be contiguous
+        previous_db_revision = migrations.previous(
+            db_revision + 1,
+            steps=abs(to_revision),
+        )
+        if previous_db_revision <= 0:
+            to_revision = migrations.base
         else:
-            migrations_to_apply = migrations.slice(start=to_revision, end=db_revision)
+            to_revision = previous_db_revision
 
-        logger.debug(
-            f'Applying migrations {sorted(migrations_to_apply.keys(), reverse=True)}',
+    if 0 < to_revision < base.revision and base.baseline:
+        # downgrade of baseline drops the whole schema, it cannot stop
+        # at revision it has squashed
+        raise ValueError(
+            f'Revision {to_revision} has been squashed into baseline {base.label}, '
+            f'downgrade to {base.revision} or base instead',
         )
 
-        async with connection.transaction():
-            try:
-                for mig in migrations_to_apply.downgrade_iterator():
-                    logger.debug(f'Applying {mig.revision}/{mig.label}')
-
-                    await mig.downgrade(connection)
-                    await migration.save(
-                        migration=mig,
-                        direction=model.MigrationDir.DOWN,
-                        connection=connection,
-                    )
-                    await asyncio.sleep(1)
-                    last_completed_revision = mig.revision - 1
-
-                logger.info(
-                    'Upgraded did manage to finish at {last_completed_revision} revision',
-                    last_completed_revision=last_completed_revision,
-                )
-                return model.Revision(last_completed_revision)
-            except Exception as ex:
-                logger.exception('Failed to downgrade...')
-                raise RuntimeError(str(ex))
+    if db_revision == migrations.base:
+        # special case, we are about to go back to the state as-if no
+        # migration has happened, we will remove all the scripts apart
+        # from first one
+        return migrations.slice(start=migrations.base, end=migrations.base)
+    return migrations.slice(start=to_revision, end=db_revision)
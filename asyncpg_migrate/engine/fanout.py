@@ -0,0 +1,85 @@
+import asyncio
+import dataclasses
+import typing as t
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import upgrade
+
+
+def redact(dsn: str) -> str:
+    """Strips password out of DSN so it can be shown to the user."""
+    parts = urlsplit(dsn)
+    if parts.password is None:
+        return dsn
+    netloc = parts.netloc.rpartition('@')[2]
+    if parts.username:
+        netloc = f'{parts.username}@{netloc}'
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+async def run(
+    config: model.Config,
+    target_revision: t.Union[str, int],
+    dsns: t.Sequence[str],
+    direction: model.MigrationDir = model.MigrationDir.UP,
+    concurrency: int = 10,
+    **kwargs: t.Any,
+) -> t.List[model.TargetResult]:
+    """Migrates many databases concurrently.
+
+    Migrations are loaded once out of config.script_location and applied
+    to each database, at most concurrency of them at the time.
+    Failure of one database does not stop the others, it is reported
+    in its result instead. Results are ordered as dsns. Each database
+    runs with config pointing at it.
+    Remaining keyword arguments are passed to upgrade or downgrade run.
+    """
+    if concurrency < 1:
+        raise ValueError(f'Concurrency must be positive, got {concurrency}')
+
+    logger.info(
+        'Migrating {count} databases to {target_revision}',
+        count=len(dsns),
+        target_revision=target_revision,
+    )
+
+    engine_run = upgrade.run if direction == model.MigrationDir.UP else downgrade.run
+    migrations = loader.load_migrations(config)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run_one(dsn: str) -> model.TargetResult:
+        target = redact(dsn)
+        async with semaphore:
+            try:
+                connection = await asyncpg.connect(dsn=dsn)
+                try:
+                    revision = await engine_run(
+                        # i.e. metrics are labelled with the target database
+                        config=dataclasses.replace(
+                            config,
+                            database_dsn=dsn,
+                            database_name=urlsplit(dsn).path.lstrip('/') or target,
+                        ),
+                        target_revision=target_revision,
+                        connection=connection,
+                        migrations=migrations,
+                        **kwargs,
+                    )
+                finally:
+                    await connection.close()
+            except Exception as ex:
+                logger.opt(exception=ex).error(
+                    'Failed to migrate {target}',
+                    target=target,
+                )
+                return model.TargetResult(target=target, error=str(ex) or repr(ex))
+            else:
+                return model.TargetResult(target=target, revision=revision)
+
+    return list(await asyncio.gather(*(_run_one(dsn) for dsn in dsns)))
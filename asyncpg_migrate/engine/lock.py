@@ -0,0 +1,85 @@
+import contextlib
+import typing as t
+import zlib
+
+import asyncpg
+import asyncpg.exceptions
+from loguru import logger
+
+from asyncpg_migrate import model
+
+
+class LockNotAcquired(Exception):
+    ...
+
+
+def default_key(table_schema: str, table_name: str) -> int:
+    """Derives advisory lock key out of migrations table name.
+
+    Every migrations table, i.e. every tenant schema, is guarded
+    by its own lock.
+    """
+    return zlib.crc32(f'{table_schema}.{table_name}'.encode())
+
+
+@contextlib.asynccontextmanager
+async def advisory_lock(
+    connection: asyncpg.Connection,
+    key: int,
+    mode: model.LockMode = model.LockMode.WAIT,
+    timeout: t.Optional[float] = None,
+) -> t.AsyncIterator[bool]:
+    """Holds session level advisory lock for the duration of the block.
+
+    In WAIT mode connection blocks on the server until lock is released
+    by the holder, or raises LockNotAcquired once timeout seconds passed.
+    The timeout does not outlive the wait, even in caller's transaction.
+    In TRY mode lock is attempted once and False is yielded if someone
+    else holds it. NONE mode does not lock at all.
+    """
+    if timeout is not None and timeout <= 0:
+        raise ValueError(f'Lock timeout must be positive, got {timeout}')
+
+    if mode == model.LockMode.NONE:
+        yield True
+        return
+    elif mode == model.LockMode.TRY:
+        acquired = await connection.fetchval('select pg_try_advisory_lock($1)', key)
+        if not acquired:
+            logger.info('Lock {key} is held by someone else, skipping', key=key)
+            yield False
+            return
+    else:
+        logger.debug('Waiting for lock {key}', key=key)
+        try:
+            # inside of caller's transaction this is a savepoint, so the
+            # setting is put back explicitly instead of relying on `set local`
+            async with connection.transaction():
+                previous_timeout = None
+                if timeout is not None:
+                    previous_timeout = await connection.fetchval(
+                        "select current_setting('lock_timeout')",
+                    )
+                    await connection.execute(
+                        "select set_config('lock_timeout', $1, false)",
+                        f'{max(int(timeout * 1000), 1)}ms',
+                    )
+                await connection.execute('select pg_advisory_lock($1)', key)
+                if previous_timeout is not None:
+                    await connection.execute(
+                        "select set_config('lock_timeout', $1, false)",
+                        previous_timeout,
+                    )
+        except asyncpg.exceptions.LockNotAvailableError as ex:
+            raise LockNotAcquired(
+                f'Lock {key} has not been acquired within {timeout} seconds',
+            ) from ex
+
+    logger.debug('Acquired lock {key}', key=key)
+    try:
+        yield True
+    finally:
+        # lock of a closed connection is released by the server
+        if not connection.is_closed():
+            await connection.execute('select pg_advisory_unlock($1)', key)
+            logger.debug('Released lock {key}', key=key)
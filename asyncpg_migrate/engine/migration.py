@@ -1,9 +1,11 @@
+import contextlib
 import datetime as dt
 import functools
 import typing as t
 
 import asyncpg
 import asyncpg.exceptions
+import asyncpg.prepared_stmt
 from loguru import logger
 
 from asyncpg_migrate import constants
@@ -22,6 +24,22 @@ class MigrationProcessingError(Exception):
     ...
 
 
+class MigrationTableOutdated(Exception):
+    ...
+
+
+@contextlib.contextmanager
+def _trapped_errors() -> t.Iterator[None]:
+    try:
+        yield
+    except asyncpg.exceptions.UndefinedTableError as ex:
+        logger.exception('Migration table is gone, you need to run migrations first')
+        raise MigrationTableMissing() from ex
+    except Exception as ex:
+        logger.exception('Unknown error occurred')
+        raise MigrationProcessingError() from ex
+
+
 def error_trap(
     func: t.Callable[..., t.Coroutine[t.Any, t.Any, MT]],
     *args: A_T,
@@ -29,14 +47,8 @@ def error_trap(
 ) -> t.Callable[..., t.Coroutine[t.Any, t.Any, MT]]:
     @functools.wraps(func)
     async def wrapper(*args: A_T, **kwargs: K_T) -> MT:
-        try:
+        with _trapped_errors():
             return await func(*args, **kwargs)
-        except asyncpg.exceptions.UndefinedTableError as ex:
-            logger.exception('Migration table is gone, you need to run migrations first')
-            raise MigrationTableMissing() from ex
-        except Exception as ex:
-            logger.exception('Unknown error occurred')
-            raise MigrationProcessingError() from ex
 
     return wrapper
 
@@ -47,11 +59,9 @@ async def latest_revision(
     table_schema: str = constants.MIGRATIONS_SCHEMA,
     table_name: str = constants.MIGRATIONS_TABLE,
 ) -> t.Optional[model.Revision]:
-    await connection.reload_schema_state()
     val = await connection.fetchval(
         """
-            select revision from {table_schema}.{table_name} order
-            by timestamp desc limit 1;
+            select revision from {table_schema}.{table_name}_revision;
         """.format(
             table_schema=table_schema,
             table_name=table_name,
@@ -60,46 +70,251 @@ async def latest_revision(
     return model.Revision(val) if val is not None else None
 
 
-async def create_table(
+# Each entry upgrades migrations table layout by one version,
+# i.e. first entry moves it from layout 1 to layout 2.
+# Layout version is kept as a comment on the migrations table.
+# table_literal is the qualified table name as a string literal.
+LAYOUT_UPGRADES: t.Sequence[str] = (
+    # 2: history ordered by identity column instead of a timestamp and
+    #    a single-row table holding current revision
+    """
+    alter table {table_schema}.{table_name} add column id bigint;
+    update {table_schema}.{table_name} as m set id = ordered.id
+        from (
+            select ctid, row_number() over (order by timestamp) as id
+            from {table_schema}.{table_name}
+        ) as ordered
+        where m.ctid = ordered.ctid;
+    alter table {table_schema}.{table_name}
+        alter column id set not null,
+        alter column id add generated by default as identity,
+        add primary key (id);
+    select setval(
+        pg_get_serial_sequence({table_literal}, 'id'),
+        coalesce(max(id), 0) + 1,
+        false
+    ) from {table_schema}.{table_name};
+
+    create table {table_schema}.{table_name}_revision (
+        singleton boolean primary key default true check(singleton),
+        revision integer not null,
+
+        check(revision >= 0)
+    );
+    insert into {table_schema}.{table_name}_revision (revision)
+        select revision from {table_schema}.{table_name}
+        order by id desc limit 1;
+    """,
+    # 3: duration of a migration and WAL bytes it has written
+    """
+    alter table {table_schema}.{table_name}
+        add column duration interval,
+        add column wal_bytes bigint;
+    """,
+)
+LAYOUT = len(LAYOUT_UPGRADES) + 1
+
+
+async def table_layout(
     connection: asyncpg.Connection,
     table_schema: str = constants.MIGRATIONS_SCHEMA,
     table_name: str = constants.MIGRATIONS_TABLE,
-) -> None:
-    logger.opt(lazy=True).debug(
-        'Creating migrations table {table_schema}.{table_name}',
-        table_name=lambda: table_name,
-        table_schema=lambda: table_schema,
+) -> t.Optional[int]:
+    """Returns layout version of migrations table, None if there is no table."""
+    record = await connection.fetchrow(
+        """
+        select to_regclass($1) is not null as exists,
+            obj_description(to_regclass($1), 'pg_class') as layout
+        """,
+        f'{table_schema}.{table_name}',
     )
+    # offline recording reads no rows
+    if record is None or not record['exists']:
+        return None
+    return int(record['layout'] or 1)
+
+
+async def check_layout(
+    connection: asyncpg.Connection,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+    table_name: str = constants.MIGRATIONS_TABLE,
+) -> None:
+    """Ensures that migrations table exists in the latest layout.
+
+    Read-only counterpart of create_table, for commands that must not
+    alter the database.
+    """
+    layout = await table_layout(connection, table_schema, table_name)
+    if layout is None:
+        raise MigrationTableMissing()
+    elif layout < LAYOUT:
+        raise MigrationTableOutdated(
+            f'Migrations table {table_schema}.{table_name} has layout {layout} '
+            f'while the latest is {LAYOUT}, upgrade or downgrade to update it',
+        )
+
+
+# migrations table in the latest layout, see LAYOUT_UPGRADES
+CREATE_TABLE = """
+do $$ begin
+    create type {table_schema}.{table_name}_direction as enum (
+        '{migration_up}',
+        '{migration_down}'
+    );
+exception
+    when duplicate_object then null;
+end $$;
+
+create table if not exists {table_schema}.{table_name} (
+    id bigint generated by default as identity primary key,
+    revision integer not null,
+    label text not null,
+    timestamp timestamp not null,
+    direction {table_schema}.{table_name}_direction not null,
+    duration interval,
+    wal_bytes bigint,
+
+    check(revision >= 0)
+);
+
+create table if not exists {table_schema}.{table_name}_revision (
+    singleton boolean primary key default true check(singleton),
+    revision integer not null,
 
-    await connection.reload_schema_state()
+    check(revision >= 0)
+);
 
+comment on table {table_schema}.{table_name} is '{layout}';
+"""
+
+
+async def create_table(
+    connection: asyncpg.Connection,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+    table_name: str = constants.MIGRATIONS_TABLE,
+) -> None:
+    """Ensures that migrations table exists in the latest layout.
+
+    Missing table is created in the latest layout right away, tables
+    created by previous versions are upgraded in place.
+    """
     async with connection.transaction():
-        await connection.execute((
-            """
-            do $$ begin
-                create type {table_schema}.{table_name}_direction as enum (
-                    '{migration_up}',
-                    '{migration_down}'
-                );
-            exception
-                when duplicate_object then null;
-            end $$;
-
-            create table if not exists {table_schema}.{table_name} (
-                revision integer not null,
-                label text not null,
-                timestamp timestamp not null,
-                direction {table_schema}.{table_name}_direction not null,
-
-                check(revision >= 0)
-            );
-            """
-        ).format(
+        layout = await table_layout(connection, table_schema, table_name)
+        if layout is None:
+            logger.opt(lazy=True).debug(
+                'Creating migrations table {table_schema}.{table_name}',
+                table_name=lambda: table_name,
+                table_schema=lambda: table_schema,
+            )
+            await write_table(connection, table_schema, table_name)
+        elif layout < LAYOUT:
+            logger.info(
+                'Upgrading migrations table layout from {layout} to {latest}',
+                layout=layout,
+                latest=LAYOUT,
+            )
+            for layout_upgrade in LAYOUT_UPGRADES[layout - 1:]:
+                await connection.execute(
+                    layout_upgrade.format(
+                        table_schema=table_schema,
+                        table_name=table_name,
+                        # quoted schema, i.e. of a tenant, may contain quotes
+                        table_literal="'{}'".format(
+                            f'{table_schema}.{table_name}'.replace("'", "''"),
+                        ),
+                    ),
+                )
+            await connection.execute(
+                f'comment on table {table_schema}.{table_name} '
+                f"is '{LAYOUT}'",
+            )
+
+
+async def write_table(
+    connection: asyncpg.Connection,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+    table_name: str = constants.MIGRATIONS_TABLE,
+) -> None:
+    """Creates migrations table in the latest layout, unless it exists.
+
+    Unlike create_table, nothing is read, i.e. for offline scripts.
+    """
+    await connection.execute(
+        CREATE_TABLE.format(
             table_schema=table_schema,
             table_name=table_name,
             migration_up=model.MigrationDir.UP,
             migration_down=model.MigrationDir.DOWN,
-        ))
+            layout=LAYOUT,
+        ),
+    )
+
+
+async def invalid_indexes(connection: asyncpg.Connection) -> t.Set[str]:
+    """Lists indexes left INVALID, i.e. by failed concurrent build."""
+    records = await connection.fetch(
+        'select indexrelid::regclass::text from pg_catalog.pg_index '
+        'where not indisvalid',
+    )
+    return {record[0] for record in records}
+
+
+async def wal_position(connection: asyncpg.Connection) -> int:
+    """Returns current WAL insert position as number of bytes.
+
+    Insert position is used rather than pg_current_wal_lsn, the write
+    position, which only moves once WAL buffers are written out, usually
+    at commit. Migrations applied in one transaction would otherwise
+    report no WAL at all.
+    """
+    return int(await connection.fetchval('select pg_current_wal_insert_lsn()'))
+
+
+HistoryRecord = t.Tuple[int,
+                        str,
+                        dt.datetime,
+                        model.MigrationDir,
+                        t.Optional[dt.timedelta],
+                        t.Optional[int],
+                        ]
+
+
+def save_query(table_schema: str, table_name: str) -> str:
+    """Returns statement recording history entry, see save_args.
+
+    History entry and current revision are written by single statement
+    so that both stay in sync even outside of a transaction.
+    """
+    return (
+        f'with entry as ('
+        f'insert into {table_schema}.{table_name}'
+        f' (revision, label, timestamp, direction, duration, wal_bytes)'
+        f' values ($1, $2, $3, $4, $5, $6) returning revision'
+        f') insert into {table_schema}.{table_name}_revision (revision)'
+        f' select revision from entry'
+        f' on conflict (singleton) do update set revision = excluded.revision'
+    )
+
+
+def save_args(
+    migration: model.Migration,
+    direction: model.MigrationDir,
+    revision: t.Optional[model.Revision],
+    stats: t.Optional[model.MigrationStats],
+) -> HistoryRecord:
+    """Returns arguments of save_query, see save for revision."""
+    if revision is None and direction == model.MigrationDir.UP:
+        revision = migration.revision
+    elif revision is None:
+        revision = model.Revision(migration.revision - 1)
+    return (
+        revision,
+        migration.label,
+        dt.datetime.today(),
+        direction,
+        stats.duration if stats else None,
+        stats.wal_bytes if stats else None,
+    )
 
 
 @error_trap
@@ -109,50 +324,145 @@ async def save(
     connection: asyncpg.Connection,
     table_schema: str = constants.MIGRATIONS_SCHEMA,
     table_name: str = constants.MIGRATIONS_TABLE,
+    revision: t.Optional[model.Revision] = None,
+    stats: t.Optional[model.MigrationStats] = None,
 ) -> None:
+    """Records migration in the history.
+
+    Revision is the one database ends at, by default it is assumed
+    that migration downgrades to directly preceding revision.
+    """
     await connection.execute(
-        f'insert into '
-        f'{table_schema}.'
-        f'{table_name}'
-        f' (revision, label, timestamp, direction)'
-        f' values ($1, $2, $3, $4)',
-        (
-            migration.revision
-            if direction == model.MigrationDir.UP else migration.revision - 1
-        ),
-        migration.label,
-        dt.datetime.today(),
-        direction,
+        save_query(table_schema, table_name),
+        *save_args(migration, direction, revision, stats),
     )
 
 
-@error_trap
-async def list(
+class HistoryWriter:
+    """Writes history entries of a single engine run.
+
+    Insert statement is prepared once per writer. In batch mode entries
+    are buffered and written with single executemany on flush, otherwise
+    each entry is written immediately.
+    """
+    def __init__(
+        self,
+        connection: asyncpg.Connection,
+        batch: bool = False,
+        table_schema: str = constants.MIGRATIONS_SCHEMA,
+        table_name: str = constants.MIGRATIONS_TABLE,
+    ) -> None:
+        self.connection = connection
+        self.batch = batch
+        self.query = save_query(table_schema, table_name)
+        self.statement: t.Optional[asyncpg.prepared_stmt.PreparedStatement] = None
+        self.pending: t.List[HistoryRecord] = []
+
+    @error_trap
+    async def save(
+        self,
+        migration: model.Migration,
+        direction: model.MigrationDir,
+        revision: t.Optional[model.Revision] = None,
+        stats: t.Optional[model.MigrationStats] = None,
+    ) -> None:
+        args = save_args(migration, direction, revision, stats)
+        if self.batch:
+            self.pending.append(args)
+        else:
+            if self.statement is None:
+                self.statement = await self.connection.prepare(self.query)
+            await self.statement.fetchval(*args)
+
+    @error_trap
+    async def flush(self) -> None:
+        if self.pending:
+            logger.debug(
+                'Writing {count} history entries',
+                count=len(self.pending),
+            )
+            await self.connection.executemany(self.query, self.pending)
+            self.pending.clear()
+
+
+async def history(
     connection: asyncpg.Connection,
     table_schema: str = constants.MIGRATIONS_SCHEMA,
     table_name: str = constants.MIGRATIONS_TABLE,
-) -> model.MigrationHistory:
-    logger.debug('Getting a history of migrations')
+    since_revision: t.Optional[int] = None,
+    until_revision: t.Optional[int] = None,
+    since: t.Optional[dt.datetime] = None,
+    until: t.Optional[dt.datetime] = None,
+    limit: t.Optional[int] = None,
+    offset: int = 0,
+    prefetch: t.Optional[int] = None,
+) -> t.AsyncGenerator[model.MigrationHistoryEntry, None]:
+    """Yields entries of migrations history in order they were recorded.
 
-    history = model.MigrationHistory()
+    Entries are read with a cursor, prefetch at a time, so that long
+    histories are not held in memory. Revision and timestamp bounds are
+    inclusive, timestamps are local to the database just like the ones
+    recorded. Limit and offset apply to entries that match the bounds.
 
-    await connection.reload_schema_state()
-    async with connection.transaction():
-        async for record in connection.cursor("""
-                select revision, label, timestamp, direction from
-                    {table_schema}.{table_name}
-                    order by timestamp asc;
-                """.format(
-                table_schema=table_schema,
-                table_name=table_name,
-        )):
-            history.append(
-                model.MigrationHistoryEntry(
+    Cursor keeps a transaction open until iteration is over, iterator
+    that is left early should be closed with aclose.
+    """
+    conditions = []
+    args: t.List[t.Any] = []
+    for column, operator, value in (
+        ('revision', '>=', since_revision),
+        ('revision', '<=', until_revision),
+        ('timestamp', '>=', since),
+        ('timestamp', '<=', until),
+    ):
+        if value is not None:
+            args.append(value)
+            conditions.append(f'{column} {operator} ${len(args)}')
+    if limit is not None:
+        args.append(limit)
+    args.append(offset)
+
+    query = """
+        select revision, label, timestamp, direction, duration, wal_bytes from
+            {table_schema}.{table_name}
+            {where}
+            order by id asc
+            limit {limit} offset ${offset};
+    """.format(
+        table_schema=table_schema,
+        table_name=table_name,
+        where=f'where {" and ".join(conditions)}' if conditions else '',
+        limit='all' if limit is None else f'${len(args) - 1}',
+        offset=len(args),
+    )
+
+    logger.debug('Streaming a history of migrations')
+    with _trapped_errors():
+        async with connection.transaction():
+            async for record in connection.cursor(query, *args, prefetch=prefetch):
+                yield model.MigrationHistoryEntry(
                     revision=model.Revision(record['revision']),
                     label=record['label'],
                     timestamp=record['timestamp'],
                     direction=model.MigrationDir(record['direction']),
-                ),
-            )
+                    duration=record['duration'],
+                    wal_bytes=record['wal_bytes'],
+                )
+
 
-    return history
+async def list(
+    connection: asyncpg.Connection,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+    table_name: str = constants.MIGRATIONS_TABLE,
+    **filters: t.Any,
+) -> model.MigrationHistory:
+    """Returns migrations history, see history for filters."""
+    logger.debug('Getting a history of migrations')
+    return model.MigrationHistory([
+        entry async for entry in history(
+            connection,
+            table_schema=table_schema,
+            table_name=table_name,
+            **filters,
+        )
+    ])
@@ -0,0 +1,242 @@
+import datetime as dt
+import decimal
+import enum
+import re
+import textwrap
+import typing as t
+import uuid
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import apply
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+# string literals are matched as well, so that $n within them is left alone
+PARAMETER_PATTERN = re.compile(r"'(?:[^']|'')*'|\$(\d+)")
+
+
+class Raw(str):
+    """SQL expression rendered as is, instead of being quoted."""
+
+
+def literal(value: t.Any) -> str:
+    """Renders value as SQL literal."""
+    if value is None:
+        return 'null'
+    elif isinstance(value, Raw):
+        return value
+    elif isinstance(value, bool):
+        return 'true' if value else 'false'
+    elif isinstance(value, enum.Enum):
+        return literal(value.value)
+    elif isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    elif isinstance(value, dt.timedelta):
+        return f"interval '{value.total_seconds()} seconds'"
+    elif isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return literal(value.isoformat())
+    elif isinstance(value, bytes):
+        return f"'\\x{value.hex()}'::bytea"
+    elif isinstance(value, (list, tuple)):
+        return 'array[' + ', '.join(literal(item) for item in value) + ']'
+    elif isinstance(value, (str, uuid.UUID)):
+        return "'" + str(value).replace("'", "''") + "'"
+    raise TypeError(f'Cannot render {type(value).__name__} as SQL literal')
+
+
+class _NoTransaction:
+    async def __aenter__(self) -> None:
+        ...
+
+    async def __aexit__(self, *exc_info: t.Any) -> None:
+        ...
+
+
+class RecordingConnection:
+    """Stand-in for asyncpg.Connection recording statements instead of running them.
+
+    Query arguments are rendered as literals in place of $n parameters.
+    Nothing is read from a database, hence fetch returns no rows and
+    fetchrow and fetchval return None, queries they got are kept in reads.
+    Transactions are not recorded, script as a whole is expected to run
+    in a transaction.
+    """
+    def __init__(self) -> None:
+        self.statements: t.List[str] = []
+        self.reads: t.List[str] = []
+
+    def record(self, query: str, args: t.Sequence[t.Any] = ()) -> None:
+        statement = PARAMETER_PATTERN.sub(
+            lambda match: match.group(0) if match.group(1) is None else literal(
+                args[int(match.group(1)) - 1],
+            ),
+            query,
+        ) if args else query
+        statement = textwrap.dedent(statement).strip()
+        self.statements.append(statement if statement.endswith(';') else f'{statement};')
+
+    def _record_read(self, query: str, args: t.Sequence[t.Any]) -> None:
+        logger.info(
+            'Results of {query} are not available in offline mode',
+            query=query.strip(),
+        )
+        self.record(query, args)
+        self.reads.append(self.statements[-1])
+
+    async def execute(self, query: str, *args: t.Any, timeout: t.Any = None) -> str:
+        self.record(query, args)
+        return ''
+
+    async def executemany(
+        self,
+        command: str,
+        args: t.Iterable[t.Sequence[t.Any]],
+        timeout: t.Any = None,
+    ) -> None:
+        for command_args in args:
+            self.record(command, command_args)
+
+    async def fetch(
+        self,
+        query: str,
+        *args: t.Any,
+        timeout: t.Any = None,
+    ) -> t.List[t.Any]:
+        self._record_read(query, args)
+        return []
+
+    async def fetchrow(self, query: str, *args: t.Any, timeout: t.Any = None) -> None:
+        self._record_read(query, args)
+
+    async def fetchval(
+        self,
+        query: str,
+        *args: t.Any,
+        column: int = 0,
+        timeout: t.Any = None,
+    ) -> None:
+        self._record_read(query, args)
+
+    def transaction(self, **kwargs: t.Any) -> _NoTransaction:
+        return _NoTransaction()
+
+    def is_in_transaction(self) -> bool:
+        return True
+
+
+async def run(
+    config: model.Config,
+    target_revision: t.Union[str, int],
+    direction: model.MigrationDir,
+    from_revision: t.Optional[t.Union[str, int]] = None,
+    migrations: t.Optional[model.Migrations] = None,
+    transaction_batch: t.Optional[int] = None,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+    table_name: str = constants.MIGRATIONS_TABLE,
+) -> t.Optional[str]:
+    """Renders SQL script of migrations without connecting to a database.
+
+    Migrations are planned as if database was at from_revision, by default
+    at head for downgrade and empty for upgrade, in which case the script
+    creates migrations table as well. Otherwise the table is expected to
+    exist in the latest layout. Migrations run against RecordingConnection
+    and the script contains their statements followed by inserts into
+    migrations history, so that it can be applied with single
+    ``psql -1 -f``. Script of a run committing more than once, due to
+    transaction_batch or migrations declaring ``transactional = False``,
+    carries its own begin and commit and must be applied without -1.
+
+    Returns None if there is nothing to apply.
+    """
+    if migrations is None:
+        migrations = loader.load_migrations(config)
+    if not migrations:
+        logger.info('There are no migrations scripts, skipping')
+        return None
+
+    db_revision = None if from_revision is None else model.Revision.decode(
+        from_revision,
+        migrations.revisions(),
+    )
+    if direction == model.MigrationDir.UP:
+        to_apply = upgrade.plan(migrations, db_revision, target_revision)
+    else:
+        if db_revision is None:
+            db_revision = migrations.head
+        to_apply = downgrade.plan(migrations, db_revision, target_revision)
+    if to_apply is None:
+        return None
+
+    loader.import_migrations(to_apply)
+    previous = migrations.previous
+
+    def _revision_after(mig: model.Migration) -> model.Revision:
+        if direction == model.MigrationDir.UP:
+            return mig.revision
+        return previous(mig.revision)
+
+    if direction == model.MigrationDir.UP:
+        ordered = to_apply.upgrade_iterator()
+    else:
+        ordered = to_apply.downgrade_iterator()
+    chunks = list(apply.chunks(ordered, transaction_batch))
+    single_transaction = len(chunks) == 1 and chunks[0][0]
+
+    connection = RecordingConnection()
+    conn = t.cast(asyncpg.Connection, connection)
+    from_description = 'empty database' if db_revision is None else db_revision
+    sections = [
+        '\n'.join([
+            f'-- {direction.value} from {from_description} to {target_revision}, '
+            f'generated by asyncpg-migrate at {dt.datetime.utcnow().isoformat()}',
+            '-- apply with psql -v ON_ERROR_STOP=1 {}-f <file>'.format(
+                '-1 ' if single_transaction else '',
+            ),
+        ]),
+    ]
+
+    def _flush(comment: str) -> None:
+        sections.append('\n'.join([f'-- {comment}', *connection.statements]))
+        connection.statements.clear()
+
+    if direction == model.MigrationDir.UP and db_revision is None:
+        if not single_transaction:
+            connection.record('begin')
+        await migration.write_table(conn, table_schema, table_name)
+        if not single_transaction:
+            connection.record('commit')
+        _flush(f'migrations table {table_schema}.{table_name}')
+
+    history_query = migration.save_query(table_schema, table_name)
+    for transactional, chunk in chunks:
+        for idx, mig in enumerate(chunk):
+            if transactional and not single_transaction and idx == 0:
+                connection.record('begin')
+            await apply.execute(
+                conn,
+                mig,
+                direction,
+                loader.migration_timeouts(mig, config.timeouts),
+            )
+            revision, label, _, *rest = migration.save_args(
+                mig,
+                direction,
+                _revision_after(mig),
+                None,
+            )
+            # entry is timestamped once script is applied
+            connection.record(
+                history_query,
+                (revision, label, Raw('localtimestamp'), *rest),
+            )
+            if transactional and not single_transaction and idx == len(chunk) - 1:
+                connection.record('commit')
+            _flush(f'{mig.revision}/{mig.label}')
+
+    return '\n\n'.join(sections) + '\n'
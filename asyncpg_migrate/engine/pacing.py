@@ -0,0 +1,46 @@
+import asyncio
+import importlib
+
+from asyncpg_migrate import model
+
+
+def fixed_delay(seconds: float) -> model.PacingCallable:
+    """Creates pacing strategy that waits fixed amount of seconds.
+
+    The delay happens after each applied migration.
+    """
+    if seconds < 0:
+        raise ValueError(f'Delay must not be negative, got {seconds}')
+
+    async def _pacing(
+        migration: model.Migration,
+        direction: model.MigrationDir,
+    ) -> None:
+        await asyncio.sleep(seconds)
+
+    return _pacing
+
+
+def from_spec(spec: str) -> model.PacingCallable:
+    """Decodes pacing strategy out of CLI friendly specification.
+
+    Specification is either a number of seconds, i.e. ``0.5``,
+    or a path to async callable in ``package.module:callable`` form.
+    """
+    try:
+        seconds = float(spec)
+    except ValueError:
+        if ':' not in spec:
+            raise ValueError(
+                f'{spec} is neither number of seconds '
+                f'nor "module:callable" reference',
+            )
+    else:
+        return fixed_delay(seconds)
+
+    module_name, _, attr_name = spec.partition(':')
+    pacing = getattr(importlib.import_module(module_name), attr_name, None)
+    if not callable(pacing):
+        raise ValueError(f'{spec} does not point to a callable')
+
+    return pacing  # type: ignore
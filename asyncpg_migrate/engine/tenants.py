@@ -0,0 +1,109 @@
+import asyncio
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import upgrade
+
+
+def quote_ident(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+async def discover(
+    connection: asyncpg.Connection,
+    pattern: t.Optional[str] = None,
+    query: t.Optional[str] = None,
+) -> t.List[str]:
+    """Finds tenant schemas.
+
+    Schemas are either matched with LIKE pattern, i.e. ``tenant_%``,
+    or returned by query in its first column.
+    """
+    if (pattern is None) == (query is None):
+        raise ValueError('Either pattern or query must be given')
+
+    if pattern is not None:
+        records = await connection.fetch(
+            'select nspname from pg_catalog.pg_namespace '
+            'where nspname like $1 order by nspname',
+            pattern,
+        )
+    else:
+        records = await connection.fetch(query)
+
+    return [record[0] for record in records]
+
+
+async def run(
+    config: model.Config,
+    target_revision: t.Union[str, int],
+    schemas: t.Sequence[str],
+    direction: model.MigrationDir = model.MigrationDir.UP,
+    concurrency: int = 10,
+    search_path: t.Sequence[str] = (),
+    **kwargs: t.Any,
+) -> t.List[model.TargetResult]:
+    """Migrates each of tenant schemas in config.database_dsn.
+
+    Every schema keeps its own migrations table and migrations run with
+    search_path set to the schema, followed by optional search_path.
+    Migrations are loaded once and applied over a pool of at most
+    concurrency connections. Failure of one schema does not stop
+    the others, it is reported in its result instead.
+    Remaining keyword arguments are passed to upgrade or downgrade run.
+    """
+    if concurrency < 1:
+        raise ValueError(f'Concurrency must be positive, got {concurrency}')
+
+    logger.info(
+        'Migrating {count} schemas to {target_revision}',
+        count=len(schemas),
+        target_revision=target_revision,
+    )
+
+    engine_run = upgrade.run if direction == model.MigrationDir.UP else downgrade.run
+    migrations = loader.load_migrations(config)
+
+    async def _run_one(pool: asyncpg.pool.Pool, schema: str) -> model.TargetResult:
+        table_schema = quote_ident(schema)
+        try:
+            async with pool.acquire() as connection:
+                await connection.execute(
+                    'set search_path to {}'.format(
+                        ', '.join([
+                            table_schema,
+                            *(quote_ident(s) for s in search_path),
+                        ]),
+                    ),
+                )
+                # statements cached for previous schema must not be reused
+                await connection.reload_schema_state()
+
+                revision = await engine_run(
+                    config=config,
+                    target_revision=target_revision,
+                    connection=connection,
+                    migrations=migrations,
+                    table_schema=table_schema,
+                    **kwargs,
+                )
+        except Exception as ex:
+            logger.opt(exception=ex).error(
+                'Failed to migrate {schema}',
+                schema=schema,
+            )
+            return model.TargetResult(target=schema, error=str(ex) or repr(ex))
+        else:
+            return model.TargetResult(target=schema, revision=revision)
+
+    async with asyncpg.create_pool(
+            dsn=config.database_dsn,
+            min_size=1,
+            max_size=concurrency,
+    ) as pool:
+        return list(await asyncio.gather(*(_run_one(pool, s) for s in schemas)))
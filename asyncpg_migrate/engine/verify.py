@@ -0,0 +1,285 @@
+import asyncio
+import dataclasses
+import os
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import databases
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import upgrade
+
+# objects of migrations table (history, revision, backfill checkpoints...)
+# change with every run and are left out
+FINGERPRINT_QUERY = r"""
+with relations as (
+    select c.oid, n.nspname || '.' || c.relname as name, c.relkind
+    from pg_catalog.pg_class as c
+    join pg_catalog.pg_namespace as n on n.oid = c.relnamespace
+    where n.nspname not in ('pg_catalog', 'information_schema')
+        and n.nspname not like 'pg\_%'
+        and c.relname not like $1
+)
+select 'relation ' || r.name || ' ' || r.relkind::text
+from relations as r
+where r.relkind <> 'i'
+union all
+select 'column ' || r.name || '.' || a.attname || ' '
+    || pg_catalog.format_type(a.atttypid, a.atttypmod)
+    || case when a.attnotnull then ' not null' else '' end
+    || coalesce(' default ' || pg_catalog.pg_get_expr(d.adbin, d.adrelid), '')
+from relations as r
+join pg_catalog.pg_attribute as a on a.attrelid = r.oid
+left join pg_catalog.pg_attrdef as d
+    on d.adrelid = a.attrelid and d.adnum = a.attnum
+where r.relkind <> 'i' and a.attnum > 0 and not a.attisdropped
+union all
+select 'index ' || pg_catalog.pg_get_indexdef(r.oid)
+from relations as r
+where r.relkind = 'i'
+union all
+select 'constraint ' || r.name || ' ' || con.conname || ' '
+    || pg_catalog.pg_get_constraintdef(con.oid)
+from relations as r
+join pg_catalog.pg_constraint as con on con.conrelid = r.oid
+union all
+select 'type ' || n.nspname || '.' || ty.typname || ' ' || ty.typtype::text
+    || coalesce(' ' || (
+        select string_agg(e.enumlabel, ',' order by e.enumsortorder)
+        from pg_catalog.pg_enum as e where e.enumtypid = ty.oid
+    ), '')
+    || case when ty.typtype = 'd' then
+        ' ' || pg_catalog.format_type(ty.typbasetype, ty.typtypmod)
+        || coalesce(' ' || (
+            select string_agg(pg_catalog.pg_get_constraintdef(con.oid), ' '
+                order by con.conname)
+            from pg_catalog.pg_constraint as con where con.contypid = ty.oid
+        ), '')
+    else '' end
+from pg_catalog.pg_type as ty
+join pg_catalog.pg_namespace as n on n.oid = ty.typnamespace
+where n.nspname not in ('pg_catalog', 'information_schema')
+    and n.nspname not like 'pg\_%'
+    and ty.typtype in ('e', 'd', 'r')
+    and ty.typname not like $1
+"""
+
+Fingerprint = t.FrozenSet[str]
+
+
+class RoundTripError(Exception):
+    ...
+
+
+async def fingerprint(connection: asyncpg.Connection) -> Fingerprint:
+    """Describes tables, columns, indexes, constraints and types of database."""
+    records = await connection.fetch(
+        FINGERPRINT_QUERY,
+        constants.MIGRATIONS_TABLE.replace('_', '\\_') + '%',
+    )
+    return frozenset(record[0] for record in records)
+
+
+def _compare(expected: Fingerprint, actual: Fingerprint, message: str) -> None:
+    if expected == actual:
+        return
+    differences = [
+        *(f'missing {line}' for line in sorted(expected - actual)),
+        *(f'unexpected {line}' for line in sorted(actual - expected)),
+    ]
+    shown = '; '.join(differences[:5])
+    if len(differences) > 5:
+        shown += f' and {len(differences) - 5} more'
+    raise RoundTripError(f'{message}: {shown}')
+
+
+async def _round_trip(
+    config: model.Config,
+    migrations: model.Migrations,
+    connection: asyncpg.Connection,
+    revision: model.Revision,
+) -> None:
+    options: t.Dict[str, t.Any] = {
+        'config': config,
+        'connection': connection,
+        'migrations': migrations,
+        'lock_mode': model.LockMode.NONE,
+    }
+
+    before = await fingerprint(connection)
+    await upgrade.run(target_revision=revision, **options)
+    after_upgrade = await fingerprint(connection)
+
+    await downgrade.run(target_revision=-1, **options)
+    _compare(
+        before,
+        await fingerprint(connection),
+        'downgrade does not revert upgrade',
+    )
+
+    await upgrade.run(target_revision=revision, **options)
+    _compare(
+        after_upgrade,
+        await fingerprint(connection),
+        'upgrade after downgrade differs from the first one',
+    )
+
+
+async def _verify_chunk(
+    config: model.Config,
+    migrations: model.Migrations,
+    database_name: str,
+    chunk: t.Sequence[model.Revision],
+) -> t.List[model.TargetResult]:
+    results = []
+    failed: t.Optional[str] = None
+
+    connection = await asyncpg.connect(
+        dsn=databases.dsn_for(config.database_dsn, database_name),
+    )
+    try:
+        for revision in chunk:
+            label = migrations[revision].label
+            if failed is not None:
+                results.append(
+                    model.TargetResult(
+                        target=label,
+                        revision=revision,
+                        error=f'not verified, {failed} has failed',
+                    ),
+                )
+                continue
+
+            logger.debug('Verifying {label}', label=label)
+            try:
+                await _round_trip(config, migrations, connection, revision)
+            except Exception as ex:
+                logger.opt(exception=ex).error('{label} failed', label=label)
+                failed = label
+                results.append(
+                    model.TargetResult(
+                        target=label,
+                        revision=revision,
+                        error=str(ex) or repr(ex),
+                    ),
+                )
+            else:
+                results.append(model.TargetResult(target=label, revision=revision))
+    finally:
+        await connection.close()
+
+    return results
+
+
+async def _upgrade(
+    config: model.Config,
+    migrations: model.Migrations,
+    database_name: str,
+    revision: model.Revision,
+) -> None:
+    connection = await asyncpg.connect(
+        dsn=databases.dsn_for(config.database_dsn, database_name),
+    )
+    try:
+        await upgrade.run(
+            config=config,
+            target_revision=revision,
+            connection=connection,
+            migrations=migrations,
+            lock_mode=model.LockMode.NONE,
+        )
+    finally:
+        await connection.close()
+
+
+async def run(
+    config: model.Config,
+    concurrency: int = 4,
+    migrations: t.Optional[model.Migrations] = None,
+) -> t.List[model.TargetResult]:
+    """Verifies that downgrade of every revision reverts its upgrade.
+
+    Each revision is upgraded, downgraded and upgraded again and catalog
+    fingerprint, see fingerprint, is compared after every step.
+    Revisions are split into concurrency ranges, verified in parallel in
+    scratch databases created next to config.database_dsn. Scratch
+    database of a range is a copy of seed database that is upgraded up to
+    the range, so no revision is applied more often than needed.
+    Once revision fails, remaining ones of its range are not verified.
+
+    Hooks of config are not called. Results are ordered by revision,
+    target of each is the label of the migration.
+    """
+    if concurrency < 1:
+        raise ValueError(f'Concurrency must be positive, got {concurrency}')
+
+    if migrations is None:
+        migrations = loader.load_migrations(config)
+    config = dataclasses.replace(
+        config,
+        hooks=(),
+        metrics_textfile=None,
+        metrics_push_url=None,
+    )
+
+    revisions = migrations.revisions()
+    if not revisions:
+        return []
+    size = -(-len(revisions) // concurrency)
+    chunks = [revisions[idx:idx + size] for idx in range(0, len(revisions), size)]
+
+    logger.info(
+        'Verifying {count} revisions in {chunks} scratch databases',
+        count=len(revisions),
+        chunks=len(chunks),
+    )
+
+    prefix = f'{config.database_name[:20]}_verify_{os.getpid()}'
+    seed = f'{prefix}_seed'
+    names = [f'{prefix}_{idx}' for idx in range(len(chunks))]
+    tasks: t.List[t.Awaitable[t.List[model.TargetResult]]] = []
+    not_verified: t.List[model.TargetResult] = []
+
+    admin = await asyncpg.connect(dsn=config.database_dsn)
+    try:
+        await databases.create(admin, seed)
+        for idx, chunk in enumerate(chunks):
+            # range starts where seed is, seed moves on meanwhile
+            await databases.create(admin, names[idx], template=seed)
+            tasks.append(
+                asyncio.ensure_future(
+                    _verify_chunk(config, migrations, names[idx], chunk),
+                ),
+            )
+            if idx == len(chunks) - 1:
+                break
+
+            try:
+                await _upgrade(config, migrations, seed, chunk[-1])
+            except Exception as ex:
+                # failing revision is reported by verification of its range
+                logger.opt(exception=ex).error('Failed to upgrade seed database')
+                not_verified = [
+                    model.TargetResult(
+                        target=migrations[revision].label,
+                        revision=revision,
+                        error='not verified, preceding range has failed',
+                    ) for later_chunk in chunks[idx + 1:] for revision in later_chunk
+                ]
+                break
+
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            t.cast(asyncio.Future, task).cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for name in (seed, *names):
+            await databases.drop(admin, name)
+        await admin.close()
+
+    verified = [result for chunk_results in results for result in chunk_results]
+    return verified + not_verified
@@ -0,0 +1,129 @@
+import datetime as dt
+import importlib
+import time
+import types
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import metrics
+from asyncpg_migrate import model
+
+_registered: t.List[model.HookCallable] = []
+
+
+def register(hook: model.HookCallable) -> model.HookCallable:
+    """Registers hook called with events of every engine run.
+
+    Can be used as a decorator.
+    """
+    _registered.append(hook)
+    return hook
+
+
+def unregister(hook: model.HookCallable) -> None:
+    _registered.remove(hook)
+
+
+def from_spec(spec: str) -> model.HookCallable:
+    """Imports hook out of ``package.module:callable`` specification."""
+    module_name, _, attr_name = spec.partition(':')
+    if not module_name or not attr_name:
+        raise ValueError(f'{spec} is not a "module:callable" reference')
+
+    hook = getattr(importlib.import_module(module_name), attr_name, None)
+    if not callable(hook):
+        raise ValueError(f'{spec} does not point to a callable')
+
+    return hook  # type: ignore
+
+
+def resolve(
+    config: model.Config,
+    hooks: t.Sequence[model.HookCallable] = (),
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+) -> t.Tuple[model.HookCallable, ...]:
+    """Collects registered hooks, hooks from config and given hooks.
+
+    Metrics exporter is included if config enables it, samples of the
+    run are labelled with database of config and table_schema.
+    """
+    exporter = metrics.hook(config, table_schema)
+    return (
+        *_registered,
+        *(from_spec(spec) for spec in config.hooks),
+        *((exporter, ) if exporter else ()),
+        *hooks,
+    )
+
+
+class Emitter:
+    """Emits events of a single engine run to hooks.
+
+    Used as async context manager around the run, emits ON_ERROR
+    if the run fails and AFTER_RUN, carrying error if any, once it ends.
+    Failing hook is logged and does not affect the run.
+    """
+    def __init__(
+        self,
+        hooks: t.Sequence[model.HookCallable],
+        direction: model.MigrationDir,
+        connection: asyncpg.Connection,
+    ) -> None:
+        self.hooks = tuple(hooks)
+        self.direction = direction
+        self.connection = connection
+        self.revision: t.Optional[model.Revision] = None
+        self.migration: t.Optional[model.Migration] = None
+        self.started = time.monotonic()
+
+    def elapsed(self) -> dt.timedelta:
+        return dt.timedelta(seconds=time.monotonic() - self.started)
+
+    async def emit(self, event_type: model.EventType, **kwargs: t.Any) -> None:
+        if not self.hooks:
+            return
+
+        event = model.Event(
+            type=event_type,
+            direction=self.direction,
+            connection=self.connection,
+            **kwargs,
+        )
+        for hook in self.hooks:
+            try:
+                await hook(event)
+            except Exception as ex:
+                logger.opt(exception=ex).warning(
+                    'Hook {hook} failed on {event_type}',
+                    hook=hook,
+                    event_type=event_type,
+                )
+
+    async def __aenter__(self) -> 'Emitter':
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: t.Optional[t.Type[BaseException]],
+        exc: t.Optional[BaseException],
+        tb: t.Optional[types.TracebackType],
+    ) -> None:
+        duration = self.elapsed()
+        if exc is not None:
+            await self.emit(
+                model.EventType.ON_ERROR,
+                revision=self.migration.revision if self.migration else None,
+                migration=self.migration,
+                duration=duration,
+                error=exc,
+            )
+        await self.emit(
+            model.EventType.AFTER_RUN,
+            revision=self.revision,
+            duration=duration,
+            error=exc,
+        )
@@ -1,16 +1,38 @@
 import configparser
+import dataclasses
+import hashlib
 import importlib
 import importlib.util
+import inspect
+import json
 import os
 from pathlib import Path
+import re
+from stat import S_ISREG
 import types
+import typing as t
 from urllib.parse import quote
 
+import asyncpg
 from loguru import logger
 
+from asyncpg_migrate import constants
 from asyncpg_migrate import exceptions
 from asyncpg_migrate import model
 
+REVISION_PATTERN = re.compile(
+    r'^revision\s*(?::[^=]+)?=\s*(\d+)\s*(?:#.*)?$',
+    re.MULTILINE,
+)
+TRANSACTIONAL_PATTERN = re.compile(
+    r'^transactional\s*(?::[^=]+)?=\s*(True|False)\s*(?:#.*)?$',
+    re.MULTILINE,
+)
+BASELINE_PATTERN = re.compile(
+    r'^baseline\s*(?::[^=]+)?=\s*(True|False)\s*(?:#.*)?$',
+    re.MULTILINE,
+)
+
 
 def load_configuration(filename: Path) -> model.Config:
     logger.debug(
@@ -31,6 +53,37 @@ def load_configuration(filename: Path) -> model.Config:
     host = parser.get('migrations', 'db_host')
     port = parser.getint('migrations', 'db_port')
     database_name = parser.get('migrations', 'db_name')
+    manifest_cache = parser.getboolean(
+        'migrations',
+        'manifest_cache',
+        fallback=False,
+    )
+
+    timeouts = model.Timeouts(
+        lock_timeout=parser.getfloat('migrations', 'lock_timeout', fallback=None),
+        statement_timeout=parser.getfloat(
+            'migrations',
+            'statement_timeout',
+            fallback=None,
+        ),
+        lock_retries=parser.getint('migrations', 'lock_retries', fallback=0),
+        lock_retry_delay=parser.getfloat(
+            'migrations',
+            'lock_retry_delay',
+            fallback=0.5,
+        ),
+    )
+
+    hooks = tuple(
+        spec for spec in re.split(
+            r'[\s,]+',
+            parser.get('migrations', 'hooks', fallback=''),
+        ) if spec
+    )
+
+    metrics_textfile = parser.get('migrations', 'metrics_textfile', fallback=None)
+    metrics_push_url = parser.get('migrations', 'metrics_push_url', fallback=None)
+    measure_wal = parser.getboolean('migrations', 'measure_wal', fallback=False)
 
     script_location = Path(parser.get('migrations', 'script_location'))
     if not script_location.is_absolute():
@@ -40,64 +93,335 @@ def load_configuration(filename: Path) -> model.Config:
         script_location=script_location,
         database_dsn=f'postgres://{user}:{password}@{host}:{port}/{database_name}',
         database_name=database_name,
+        manifest_cache=manifest_cache,
+        timeouts=timeouts,
+        hooks=hooks,
+        metrics_textfile=Path(metrics_textfile) if metrics_textfile else None,
+        metrics_push_url=metrics_push_url or None,
+        measure_wal=measure_wal,
     )
 
 
+class LazyModule:
+    """Migration module that is imported when first needed."""
+    __slots__ = ('path', '_module')
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._module: t.Optional[types.ModuleType] = None
+
+    @property
+    def module(self) -> types.ModuleType:
+        if self._module is None:
+            logger.debug('Importing migration {path}', path=self.path)
+            self._module = load_python_module(self.path)
+        return self._module
+
+    def callable(self, name: str) -> model.MigrationCallable:
+        func = getattr(self.module, name, None)
+        if not func:
+            raise exceptions.MigrationLoadError(
+                f'{self.module} does not define {name} function',
+            )
+        return func  # type: ignore
+
+
+class LazyMigrationCallable:
+    """Stands for upgrade or downgrade function of not yet imported module."""
+    __slots__ = ('module', 'name')
+
+    def __init__(self, module: LazyModule, name: str) -> None:
+        self.module = module
+        self.name = name
+
+    def resolve(self) -> model.MigrationCallable:
+        return self.module.callable(self.name)
+
+    async def __call__(self, connection: asyncpg.Connection) -> None:
+        await self.resolve()(connection)  # type: ignore
+
+
 def load_migrations(config: model.Config) -> model.Migrations:
+    """Discovers migrations in config.script_location.
+
+    Revision is read out of migration source without importing it,
+    unless it cannot be found there. Modules are imported once
+    their upgrade or downgrade are needed, see import_migrations.
+
+    Migration declaring ``baseline = True`` stands for all migrations up to
+    its revision, see asyncpg_migrate.squash, those are not loaded.
+    If there are more baselines, the latest one wins.
+
+    With config.manifest_cache enabled, discovered revisions are kept in
+    manifest file next to script_location and scripts whose size and
+    modification time did not change are not read again. Scripts are
+    hashed for the manifest only, see migrations_hash.
+    """
     logger.debug('Loading migrations via {config}', config=config)
 
     all_migrations = model.Migrations()
 
+    manifest = load_manifest(config) if config.manifest_cache else {}
+    entries = {}
+    lazy_modules = {}
+
     for f in config.script_location.iterdir():
-        if not f.is_file():
+        stat = f.stat()
+        if not S_ISREG(stat.st_mode):
             continue
 
-        module = load_python_module(f)
+        lazy_module = LazyModule(f)
+
+        entry = manifest.get(f.name)
+        if entry is None or (entry.mtime_ns, entry.size) != (
+                stat.st_mtime_ns,
+                stat.st_size,
+        ):
+            entry = _discover_migration(
+                f,
+                stat,
+                lazy_module,
+                all_migrations,
+                with_sha256=config.manifest_cache,
+            )
+        entries[f.name] = entry
+        lazy_modules[f.name] = lazy_module
 
-        revision = getattr(module, 'revision', None)
-        upgrade_callable = getattr(module, 'upgrade', None)
-        downgrade_callable = getattr(module, 'downgrade', None)
+    # latest baseline supersedes every script up to its revision
+    baseline = max(
+        (entry.revision for entry in entries.values() if entry.baseline),
+        default=None,
+    )
 
-        # checks
-        try:
-            revision = model.Revision.decode(
-                revision,
-                all_migrations.revisions(),
+    for name, entry in entries.items():
+        if baseline is not None and entry.revision <= baseline and not (
+                entry.baseline and entry.revision == baseline):
+            logger.debug(
+                '{label} has been squashed into baseline {baseline}',
+                label=entry.label,
+                baseline=baseline,
             )
-        except (TypeError, ValueError) as ex:
+            continue
+
+        if entry.revision in all_migrations:
+            duplicated_migration = all_migrations[entry.revision]
             raise exceptions.MigrationLoadError(
-                f'Value ({revision}, {type(revision)}) '
-                f'cannot be parsed as valid revision',
-            ) from ex
-        else:
-            if revision in all_migrations:
-                duplicated_migration = all_migrations[revision]
-                raise exceptions.MigrationLoadError(
-                    f'{revision} has been already loaded, '
-                    f'there is duplicate in '
-                    f'{duplicated_migration.path}',
-                )
-            if not upgrade_callable:
-                raise exceptions.MigrationLoadError(
-                    f'{module} does not define upgrade function',
-                )
-            if not downgrade_callable:
-                raise exceptions.MigrationLoadError(
-                    f'{module} does not define downgrade function',
-                )
+                f'{entry.revision} has been already loaded, '
+                f'there is duplicate in '
+                f'{duplicated_migration.path}',
+            )
 
+        lazy_module = lazy_modules[name]
         migration = model.Migration(
-            revision=revision,
-            label=f.name,
-            path=f,
-            upgrade=upgrade_callable,
-            downgrade=downgrade_callable,
+            revision=entry.revision,
+            label=entry.label,
+            path=entry.path,
+            upgrade=t.cast(
+                model.MigrationCallable,
+                LazyMigrationCallable(lazy_module, 'upgrade'),
+            ),
+            downgrade=t.cast(
+                model.MigrationCallable,
+                LazyMigrationCallable(lazy_module, 'downgrade'),
+            ),
+            transactional=entry.transactional,
+            baseline=entry.baseline,
         )
         all_migrations[migration.revision] = migration
 
+    if config.manifest_cache and entries != manifest:
+        save_manifest(config, entries)
+
     return all_migrations
 
 
+def _discover_migration(
+    f: Path,
+    stat: os.stat_result,
+    lazy_module: LazyModule,
+    all_migrations: model.Migrations,
+    with_sha256: bool,
+) -> model.ManifestEntry:
+    content = f.read_bytes()
+    source = content.decode()
+
+    match = REVISION_PATTERN.search(source)
+    revision = match.group(1) if match else getattr(
+        lazy_module.module,
+        'revision',
+        None,
+    )
+
+    try:
+        revision = model.Revision.decode(
+            revision,
+            all_migrations.revisions(),
+        )
+    except (TypeError, ValueError) as ex:
+        raise exceptions.MigrationLoadError(
+            f'Value ({revision}, {type(revision)}) '
+            f'cannot be parsed as valid revision',
+        ) from ex
+
+    return model.ManifestEntry(
+        revision=revision,
+        label=f.name,
+        path=f,
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        sha256=hashlib.sha256(content).hexdigest() if with_sha256 else None,
+        transactional=_discover_transactional(source),
+        baseline=_discover_baseline(source),
+    )
+
+
+def _discover_transactional(source: str) -> bool:
+    # migrations are transactional unless module says otherwise,
+    # actual value is verified once module is imported
+    match = TRANSACTIONAL_PATTERN.search(source)
+    return match is None or match.group(1) == 'True'
+
+
+def _discover_baseline(source: str) -> bool:
+    match = BASELINE_PATTERN.search(source)
+    return match is not None and match.group(1) == 'True'
+
+
+def manifest_path(config: model.Config) -> Path:
+    script_location = config.script_location
+    return script_location.parent / (
+        f'.{script_location.name}{constants.MIGRATIONS_MANIFEST_SUFFIX}'
+    )
+
+
+def load_manifest(config: model.Config) -> t.Dict[str, model.ManifestEntry]:
+    path = manifest_path(config)
+    try:
+        raw_entries = json.loads(path.read_text())['entries']
+        return {
+            raw['label']: model.ManifestEntry(
+                revision=model.Revision(raw['revision']),
+                label=raw['label'],
+                path=config.script_location / raw['label'],
+                mtime_ns=raw['mtime_ns'],
+                size=raw['size'],
+                sha256=raw['sha256'],
+                transactional=raw['transactional'],
+                baseline=raw['baseline'],
+            )
+            for raw in raw_entries
+        }
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        logger.warning(
+            'Ignoring unreadable manifest {path}: {ex}',
+            path=path,
+            ex=ex,
+        )
+        return {}
+
+
+def save_manifest(
+    config: model.Config,
+    entries: t.Dict[str, model.ManifestEntry],
+) -> None:
+    path = manifest_path(config)
+    logger.debug('Saving manifest {path}', path=path)
+
+    content = json.dumps({
+        'entries': [{
+            'revision': entry.revision,
+            'label': entry.label,
+            'mtime_ns': entry.mtime_ns,
+            'size': entry.size,
+            'sha256': entry.sha256,
+            'transactional': entry.transactional,
+            'baseline': entry.baseline,
+        } for entry in sorted(entries.values(), key=lambda e: e.revision)],
+    })
+
+    # manifest is only a cache, failing to write it must not stop migrations
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}')
+    try:
+        tmp_path.write_text(content)
+        tmp_path.replace(path)
+    except OSError as ex:
+        logger.warning(
+            'Failed to save manifest {path}: {ex}',
+            path=path,
+            ex=ex,
+        )
+
+
+def migrations_hash(config: model.Config) -> str:
+    """Returns hash of migrations scripts that changes whenever any of them does.
+
+    Hashes kept in the manifest are used if config.manifest_cache is set.
+    """
+    migrations = load_migrations(config)
+    entries = load_manifest(config) if config.manifest_cache else {}
+
+    digest = hashlib.sha256()
+    for migration in migrations.values():
+        entry = entries.get(migration.label)
+        sha256 = entry.sha256 if entry and entry.sha256 else hashlib.sha256(
+            migration.path.read_bytes(),
+        ).hexdigest()
+        digest.update(f'{migration.revision}:{migration.label}:{sha256}\n'.encode())
+    return digest.hexdigest()
+
+
+def import_migrations(migrations: model.MigrationsView) -> None:
+    """Imports modules of given migrations.
+
+    Ensures that both upgrade and downgrade functions are present
+    and that revision, transactional and baseline flags read out of
+    the source are right.
+    """
+    for migration in migrations.values():
+        for func in (migration.upgrade, migration.downgrade):
+            if isinstance(func, LazyMigrationCallable):
+                func.resolve()
+                module = func.module.module
+                revision = getattr(module, 'revision', None)
+                if revision != migration.revision:
+                    raise exceptions.MigrationLoadError(
+                        f'{migration.path} declares revision={revision} but '
+                        f'revision {migration.revision} has been read out of '
+                        f'its source, i.e. out of a docstring or a comment',
+                    )
+                for flag, default in (('transactional', True), ('baseline', False)):
+                    value = getattr(module, flag, default)
+                    if bool(value) != getattr(migration, flag):
+                        raise exceptions.MigrationLoadError(
+                            f'{migration.path} sets {flag}={value} '
+                            f'in a way that cannot be read out of its source, '
+                            f'assign True or False literal instead',
+                        )
+
+
+def migration_timeouts(
+    migration: model.Migration,
+    defaults: model.Timeouts,
+) -> model.Timeouts:
+    """Returns timeouts of migration.
+
+    Module of migration can override any of defaults by defining
+    attribute of the same name, i.e. ``lock_timeout = 2``.
+    """
+    module = migration.upgrade.module.module if isinstance(
+        migration.upgrade,
+        LazyMigrationCallable,
+    ) else inspect.getmodule(migration.upgrade)
+
+    overrides = {
+        f.name: getattr(module, f.name)
+        for f in dataclasses.fields(defaults) if hasattr(module, f.name)
+    }
+    return dataclasses.replace(defaults, **overrides) if overrides else defaults
+
+
 def load_python_module(path: Path) -> types.ModuleType:
     module_id = path.name.replace('.py', '')
 
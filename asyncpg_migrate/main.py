@@ -1,4 +1,8 @@
 import asyncio
+import configparser
+import contextlib
+import datetime as dt
+import json
 from pathlib import Path
 import sys
 import typing as t
@@ -11,9 +15,15 @@ from tabulate import tabulate
 import asyncpg_migrate
 from asyncpg_migrate import loader
 from asyncpg_migrate import model
+from asyncpg_migrate import squash
 from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import fanout
 from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import offline
+from asyncpg_migrate.engine import pacing as pacing_strategy
+from asyncpg_migrate.engine import tenants
 from asyncpg_migrate.engine import upgrade
+from asyncpg_migrate.engine import verify
 
 __name__ = 'asyncpg-migrate'
 
@@ -27,6 +37,272 @@ except AttributeError:
         return asyncio.get_event_loop().run_until_complete(coro)
 
 
+@contextlib.asynccontextmanager
+async def _connect(dsn: str) -> t.AsyncIterator[asyncpg.Connection]:
+    connection = await asyncpg.connect(dsn=dsn)
+    try:
+        yield connection
+    finally:
+        await connection.close()
+
+
+def _decode_pacing(
+    ctx: click.Context,
+    param: click.Parameter,
+    value: t.Optional[str],
+) -> t.Optional[model.PacingCallable]:
+    if value is None:
+        return None
+    try:
+        return pacing_strategy.from_spec(value)
+    except (ImportError, ValueError) as ex:
+        raise click.BadParameter(str(ex))
+
+
+def _decode_lock_mode(
+    ctx: click.Context,
+    param: click.Parameter,
+    value: str,
+) -> model.LockMode:
+    return model.LockMode(value.upper())
+
+
+def _decode_transaction_batch(
+    ctx: click.Context,
+    param: click.Parameter,
+    value: str,
+) -> t.Optional[int]:
+    if value.lower() == 'all':
+        return None
+    elif value.lower() == 'each':
+        return 1
+    try:
+        batch = int(value)
+    except ValueError:
+        batch = 0
+    if batch < 1:
+        raise click.BadParameter(
+            f'{value} is neither "all", "each" nor positive number',
+        )
+    return batch
+
+
+pacing_option = click.option(
+    '--pacing',
+    metavar='<seconds|module:callable>',
+    default=None,
+    callback=_decode_pacing,
+    help='Pause after each migration, either fixed number of seconds '
+    'or async callable. No pause by default',
+)
+
+batch_history_option = click.option(
+    '--batch-history',
+    is_flag=True,
+    default=False,
+    help='Write migrations history in single batch at the end of the run',
+)
+
+lock_mode_option = click.option(
+    '--lock-mode',
+    type=click.Choice([m.value for m in model.LockMode], case_sensitive=False),
+    default=model.LockMode.WAIT.value,
+    show_default=True,
+    callback=_decode_lock_mode,
+    help='Whether to wait for other node migrating the database, '
+    'skip if it does or not lock at all',
+)
+
+lock_key_option = click.option(
+    '--lock-key',
+    type=int,
+    default=None,
+    help='Advisory lock key, derived from migrations table name by default',
+)
+
+lock_timeout_option = click.option(
+    '--lock-timeout',
+    metavar='<seconds>',
+    type=click.FloatRange(min=0.001),
+    default=None,
+    help='Fail if lock has not been acquired in time, waits forever by default',
+)
+
+transaction_batch_option = click.option(
+    '--transaction',
+    'transaction_batch',
+    metavar='<all|each|N>',
+    default='all',
+    show_default=True,
+    callback=_decode_transaction_batch,
+    help='Apply all migrations in single transaction, commit after each '
+    'of them or after every N of them. Failed run resumes from the last commit',
+)
+
+targets_option = click.option(
+    '-t',
+    '--target',
+    'targets',
+    metavar='<dsn|config>',
+    multiple=True,
+    help='Database DSN or configuration file to migrate instead of the one '
+    'from --config. Can be repeated to migrate many databases concurrently',
+)
+
+concurrency_option = click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help='How many of --target databases or tenant schemas are migrated '
+    'at the same time',
+)
+
+schema_pattern_option = click.option(
+    '--schema-pattern',
+    metavar='<pattern>',
+    default=None,
+    help='Migrates every schema matching LIKE pattern, i.e. tenant_%, '
+    'each with its own migrations table',
+)
+
+schema_query_option = click.option(
+    '--schema-query',
+    metavar='<sql>',
+    default=None,
+    help='Same as --schema-pattern but schemas are returned by query',
+)
+
+sql_option = click.option(
+    '--sql',
+    is_flag=True,
+    default=False,
+    help='Prints SQL script of migrations instead of applying them, '
+    'database is not connected',
+)
+
+from_revision_option = click.option(
+    '--from-revision',
+    metavar='<revision>',
+    default=None,
+    help='Revision --sql script starts from, empty database for upgrade '
+    'and head for downgrade by default',
+)
+
+
+def _check_exclusive(
+    targets: t.Tuple[str, ...],
+    schema_pattern: t.Optional[str],
+    schema_query: t.Optional[str],
+    sql: bool,
+    from_revision: t.Optional[str],
+) -> None:
+    if sum(map(bool, (targets, schema_pattern, schema_query, sql))) > 1:
+        raise click.UsageError(
+            '--target, --schema-pattern, --schema-query and --sql '
+            'are mutually exclusive',
+        )
+    elif from_revision is not None and not sql:
+        raise click.UsageError('--from-revision can only be used with --sql')
+
+
+def _offline(
+    config: model.Config,
+    revision: str,
+    direction: model.MigrationDir,
+    from_revision: t.Optional[str],
+    transaction_batch: t.Optional[int],
+) -> None:
+    script = async_run(
+        offline.run(
+            config=config,
+            target_revision=revision,
+            direction=direction,
+            from_revision=from_revision,
+            transaction_batch=transaction_batch,
+        ),
+    )
+    if script is None:
+        raise click.ClickException('There is nothing to migrate')
+    click.echo(script, nl=False)
+
+
+def _fan_out(
+    config: model.Config,
+    revision: str,
+    direction: model.MigrationDir,
+    targets: t.Sequence[str],
+    concurrency: int,
+    **kwargs: t.Any,
+) -> None:
+    dsns = []
+    for target in targets:
+        if '://' in target:
+            dsns.append(target)
+            continue
+        try:
+            dsns.append(loader.load_configuration(Path(target)).database_dsn)
+        except (configparser.Error, ValueError) as ex:
+            raise click.BadParameter(
+                f'{target} is not a valid configuration: {ex}',
+                param_hint="'--target'",
+            )
+    results = async_run(
+        fanout.run(
+            config=config,
+            target_revision=revision,
+            dsns=dsns,
+            direction=direction,
+            concurrency=concurrency,
+            **kwargs,
+        ),
+    )
+
+    _report(results, 'databases')
+
+
+def _tenants(
+    config: model.Config,
+    revision: str,
+    direction: model.MigrationDir,
+    schema_pattern: t.Optional[str],
+    schema_query: t.Optional[str],
+    concurrency: int,
+    **kwargs: t.Any,
+) -> None:
+    async def _runner() -> t.List[model.TargetResult]:
+        async with _connect(config.database_dsn) as connection:
+            schemas = await tenants.discover(
+                connection,
+                pattern=schema_pattern,
+                query=schema_query,
+            )
+        return await tenants.run(
+            config=config,
+            target_revision=revision,
+            schemas=schemas,
+            direction=direction,
+            concurrency=concurrency,
+            **kwargs,
+        )
+
+    _report(async_run(_runner()), 'schemas')
+
+
+def _report(results: t.Sequence[model.TargetResult], kind: str) -> None:
+    click.echo(
+        tabulate(
+            [[r.target, r.revision, 'FAILED' if r.error else 'OK', r.error or '']
+             for r in results],
+            headers=['Target', 'Revision', 'Status', 'Error'],
+        ),
+    )
+
+    failed = sum(1 for r in results if r.error)
+    if failed:
+        raise click.ClickException(f'{failed} of {len(results)} {kind} failed')
+
+
 @click.group()
 @click.option(
     '-v',
@@ -91,15 +367,72 @@ def version() -> None:
     required=True,
     type=str.upper,
 )
+@pacing_option
+@batch_history_option
+@transaction_batch_option
+@lock_mode_option
+@lock_key_option
+@lock_timeout_option
+@targets_option
+@concurrency_option
+@schema_pattern_option
+@schema_query_option
+@sql_option
+@from_revision_option
 @click.pass_context
-def upgrade_cmd(ctx: click.Context, revision: str) -> None:
-    async def _runner() -> t.Optional[model.Revision]:
-        config = loader.load_configuration(ctx.obj['configuration_file_path'])
-        return await upgrade.run(
-            config=config,
-            target_revision=revision,
-            connection=await asyncpg.connect(dsn=config.database_dsn),
+def upgrade_cmd(
+    ctx: click.Context,
+    revision: str,
+    targets: t.Tuple[str, ...],
+    concurrency: int,
+    schema_pattern: t.Optional[str],
+    schema_query: t.Optional[str],
+    sql: bool,
+    from_revision: t.Optional[str],
+    **options: t.Any,
+) -> None:
+    _check_exclusive(targets, schema_pattern, schema_query, sql, from_revision)
+
+    config = loader.load_configuration(ctx.obj['configuration_file_path'])
+    if sql:
+        _offline(
+            config,
+            revision,
+            model.MigrationDir.UP,
+            from_revision,
+            options['transaction_batch'],
+        )
+        return
+    elif schema_pattern or schema_query:
+        _tenants(
+            config,
+            revision,
+            model.MigrationDir.UP,
+            schema_pattern,
+            schema_query,
+            concurrency,
+            **options,
         )
+        return
+    elif targets:
+        _fan_out(
+            config,
+            revision,
+            model.MigrationDir.UP,
+            targets,
+            concurrency,
+            **options,
+        )
+        return
+
+    async def _runner() -> t.Optional[model.Revision]:
+        async with _connect(config.database_dsn) as connection:
+            return await upgrade.run(
+                config=config,
+                target_revision=revision,
+                connection=connection,
+                **options,
+            )
 
     async_run(_runner())
 
@@ -114,19 +447,147 @@ def upgrade_cmd(ctx: click.Context, revision: str) -> None:
     required=True,
     type=str.upper,
 )
+@pacing_option
+@batch_history_option
+@transaction_batch_option
+@lock_mode_option
+@lock_key_option
+@lock_timeout_option
+@targets_option
+@concurrency_option
+@schema_pattern_option
+@schema_query_option
+@sql_option
+@from_revision_option
 @click.pass_context
-def downgrade_cmd(ctx: click.Context, revision: str) -> None:
-    async def _runner() -> t.Optional[model.Revision]:
-        config = loader.load_configuration(ctx.obj['configuration_file_path'])
-        return await downgrade.run(
-            config=config,
-            target_revision=revision,
-            connection=await asyncpg.connect(dsn=config.database_dsn),
+def downgrade_cmd(
+    ctx: click.Context,
+    revision: str,
+    targets: t.Tuple[str, ...],
+    concurrency: int,
+    schema_pattern: t.Optional[str],
+    schema_query: t.Optional[str],
+    sql: bool,
+    from_revision: t.Optional[str],
+    **options: t.Any,
+) -> None:
+    _check_exclusive(targets, schema_pattern, schema_query, sql, from_revision)
+
+    config = loader.load_configuration(ctx.obj['configuration_file_path'])
+    if sql:
+        _offline(
+            config,
+            revision,
+            model.MigrationDir.DOWN,
+            from_revision,
+            options['transaction_batch'],
         )
+        return
+    elif schema_pattern or schema_query:
+        _tenants(
+            config,
+            revision,
+            model.MigrationDir.DOWN,
+            schema_pattern,
+            schema_query,
+            concurrency,
+            **options,
+        )
+        return
+    elif targets:
+        _fan_out(
+            config,
+            revision,
+            model.MigrationDir.DOWN,
+            targets,
+            concurrency,
+            **options,
+        )
+        return
+
+    async def _runner() -> t.Optional[model.Revision]:
+        async with _connect(config.database_dsn) as connection:
+            return await downgrade.run(
+                config=config,
+                target_revision=revision,
+                connection=connection,
+                **options,
+            )
 
     async_run(_runner())
 
 
+@db.command(name='squash', short_help='Squashes migrations into a baseline')
+@click.argument(
+    'revision',
+    metavar='<revision>',
+    required=True,
+    type=str.upper,
+)
+@click.option(
+    '--delete-squashed',
+    is_flag=True,
+    default=False,
+    help='Deletes scripts of squashed migrations, they are not loaded anymore '
+    'once baseline is there',
+)
+@click.pass_context
+def squash_cmd(ctx: click.Context, revision: str, delete_squashed: bool) -> None:
+    """Squashes migrations up to <revision> into single baseline migration.
+
+    Empty databases are upgraded with the baseline, those past <revision>
+    are not affected. Databases before <revision> cannot be migrated
+    afterwards, upgrade them first.
+    """
+    config = loader.load_configuration(ctx.obj['configuration_file_path'])
+    try:
+        path = async_run(
+            squash.run(
+                config=config,
+                target_revision=revision,
+                delete_squashed=delete_squashed,
+            ),
+        )
+    except (ValueError, FileExistsError) as ex:
+        raise click.ClickException(str(ex))
+    click.echo(f'Baseline written to {path}')
+
+
+@db.command(name='verify', short_help='Verifies that downgrades revert upgrades')
+@click.option(
+    '--concurrency',
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help='How many scratch databases revisions are verified in at the same time',
+)
+@click.pass_context
+def verify_cmd(ctx: click.Context, concurrency: int) -> None:
+    """Upgrades, downgrades and upgrades again every revision.
+
+    Catalog of the database (tables, columns, indexes, constraints and
+    types) must be the same after downgrade as before upgrade and the same
+    after both upgrades. Runs in scratch databases created next to the
+    configured one, which is not migrated.
+    """
+    config = loader.load_configuration(ctx.obj['configuration_file_path'])
+    results = async_run(verify.run(config=config, concurrency=concurrency))
+    if not results:
+        raise click.ClickException('There are no migrations scripts to verify')
+    _report(results, 'revisions')
+
+
+async def _check_layout(connection: asyncpg.Connection) -> bool:
+    # read-only commands leave layout upgrade to upgrade and downgrade
+    try:
+        await migration.check_layout(connection)
+    except migration.MigrationTableMissing:
+        return False
+    except migration.MigrationTableOutdated as ex:
+        raise click.ClickException(str(ex))
+    return True
+
+
 @db.command(
     name='revision',
     short_help='Prints current revision in remote database',
@@ -135,9 +596,10 @@ def downgrade_cmd(ctx: click.Context, revision: str) -> None:
 def revision_cmd(ctx: click.Context) -> None:
     async def _runner() -> t.Optional[model.Revision]:
         config = loader.load_configuration(ctx.obj['configuration_file_path'])
-        return await migration.latest_revision(
-            connection=await asyncpg.connect(dsn=config.database_dsn),
-        )
+        async with _connect(config.database_dsn) as connection:
+            if not await _check_layout(connection):
+                return None
+            return await migration.latest_revision(connection=connection)
 
     db_revision = async_run(_runner())
     if db_revision is None:
@@ -148,29 +610,140 @@ def revision_cmd(ctx: click.Context) -> None:
         click.echo(f'Current database revision is {db_revision}')
 
 
+HISTORY_HEADERS = ['No.', 'Revision', 'Lable', 'TS', 'Direction', 'Duration', 'WAL']
+
+
+def _history_record(entry: model.MigrationHistoryEntry) -> t.Dict[str, t.Any]:
+    return {
+        'revision': int(entry.revision),
+        'label': entry.label,
+        'timestamp': entry.timestamp.isoformat(),
+        'direction': entry.direction.value,
+        'duration': None if entry.duration is None else entry.duration.total_seconds(),
+        'wal_bytes': entry.wal_bytes,
+    }
+
+
+async def _slowest(
+    entries: t.AsyncIterator[model.MigrationHistoryEntry],
+    count: int,
+) -> t.AsyncIterator[model.MigrationHistoryEntry]:
+    # entries recorded before durations were measured have none
+    measured = [m async for m in entries if m.duration is not None]
+    for entry in sorted(
+            measured,
+            key=lambda m: m.duration,  # type: ignore
+            reverse=True,
+    )[:count]:
+        yield entry
+
+
+async def _echo_history(
+    entries: t.AsyncIterator[model.MigrationHistoryEntry],
+    output_format: str,
+    title: str,
+) -> int:
+    if output_format == 'table':
+        # column widths are known only once every row is
+        rows = [[
+            m.revision,
+            m.label,
+            m.timestamp,
+            m.direction,
+            m.duration,
+            m.wal_bytes,
+        ] async for m in entries]
+        if rows:
+            click.echo(title)
+            click.echo(
+                tabulate(
+                    rows,
+                    headers=HISTORY_HEADERS,
+                    showindex='1',
+                ),
+            )
+        return len(rows)
+
+    count = 0
+    async for entry in entries:
+        line = json.dumps(_history_record(entry))
+        if output_format == 'ndjson':
+            click.echo(line)
+        else:
+            click.echo(('[\n' if count == 0 else ',\n') + line, nl=False)
+        count += 1
+    if count and output_format == 'json':
+        click.echo('\n]')
+    return count
+
+
 @db.command(short_help='Prints migrations history')
+@click.option(
+    '--slowest',
+    metavar='<N>',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Prints only N migrations that took the longest',
+)
+@click.option(
+    '--limit',
+    metavar='<N>',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Reads at most N oldest entries, --slowest picks out of them',
+)
+@click.option(
+    '--since',
+    metavar='<timestamp>',
+    type=click.DateTime(),
+    default=None,
+    help='Reads entries recorded at or after timestamp, local to the database',
+)
+@click.option(
+    '--format',
+    'output_format',
+    type=click.Choice(['table', 'json', 'ndjson']),
+    default='table',
+    show_default=True,
+    help='Entries of json and ndjson are printed as they are read, '
+    'table is printed once all of them are. Only table fails on empty history',
+)
 @click.pass_context
-def history(ctx: click.Context) -> None:
-    async def _runner(cfg: model.Config) -> model.MigrationHistory:
-        return await migration.list(
-            connection=await asyncpg.connect(dsn=cfg.database_dsn),
-        )
-
+def history(
+    ctx: click.Context,
+    slowest: t.Optional[int],
+    limit: t.Optional[int],
+    since: t.Optional[dt.datetime],
+    output_format: str,
+) -> None:
     config = loader.load_configuration(ctx.obj['configuration_file_path'])
-    mig_history = async_run(_runner(config))
-    if not mig_history:
+    if slowest is None:
+        title = f'Database {config.database_name} history migration'
+    else:
+        title = f'Database {config.database_name} slowest migrations'
+
+    async def _runner(cfg: model.Config) -> int:
+        async with _connect(cfg.database_dsn) as connection:
+            if not await _check_layout(connection):
+                return 0
+            entries: t.AsyncIterator[model.MigrationHistoryEntry] = migration.history(
+                connection=connection,
+                since=since,
+                limit=limit,
+            )
+            if slowest is not None:
+                entries = _slowest(entries, slowest)
+            return await _echo_history(entries, output_format, title)
+
+    if async_run(_runner(config)):
+        return
+    elif output_format == 'table':
         raise click.ClickException(
             'No revisions found, you might want to run some migrations first :)',
         )
-    else:
-        click.echo(f'Database {config.database_name} history migration')
-        click.echo(
-            tabulate(
-                [[m.revision, m.label, m.timestamp, m.direction] for m in mig_history],
-                headers=['No.', 'Revision', 'Lable', 'TS', 'Direction'],
-                showindex='1',
-            ),
-        )
+    elif output_format == 'json':
+        # empty history is still a valid document, ndjson has no lines
+        click.echo('[]')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import os
+from pathlib import Path
+import typing as t
+import urllib.parse
+import urllib.request
+
+from loguru import logger
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import model
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PREFIX = 'asyncpg_migrate'
+
+_Labels = t.Tuple[t.Tuple[str, str], ...]
+
+# name: (type, help)
+METRICS: t.Dict[str, t.Tuple[str, str]] = {
+    'run_duration_seconds': ('gauge', 'Duration of the last run'),
+    'lock_wait_seconds': (
+        'gauge',
+        'Time the last run waited for the advisory lock',
+    ),
+    'migration_duration_seconds': (
+        'gauge',
+        'Duration of the last application of a revision',
+    ),
+    'migration_wal_bytes': (
+        'gauge',
+        'WAL bytes written by the last application of a revision',
+    ),
+    'migrations_applied': ('counter', 'Migrations applied'),
+    'failures': ('counter', 'Failed runs'),
+    'revision': ('gauge', 'Revision of the database after the last run'),
+}
+
+
+class Exporter:
+    """Hook exposing engine runs as OpenMetrics.
+
+    Metrics are written to textfile, i.e. to be collected by node-exporter
+    textfile collector, and/or pushed with PUT to push_url, i.e.
+    Pushgateway, after every applied migration and at the end of a run.
+    Counters accumulate for as long as exporter lives.
+    """
+    def __init__(
+        self,
+        textfile: t.Optional[Path] = None,
+        push_url: t.Optional[str] = None,
+        labels: t.Optional[t.Mapping[str, str]] = None,
+    ) -> None:
+        if push_url is not None and urllib.parse.urlsplit(push_url).scheme not in (
+                'http',
+                'https',
+        ):
+            raise ValueError(f'Metrics can only be pushed over http(s), got {push_url}')
+        self.textfile = textfile
+        self.push_url = push_url
+        self.labels = tuple(sorted((labels or {}).items()))
+        self.samples: t.Dict[str, t.Dict[_Labels, float]] = {n: {} for n in METRICS}
+
+    def _set(self, name: str, value: float, **labels: str) -> None:
+        self.samples[name][self.labels + tuple(sorted(labels.items()))] = value
+
+    def _inc(self, name: str, **labels: str) -> None:
+        key = self.labels + tuple(sorted(labels.items()))
+        self.samples[name][key] = self.samples[name].get(key, 0) + 1
+
+    async def __call__(self, event: model.Event) -> None:
+        await self.observe(event)
+
+    def for_target(self, **labels: str) -> model.HookCallable:
+        """Returns hook adding labels of a target to samples of its runs.
+
+        Runs of many databases or schemas share the exporter, labels keep
+        their samples apart.
+        """
+        async def _hook(event: model.Event) -> None:
+            await self.observe(event, **labels)
+
+        return _hook
+
+    async def observe(self, event: model.Event, **labels: str) -> None:
+        direction = event.direction.value
+        if event.type == model.EventType.BEFORE_PLAN and event.duration is not None:
+            self._set(
+                'lock_wait_seconds',
+                event.duration.total_seconds(),
+                direction=direction,
+                **labels,
+            )
+        elif event.type == model.EventType.AFTER_MIGRATION:
+            revision = str(event.revision)
+            if event.duration is not None:
+                self._set(
+                    'migration_duration_seconds',
+                    event.duration.total_seconds(),
+                    direction=direction,
+                    revision=revision,
+                    **labels,
+                )
+            if event.wal_bytes is not None:
+                self._set(
+                    'migration_wal_bytes',
+                    event.wal_bytes,
+                    direction=direction,
+                    revision=revision,
+                    **labels,
+                )
+            self._inc('migrations_applied', direction=direction, **labels)
+            await self.publish()
+        elif event.type == model.EventType.ON_ERROR:
+            self._inc('failures', direction=direction, **labels)
+        elif event.type == model.EventType.AFTER_RUN:
+            if event.duration is not None:
+                self._set(
+                    'run_duration_seconds',
+                    event.duration.total_seconds(),
+                    direction=direction,
+                    **labels,
+                )
+            if event.revision is not None:
+                self._set('revision', event.revision, **labels)
+            await self.publish()
+
+    def render(self) -> str:
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            family = f'{PREFIX}_{name}'
+            sample = f'{family}_total' if metric_type == 'counter' else family
+            lines.append(f'# TYPE {family} {metric_type}')
+            lines.append(f'# HELP {family} {help_text}')
+            for labels, value in sorted(self.samples[name].items()):
+                lines.append(f'{sample}{_render_labels(labels)} {value}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    async def publish(self) -> None:
+        content = self.render()
+        if self.textfile is not None:
+            # collector must never read half written file
+            tmp_path = self.textfile.with_name(f'.{self.textfile.name}.{os.getpid()}')
+            tmp_path.write_text(content)
+            tmp_path.replace(self.textfile)
+        if self.push_url is not None:
+            await asyncio.get_event_loop().run_in_executor(
+                None,
+                _push,
+                self.push_url,
+                content.encode(),
+            )
+
+
+def _render_labels(labels: _Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),
+        ) for name, value in labels
+    ) + '}'
+
+
+def _push(url: str, content: bytes) -> None:
+    request = urllib.request.Request(
+        url,
+        data=content,
+        method='PUT',
+        headers={'Content-Type': CONTENT_TYPE},
+    )
+    # Exporter only takes http(s) urls, opener would read file:// as well
+    with urllib.request.build_opener().open(request, timeout=5):
+        logger.debug('Pushed metrics to {url}', url=url)
+
+
+@functools.lru_cache(maxsize=None)
+def _exporter(textfile: t.Optional[Path], push_url: t.Optional[str]) -> Exporter:
+    return Exporter(textfile=textfile, push_url=push_url)
+
+
+def from_config(config: model.Config) -> t.Optional[Exporter]:
+    """Returns exporter enabled by config, shared by all of its runs."""
+    if config.metrics_textfile is None and config.metrics_push_url is None:
+        return None
+    return _exporter(config.metrics_textfile, config.metrics_push_url)
+
+
+def hook(
+    config: model.Config,
+    table_schema: str = constants.MIGRATIONS_SCHEMA,
+) -> t.Optional[model.HookCallable]:
+    """Returns hook of exporter enabled by config for a run of a target.
+
+    Samples are labelled with database of config and schema of the
+    migrations table, see Exporter.for_target.
+    """
+    exporter = from_config(config)
+    if exporter is None:
+        return None
+    if table_schema.startswith('"'):
+        # quoted identifier, i.e. of a tenant schema
+        table_schema = table_schema[1:-1].replace('""', '"')
+    return exporter.for_target(database=config.database_name, schema=table_schema)
@@ -1,5 +1,5 @@
-import copy
-from dataclasses import dataclass, field
+import bisect
+from dataclasses import dataclass, field, fields
 import datetime as dt
 import enum
 from pathlib import Path
@@ -7,6 +7,8 @@ import typing as t
 
 import asyncpg
 
+from asyncpg_migrate import constants
+
 Timestamp = t.NewType('Timestamp', dt.datetime)
 MigrationCallable = t.Callable[[asyncpg.Connection],
                                t.Callable[[asyncpg.Connection],
@@ -16,6 +18,8 @@ MigrationCallable = t.Callable[[asyncpg.Connection],
                                                       ],
                                           ],
                                ]
+PacingCallable = t.Callable[['Migration', 'MigrationDir'], t.Awaitable[None]]
+HookCallable = t.Callable[['Event'], t.Awaitable[None]]
 
 
 class Revision(int):
@@ -56,35 +60,170 @@ class MigrationDir(str, enum.Enum):
     DOWN = 'DOWN'
 
 
-class Migrations(t.Dict[Revision, 'Migration']):
-    def slice(self, start: int, end: t.Optional[int] = None) -> 'Migrations':
-        real_end = len(self) if end is None else end
+class LockMode(str, enum.Enum):
+    WAIT = 'WAIT'
+    TRY = 'TRY'
+    NONE = 'NONE'
 
-        if start > real_end:
-            raise ValueError(f'Cannot slice if end={end} < start={start}')
 
-        if start == 1 and real_end == len(self):
-            return copy.deepcopy(self)
-        else:
-            new_migrations = Migrations()
+class MigrationsView(t.Mapping[Revision, 'Migration']):
+    """Read-only range of migrations registry.
+
+    View shares storage with the registry it has been created from,
+    hence neither creating nor iterating it in any direction copies
+    migrations. View must not outlive changes of its registry.
+    """
+    __slots__ = ('_migrations', '_revisions', '_lo', '_hi')
+
+    def __init__(
+        self,
+        migrations: t.Dict[Revision, 'Migration'],
+        revisions: t.List[Revision],
+        lo: int,
+        hi: int,
+    ) -> None:
+        self._migrations = migrations
+        self._revisions = revisions
+        self._lo = lo
+        self._hi = hi
+
+    def _bounds(self) -> t.Tuple[int, int]:
+        return self._lo, self._hi
+
+    def __getitem__(self, revision: Revision) -> 'Migration':
+        if revision not in self:
+            raise KeyError(revision)
+        return self._migrations[revision]
+
+    def __contains__(self, revision: object) -> bool:
+        if not isinstance(revision, int) or revision not in self._migrations:
+            return False
+        lo, hi = self._bounds()
+        return lo < hi and self._revisions[lo] <= revision <= self._revisions[hi - 1]
+
+    def __iter__(self) -> t.Iterator[Revision]:
+        lo, hi = self._bounds()
+        return (self._revisions[idx] for idx in range(lo, hi))
+
+    def __reversed__(self) -> t.Iterator[Revision]:
+        lo, hi = self._bounds()
+        return (self._revisions[idx] for idx in range(hi - 1, lo - 1, -1))
 
-            # have to add 1 to real_end because range is not non-inclusive at
-            # the end
-            for r in range(start, real_end + 1, 1):
-                revision = Revision(r)
-                new_migrations[revision] = self[revision]
-            return new_migrations
+    def __len__(self) -> int:
+        lo, hi = self._bounds()
+        return hi - lo
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.revisions()})'
+
+    @property
+    def head(self) -> Revision:
+        return self._revisions[self._bounds()[1] - 1]
+
+    @property
+    def base(self) -> Revision:
+        return self._revisions[self._bounds()[0]]
+
+    def previous(self, revision: int, steps: int = 1) -> Revision:
+        """Returns revision that is given number of steps before revision.
+
+        Revision itself does not have to be known. Revision(0) is returned
+        when stepping past the base.
+        """
+        lo, hi = self._bounds()
+        idx = bisect.bisect_left(self._revisions, revision, lo, hi) - steps
+        return self._revisions[idx] if idx >= lo else Revision(0)
+
+    def slice(self, start: int, end: t.Optional[int] = None) -> 'MigrationsView':
+        """Returns view of migrations with revisions within [start, end]."""
+        if end is not None and start > end:
+            raise ValueError(f'Cannot slice if end={end} < start={start}')
+
+        lo, hi = self._bounds()
+        new_lo = bisect.bisect_left(self._revisions, start, lo, hi)
+        new_hi = hi if end is None else bisect.bisect_right(
+            self._revisions,
+            end,
+            new_lo,
+            hi,
+        )
+        return MigrationsView(self._migrations, self._revisions, new_lo, new_hi)
 
     def upgrade_iterator(self) -> t.Iterator['Migration']:
-        return iter([self[rev] for rev in sorted(self)])
+        return (self._migrations[rev] for rev in self)
 
     def downgrade_iterator(self) -> t.Iterator['Migration']:
-        return iter([self[rev] for rev in sorted(self, reverse=True)])
+        return (self._migrations[rev] for rev in reversed(self))
+
+    def revisions(self) -> t.Sequence[Revision]:
+        lo, hi = self._bounds()
+        return self._revisions[lo:hi]
+
+
+class Migrations(MigrationsView):
+    """Registry of migrations indexed by revision.
+
+    Revisions are kept in sorted array next to the mapping, hence
+    head and base are looked up in O(1) and ranges are found with bisect.
+    Revisions do not have to be contiguous.
+    """
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        super().__init__({}, [], 0, 0)
+
+    def _bounds(self) -> t.Tuple[int, int]:
+        return 0, len(self._revisions)
+
+    def __getitem__(self, revision: Revision) -> 'Migration':
+        return self._migrations[revision]
+
+    def __setitem__(self, revision: Revision, migration: 'Migration') -> None:
+        if revision not in self._migrations:
+            if not self._revisions or self._revisions[-1] < revision:
+                self._revisions.append(revision)
+            else:
+                bisect.insort(self._revisions, revision)
+        self._migrations[revision] = migration
+
+    def __contains__(self, revision: object) -> bool:
+        return revision in self._migrations
 
     def revisions(self) -> t.Sequence[Revision]:
-        return sorted(self.keys())
+        return self._revisions
+
+
+_T = t.TypeVar('_T')
+
+
+def _slotted(cls: t.Type[_T]) -> t.Type[_T]:
+    """Recreates frozen dataclass with __slots__.
+
+    Backport of dataclass(slots=True) that is available since Python 3.10.
+    """
+    field_names = tuple(f.name for f in fields(cls))
+
+    cls_dict = {
+        name: value
+        for name, value in cls.__dict__.items()
+        if name not in (*field_names, '__dict__', '__weakref__')
+    }
+    cls_dict['__slots__'] = field_names
+
+    def __getstate__(self: t.Any) -> t.List[t.Any]:
+        return [getattr(self, name) for name in field_names]
+
+    def __setstate__(self: t.Any, state: t.List[t.Any]) -> None:
+        for name, value in zip(field_names, state):
+            object.__setattr__(self, name, value)
+
+    cls_dict['__getstate__'] = __getstate__
+    cls_dict['__setstate__'] = __setstate__
 
+    return t.cast(t.Type[_T], type(cls.__name__, cls.__bases__, cls_dict))
 
+
+@_slotted
 @dataclass(frozen=True)
 class Migration:
     revision: Revision
@@ -98,22 +237,132 @@ class Migration:
         hash=False,
         compare=False,
     )
+    transactional: bool = field(
+        default=True,
+        hash=False,
+        compare=False,
+    )
+    baseline: bool = field(
+        default=False,
+        hash=False,
+        compare=False,
+    )
 
 
+@_slotted
 @dataclass(frozen=True)
 class MigrationHistoryEntry:
     revision: Revision = field(hash=True, compare=True)
     timestamp: Timestamp = field(hash=True, compare=True)
     direction: MigrationDir = field(hash=True, compare=True)
     label: str = field(hash=False, compare=False)
+    duration: t.Optional[dt.timedelta] = field(
+        default=None,
+        hash=False,
+        compare=False,
+    )
+    wal_bytes: t.Optional[int] = field(
+        default=None,
+        hash=False,
+        compare=False,
+    )
+
+
+@dataclass(frozen=True)
+class MigrationStats:
+    duration: dt.timedelta
+    wal_bytes: t.Optional[int] = None
 
 
 class MigrationHistory(t.List[MigrationHistoryEntry]):
     ...
 
 
+class EventType(str, enum.Enum):
+    BEFORE_PLAN = 'BEFORE_PLAN'
+    BEFORE_MIGRATION = 'BEFORE_MIGRATION'
+    AFTER_MIGRATION = 'AFTER_MIGRATION'
+    ON_ERROR = 'ON_ERROR'
+    AFTER_RUN = 'AFTER_RUN'
+
+
+@dataclass(frozen=True)
+class Event:
+    """Lifecycle event of an engine run passed to hooks.
+
+    Revision is the one of migration for migration events, otherwise
+    it is revision of the database before planning or after the run.
+    Duration is the one of migration or of the whole run respectively,
+    for BEFORE_PLAN it is time spent waiting for the advisory lock.
+    """
+    type: EventType
+    direction: MigrationDir
+    connection: asyncpg.Connection = field(repr=False)
+    revision: t.Optional[Revision] = None
+    migration: t.Optional[Migration] = None
+    duration: t.Optional[dt.timedelta] = None
+    wal_bytes: t.Optional[int] = None
+    error: t.Optional[BaseException] = None
+
+
+@dataclass(frozen=True)
+class TargetResult:
+    target: str
+    revision: t.Optional[Revision] = None
+    error: t.Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    revision: Revision
+    label: str
+    path: Path
+    mtime_ns: int
+    size: int
+    sha256: t.Optional[str] = None
+    transactional: bool = True
+    baseline: bool = False
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    lock_timeout: t.Optional[float] = None
+    statement_timeout: t.Optional[float] = None
+    lock_retries: int = 0
+    lock_retry_delay: float = 0.5
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """Options of upgrade and downgrade runs, see engine.upgrade.run."""
+    # awaited after each applied migration, no pause between them by default
+    pacing: t.Optional[PacingCallable] = None
+    # reloads schema state of the connection once any migration has been applied
+    reload_schema_state: bool = True
+    # writes history in a single batch at the end of each transaction
+    batch_history: bool = False
+    table_schema: str = constants.MIGRATIONS_SCHEMA
+    table_name: str = constants.MIGRATIONS_TABLE
+    # advisory lock held by the whole run, keyed by lock_key or derived from
+    # the migrations table name; TRY skips the run if it is taken
+    lock_mode: LockMode = LockMode.WAIT
+    lock_key: t.Optional[int] = None
+    lock_timeout: t.Optional[float] = None
+    # commits after every transaction_batch migrations instead of once
+    transaction_batch: t.Optional[int] = None
+    # called next to those registered with asyncpg_migrate.hooks or config.hooks
+    hooks: t.Sequence[HookCallable] = ()
+
+
 @dataclass(frozen=True)
 class Config:
     script_location: Path
     database_dsn: str = field(repr=False)
     database_name: str
+    manifest_cache: bool = False
+    timeouts: Timeouts = Timeouts()
+    hooks: t.Tuple[str, ...] = ()
+    metrics_textfile: t.Optional[Path] = None
+    metrics_push_url: t.Optional[str] = None
+    # WAL written by each migration costs two more queries per migration
+    measure_wal: bool = False
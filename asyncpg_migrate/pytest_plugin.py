@@ -0,0 +1,131 @@
+"""pytest plugin handing tests databases migrated to head.
+
+Migrations are applied once, to a template database named after hash of
+migrations scripts, which is reused for as long as scripts do not change.
+Each database handed to tests is a copy of the template made with
+``create database ... template``, which is way faster than migrating.
+
+Configuration file is read from ``--asyncpg-migrate-config`` option or
+``asyncpg_migrate_config`` ini option, ``migrations.ini`` in rootdir by
+default. Its database is used to create templates and copies, hence
+the user must be allowed to create databases. Templates of previous
+versions of migrations are left behind.
+
+Fixtures:
+
+- asyncpg_migrate_dsn: DSN of database of a single test
+- asyncpg_migrate_session_dsn: DSN of database shared by the session,
+  that is by a single pytest-xdist worker
+- asyncpg_migrate_template: name of template database
+- asyncpg_migrate_config: configuration, can be overridden in conftest
+"""
+import asyncio
+import itertools
+import os
+from pathlib import Path
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import databases
+
+_T = t.TypeVar('_T')
+
+_copies = itertools.count()
+
+
+def pytest_addoption(parser: t.Any) -> None:
+    group = parser.getgroup('asyncpg-migrate')
+    group.addoption(
+        '--asyncpg-migrate-config',
+        dest='asyncpg_migrate_config',
+        metavar='PATH',
+        default=None,
+        help='asyncpg-migrate configuration of databases handed to tests',
+    )
+    parser.addini(
+        'asyncpg_migrate_config',
+        help='asyncpg-migrate configuration of databases handed to tests',
+        default='migrations.ini',
+    )
+
+
+def _run(coro: t.Awaitable[_T]) -> _T:
+    # own loop, so that the one of pytest-asyncio is not affected
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+async def _maintenance(
+    config: model.Config,
+    func: t.Callable[[asyncpg.Connection], t.Awaitable[_T]],
+) -> _T:
+    connection = await asyncpg.connect(dsn=config.database_dsn)
+    try:
+        return await func(connection)
+    finally:
+        await connection.close()
+
+
+@pytest.fixture(scope='session')
+def asyncpg_migrate_config(pytestconfig: t.Any) -> model.Config:
+    option = pytestconfig.getoption('asyncpg_migrate_config')
+    path = Path(option or pytestconfig.getini('asyncpg_migrate_config'))
+    if not path.is_absolute():
+        path = Path(str(pytestconfig.rootdir)) / path
+    if not path.exists():
+        raise pytest.UsageError(f'asyncpg-migrate configuration {path} does not exist')
+    return loader.load_configuration(path)
+
+
+@pytest.fixture(scope='session')
+def asyncpg_migrate_template(asyncpg_migrate_config: model.Config) -> str:
+    config = asyncpg_migrate_config
+    # database names are limited to 63 bytes, copies add own suffix
+    name = '{}_tpl_{}'.format(
+        config.database_name[:20],
+        loader.migrations_hash(config)[:12],
+    )
+    _run(
+        _maintenance(
+            config,
+            lambda connection: databases.template(connection, config, name),
+        ),
+    )
+    return name
+
+
+def _copy(config: model.Config, template: str) -> t.Iterator[str]:
+    name = f'{template}_{os.getpid()}_{next(_copies)}'
+    _run(
+        _maintenance(
+            config,
+            lambda connection: databases.create(connection, name, template),
+        ),
+    )
+    try:
+        yield databases.dsn_for(config.database_dsn, name)
+    finally:
+        _run(_maintenance(config, lambda connection: databases.drop(connection, name)))
+
+
+@pytest.fixture
+def asyncpg_migrate_dsn(
+    asyncpg_migrate_config: model.Config,
+    asyncpg_migrate_template: str,
+) -> t.Iterator[str]:
+    yield from _copy(asyncpg_migrate_config, asyncpg_migrate_template)
+
+
+@pytest.fixture(scope='session')
+def asyncpg_migrate_session_dsn(
+    asyncpg_migrate_config: model.Config,
+    asyncpg_migrate_template: str,
+) -> t.Iterator[str]:
+    yield from _copy(asyncpg_migrate_config, asyncpg_migrate_template)
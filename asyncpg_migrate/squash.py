@@ -0,0 +1,158 @@
+import itertools
+from pathlib import Path
+import typing as t
+
+import asyncpg
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import offline
+
+Chunks = t.List[t.Tuple[bool, t.List[str]]]
+
+TEMPLATE = '''"""Baseline of revisions {base} to {revision}, generated by asyncpg-migrate.
+
+Stands for all migrations up to revision {revision}, which are no longer
+loaded. Fresh database is created with this single migration, databases
+between revisions {base} and {revision} cannot be migrated anymore.
+"""
+from asyncpg_migrate import squash
+
+revision = {revision}
+baseline = True
+transactional = {transactional}
+
+UPGRADE = {upgrade}
+
+DOWNGRADE = {downgrade}
+
+
+async def upgrade(connection):
+    await squash.execute(connection, UPGRADE)
+
+
+async def downgrade(connection):
+    await squash.execute(connection, DOWNGRADE)
+'''
+
+
+async def execute(connection: asyncpg.Connection, chunks: Chunks) -> None:
+    """Runs statements recorded by squash.
+
+    Statements of transactional chunk run in single round trip within
+    a transaction, others one by one as they cannot run in a transaction.
+    """
+    for transactional, statements in chunks:
+        if transactional:
+            async with connection.transaction():
+                await connection.execute('\n'.join(statements))
+        else:
+            for statement in statements:
+                await connection.execute(statement)
+
+
+async def _record(
+    migrations: t.Iterable[model.Migration],
+    direction: model.MigrationDir,
+) -> Chunks:
+    chunks: Chunks = []
+    for transactional, group in itertools.groupby(
+            migrations,
+            key=lambda mig: mig.transactional,
+    ):
+        connection = offline.RecordingConnection()
+        for mig in group:
+            if direction == model.MigrationDir.UP:
+                func, step = mig.upgrade, 'upgrade'
+            else:
+                func, step = mig.downgrade, 'downgrade'
+            await func(t.cast(asyncpg.Connection, connection))
+            if connection.reads:
+                # whatever migration did with results would not be replayed
+                raise ValueError(
+                    f'{mig.revision}/{mig.label} reads from the database in {step}, '
+                    f'it cannot be squashed: {connection.reads[0]}',
+                )
+        if connection.statements:
+            chunks.append((transactional, connection.statements))
+    return chunks
+
+
+def _render(chunks: Chunks) -> str:
+    if not chunks:
+        return '[]'
+    lines = ['[']
+    for transactional, statements in chunks:
+        lines.append(f'    ({transactional}, [')
+        lines.extend(f'        {statement!r},' for statement in statements)
+        lines.append('    ]),')
+    lines.append(']')
+    return '\n'.join(lines)
+
+
+async def run(
+    config: model.Config,
+    target_revision: t.Union[str, int],
+    migrations: t.Optional[model.Migrations] = None,
+    delete_squashed: bool = False,
+) -> Path:
+    """Squashes migrations up to target_revision into a baseline.
+
+    Upgrades and downgrades of migrations are recorded with
+    offline.RecordingConnection, hence no database is needed. Migrations
+    that read from the database cannot be squashed, ValueError is raised
+    for them. Baseline is written next to the migrations as
+    ``baseline_<revision>.py``.
+
+    Empty database is upgraded with the baseline alone, which records
+    target_revision in the history. Databases that are already past
+    target_revision are not affected. Once baseline is there, squashed
+    scripts are no longer loaded, hence databases in between cannot be
+    upgraded nor downgraded, they have to be past target_revision before
+    squashing. Squashed scripts are kept unless delete_squashed is set.
+
+    Returns path of the baseline.
+    """
+    if migrations is None:
+        migrations = loader.load_migrations(config)
+    if not migrations:
+        raise ValueError('There are no migrations scripts to squash')
+
+    revision = model.Revision.decode(target_revision, migrations.revisions())
+    if revision not in migrations:
+        raise ValueError(f'There is no migration with revision {revision}')
+
+    path = config.script_location / f'baseline_{revision}.py'
+    if path.exists():
+        raise FileExistsError(f'{path} already exists')
+
+    to_squash = migrations.slice(start=migrations.base, end=revision)
+    logger.info(
+        'Squashing {count} migrations into {path}',
+        count=len(to_squash),
+        path=path,
+    )
+    loader.import_migrations(to_squash)
+
+    upgrade = await _record(to_squash.upgrade_iterator(), model.MigrationDir.UP)
+    downgrade = await _record(
+        to_squash.downgrade_iterator(),
+        model.MigrationDir.DOWN,
+    )
+    path.write_text(
+        TEMPLATE.format(
+            base=migrations.base,
+            revision=revision,
+            transactional=all(mig.transactional for mig in to_squash.values()),
+            upgrade=_render(upgrade),
+            downgrade=_render(downgrade),
+        ),
+    )
+
+    if delete_squashed:
+        for mig in to_squash.values():
+            logger.info('Deleting squashed {path}', path=mig.path)
+            mig.path.unlink()
+
+    return path
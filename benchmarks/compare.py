@@ -0,0 +1,44 @@
+"""Compares two results of benchmarks.suite.
+
+Usage: python -m benchmarks.compare baseline.json current.json [threshold]
+
+Exits with 1 if any benchmark got slower than threshold times
+the baseline, 1.2 by default.
+"""
+import json
+from pathlib import Path
+import sys
+import typing as t
+
+
+def compare(
+    baseline: t.Dict[str, t.Any],
+    current: t.Dict[str, t.Any],
+    threshold: float,
+) -> t.List[t.Tuple[str, str, float, float, bool]]:
+    rows = []
+    for name, values in current['results'].items():
+        for variant, seconds in values.items():
+            base_seconds = baseline['results'].get(name, {}).get(variant)
+            if base_seconds is None:
+                continue
+            ratio = seconds / base_seconds if base_seconds else 1.0
+            rows.append((name, variant, base_seconds, seconds, ratio > threshold))
+    return rows
+
+
+if __name__ == '__main__':
+    baseline_path, current_path = Path(sys.argv[1]), Path(sys.argv[2])
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 1.2
+
+    rows = compare(
+        json.loads(baseline_path.read_text()),
+        json.loads(current_path.read_text()),
+        threshold,
+    )
+    for name, variant, base_seconds, seconds, regressed in rows:
+        sys.stdout.write(
+            f'{name:>30} {variant:>8}: {base_seconds:.6f}s -> {seconds:.6f}s'
+            f'{"  REGRESSION" if regressed else ""}\n',
+        )
+    sys.exit(1 if any(row[-1] for row in rows) else 0)
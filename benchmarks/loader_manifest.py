@@ -0,0 +1,67 @@
+"""Cold and warm start of loader.load_migrations with manifest cache.
+
+Usage: python -m benchmarks.loader_manifest [scripts_count]
+"""
+import dataclasses
+from pathlib import Path
+import sys
+import tempfile
+import time
+import typing as t
+
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+
+SCRIPT = """
+import asyncpg
+
+revision = {revision}
+
+
+async def upgrade(c: asyncpg.Connection) -> None:
+    await c.execute('create table table_{revision} (id int)')
+
+
+async def downgrade(c: asyncpg.Connection) -> None:
+    await c.execute('drop table table_{revision}')
+"""
+
+
+def generate_scripts(script_location: Path, count: int) -> None:
+    for revision in range(1, count + 1):
+        (script_location / f'migration_{revision}.py').write_text(
+            SCRIPT.format(revision=revision),
+        )
+
+
+def measure(config: model.Config) -> float:
+    start = time.perf_counter()
+    loader.load_migrations(config)
+    return time.perf_counter() - start
+
+
+def run(count: int) -> t.Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        script_location = Path(tmp_dir) / 'migrations'
+        script_location.mkdir()
+        generate_scripts(script_location, count)
+
+        config = model.Config(
+            script_location=script_location,
+            database_dsn='',
+            database_name='',
+        )
+        return {
+            'no_manifest': measure(config),
+            'cold': measure(dataclasses.replace(config, manifest_cache=True)),
+            'warm': measure(dataclasses.replace(config, manifest_cache=True)),
+        }
+
+
+if __name__ == '__main__':
+    logger.remove()
+    scripts_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    for name, seconds in run(scripts_count).items():
+        sys.stdout.write(f'{name:>12}: {seconds:.3f}s for {scripts_count} scripts\n')
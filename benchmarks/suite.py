@@ -0,0 +1,276 @@
+"""Benchmarks of loader, planner and engine hot paths.
+
+Usage: python -m benchmarks.suite [--counts 10,100,1000,10000]
+    [--dsn postgres://...] [--history-rows 1000000] [--output results.json]
+
+Database benchmarks run only if --dsn is given, they use own schema
+that is dropped afterwards. Results are written as JSON, compare them
+with python -m benchmarks.compare.
+"""
+import argparse
+import asyncio
+import dataclasses
+import datetime as dt
+import json
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+
+import asyncpg
+from benchmarks import loader_manifest
+from loguru import logger
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+SCHEMA = 'asyncpg_migrate_benchmarks'
+
+Results = t.Dict[str, t.Dict[str, float]]
+
+
+def best_of(repeat: int, func: t.Callable[[], t.Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def async_best_of(
+    repeat: int,
+    func: t.Callable[[], t.Awaitable[t.Any]],
+) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_loader(config: model.Config, repeat: int) -> t.Dict[str, float]:
+    return {
+        'no_manifest': best_of(repeat, lambda: loader.load_migrations(config)),
+        # first of repeats writes manifest, minimum is the warm one
+        'manifest_warm': best_of(
+            max(repeat, 2),
+            lambda: loader.load_migrations(
+                dataclasses.replace(config, manifest_cache=True),
+            ),
+        ),
+    }
+
+
+def bench_planner(migrations: model.Migrations, repeat: int) -> t.Dict[str, float]:
+    """Time of planning upgrade to head from every revision below it
+    and downgrade to base from every revision."""
+    revisions = migrations.revisions()
+    # 0 stands for the empty database
+    db_revisions = [0, *revisions[:-1]]
+
+    def _plan_upgrades() -> None:
+        for db_revision in db_revisions:
+            upgrade.plan(migrations, model.Revision(db_revision), 'head')
+
+    def _plan_downgrades() -> None:
+        for db_revision in revisions:
+            downgrade.plan(migrations, db_revision, 'base')
+
+    return {
+        'upgrade': best_of(repeat, _plan_upgrades) / len(db_revisions),
+        'downgrade': best_of(repeat, _plan_downgrades) / len(revisions),
+    }
+
+
+async def bench_noop_upgrade(
+    dsn: str,
+    config: model.Config,
+    migrations: model.Migrations,
+    repeat: int,
+) -> float:
+    """Time of upgrade of database that is already at head."""
+    connection = await asyncpg.connect(dsn=dsn)
+    try:
+        await connection.execute(f'drop schema if exists {SCHEMA} cascade')
+        await connection.execute(f'create schema {SCHEMA}')
+        await migration.create_table(connection, table_schema=SCHEMA)
+        await migration.save(
+            migration=migrations[migrations.head],
+            direction=model.MigrationDir.UP,
+            connection=connection,
+            table_schema=SCHEMA,
+        )
+        return await async_best_of(
+            repeat,
+            lambda: upgrade.run(
+                config=config,
+                target_revision='head',
+                connection=connection,
+                migrations=migrations,
+                table_schema=SCHEMA,
+            ),
+        )
+    finally:
+        await connection.execute(f'drop schema if exists {SCHEMA} cascade')
+        await connection.close()
+
+
+async def bench_history_list(dsn: str, rows: int, repeat: int) -> float:
+    connection = await asyncpg.connect(dsn=dsn)
+    try:
+        await connection.execute(f'drop schema if exists {SCHEMA} cascade')
+        await connection.execute(f'create schema {SCHEMA}')
+        await migration.create_table(connection, table_schema=SCHEMA)
+        await connection.execute(
+            f"""
+            insert into {SCHEMA}._migrations_
+                (revision, label, timestamp, direction, duration, wal_bytes)
+            select i, 'migration_' || i || '.py', now(), 'UP',
+                interval '1 millisecond', 1024
+            from generate_series(1, $1) as i
+            """,
+            rows,
+        )
+        return await async_best_of(
+            repeat,
+            lambda: migration.list(connection, table_schema=SCHEMA),
+        )
+    finally:
+        await connection.execute(f'drop schema if exists {SCHEMA} cascade')
+        await connection.close()
+
+
+def bench_cli_startup(repeat: int) -> float:
+    """Median wall time of ``aiomig version`` in fresh interpreter."""
+    command = [
+        sys.executable,
+        '-c',
+        'from asyncpg_migrate.main import db; db(["version"])',
+    ]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(
+    counts: t.Sequence[int],
+    dsn: t.Optional[str],
+    history_rows: int,
+    repeat: int,
+) -> Results:
+    results: Results = {
+        'loader_no_manifest_seconds': {},
+        'loader_manifest_warm_seconds': {},
+        'planner_seconds_per_plan': {},
+        'downgrade_planner_seconds_per_plan': {},
+    }
+    if dsn:
+        results['noop_upgrade_seconds'] = {}
+
+    for count in counts:
+        logger.info('Benchmarking {count} scripts', count=count)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            script_location = Path(tmp_dir) / 'migrations'
+            script_location.mkdir()
+            loader_manifest.generate_scripts(script_location, count)
+            config = model.Config(
+                script_location=script_location,
+                database_dsn=dsn or '',
+                database_name='',
+            )
+
+            key = str(count)
+            loader_results = bench_loader(config, repeat)
+            results['loader_no_manifest_seconds'][key] = loader_results['no_manifest']
+            results['loader_manifest_warm_seconds'][key] = loader_results['manifest_warm']
+
+            migrations = loader.load_migrations(config)
+            planned = bench_planner(migrations, repeat)
+            results['planner_seconds_per_plan'][key] = planned['upgrade']
+            results['downgrade_planner_seconds_per_plan'][key] = planned['downgrade']
+
+            if dsn:
+                results['noop_upgrade_seconds'][key] = asyncio.run(
+                    bench_noop_upgrade(dsn, config, migrations, repeat),
+                )
+
+    if dsn:
+        logger.info('Benchmarking history of {rows} rows', rows=history_rows)
+        results['history_list_seconds'] = {
+            str(history_rows): asyncio.run(
+                bench_history_list(dsn, history_rows, repeat),
+            ),
+        }
+
+    results['cli_startup_seconds'] = {'version': bench_cli_startup(repeat)}
+    return results
+
+
+def _commit() -> t.Optional[str]:
+    git = shutil.which('git')
+    if git is None:
+        return None
+    try:
+        return subprocess.run(
+            [git, 'rev-parse', 'HEAD'],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: t.Optional[t.Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    parser.add_argument(
+        '--counts',
+        default='10,100,1000,10000',
+        help='Comma separated numbers of generated migration scripts',
+    )
+    parser.add_argument('--dsn', default=None, help='Enables database benchmarks')
+    parser.add_argument('--history-rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path, default=Path('benchmarks.json'))
+    args = parser.parse_args(argv)
+
+    results = run(
+        counts=[int(count) for count in args.counts.split(',')],
+        dsn=args.dsn,
+        history_rows=args.history_rows,
+        repeat=args.repeat,
+    )
+    args.output.write_text(
+        json.dumps(
+            {
+                'commit': _commit(),
+                'python': platform.python_version(),
+                'timestamp': dt.datetime.utcnow().isoformat(),
+                'results': results,
+            },
+            indent=2,
+        ),
+    )
+
+    for name, values in results.items():
+        for variant, seconds in values.items():
+            sys.stdout.write(f'{name:>30} {variant:>8}: {seconds:.6f}s\n')
+
+
+if __name__ == '__main__':
+    logger.remove()
+    logger.add(sys.stderr, level='INFO', filter='benchmarks')
+    main()
@@ -1,4 +1,6 @@
 import os
+from pathlib import Path
+import textwrap
 import typing as t
 
 import asyncpg
@@ -93,3 +95,30 @@ async def downgrade(c: asyncpg.Connection) -> None:
         database_name=db_name,
         database_dsn=db_dsn,
     ), migrations_count
+
+
+@pytest.fixture
+def config_with_scripts(
+    db_name: str,
+    db_dsn: str,
+    tmp_path: Path,
+) -> t.Callable[..., model.Config]:
+    """Writes migrations of given bodies, returns their configuration.
+
+    Body of n-th migration goes to migration_<n>.py, preceded by
+    ``revision = <n>``. Bodies are format strings filled with their
+    revision and any other keyword values given.
+    """
+    def _config(bodies: t.Sequence[str], **values: t.Any) -> model.Config:
+        for revision, body in enumerate(bodies, 1):
+            source = textwrap.dedent(body).format(revision=revision, **values)
+            (tmp_path / f'migration_{revision}.py').write_text(
+                f'revision = {revision}\n{source}',
+            )
+        return model.Config(
+            script_location=tmp_path,
+            database_name=db_name,
+            database_dsn=db_dsn,
+        )
+
+    return _config
@@ -0,0 +1,44 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import api
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import migration
+
+
+@pytest.mark.asyncio
+async def test_migrate_pool(
+    migration_config: t.Tuple[model.Config, int],
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+    api.load_migrations.cache_clear()
+
+    async with asyncpg.create_pool(dsn=db_dsn, min_size=1, max_size=1) as pool:
+        first_revision = await api.migrate(pool, config)
+        second_revision = await api.migrate(pool, config, target='head')
+
+        assert pool._queue.qsize() == 1  # connection has been released
+
+    assert api.load_migrations.cache_info().misses == 1
+    assert second_revision is None
+    if migrations_count:
+        assert first_revision == migrations_count
+        assert (await migration.latest_revision(db_connection)) == migrations_count
+    else:
+        assert first_revision is None
+
+
+@pytest.mark.asyncio
+async def test_migrate_connection(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+
+    finished_revision = await api.migrate(db_connection, config, target='head')
+
+    assert finished_revision == (migrations_count or None)
@@ -0,0 +1,200 @@
+import asyncio
+import functools
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import backfill
+from asyncpg_migrate import constants
+
+CHECKPOINTS = f'{constants.MIGRATIONS_SCHEMA}.{constants.MIGRATIONS_TABLE}_backfill'
+STATEMENT = 'update items set doubled = value * 2 where id >= $1 and id < $2'
+
+
+@pytest.fixture
+async def items(db_connection: asyncpg.Connection) -> int:
+    await db_connection.execute(
+        """
+        create table items (id bigint primary key, value integer, doubled integer);
+        insert into items (id, value) select i * 3, i from generate_series(1, 1000) i;
+        """,
+    )
+    return 1000
+
+
+@pytest.mark.parametrize('parallel', [1, 3])
+@pytest.mark.asyncio
+async def test_backfill(
+    db_connection: asyncpg.Connection,
+    db_dsn: str,
+    items: int,
+    parallel: int,
+) -> None:
+    affected = await backfill.run(
+        db_connection,
+        'items_doubled',
+        table='items',
+        statement=STATEMENT,
+        chunk_size=100,
+        parallel=parallel,
+        connect=functools.partial(asyncpg.connect, dsn=db_dsn),
+    )
+
+    assert affected == items
+    assert (
+        await db_connection.fetchval(
+            'select count(*) from items where doubled = value * 2',
+        )
+    ) == items
+    assert (await db_connection.fetchval(f'select count(*) from {CHECKPOINTS}')) == 0
+
+
+@pytest.mark.asyncio
+async def test_backfill_tenants(db_dsn: str, db_connection: asyncpg.Connection) -> None:
+    schemas = ['backfill_tenant_1', 'backfill_tenant_2']
+    for schema in schemas:
+        await db_connection.execute(
+            f"""
+            create schema {schema};
+            create table {schema}.items (
+                id bigint primary key, value integer, doubled integer
+            );
+            insert into {schema}.items (id, value)
+                select i, i from generate_series(1, 300) i;
+            """,
+        )
+
+    async def _backfill(schema: str) -> int:
+        connection = await asyncpg.connect(
+            dsn=db_dsn,
+            server_settings={'search_path': schema},
+        )
+        try:
+            # interrupted half way through
+            await connection.execute(
+                'alter table items add constraint items_limit check (doubled <= 300)',
+            )
+            with pytest.raises(asyncpg.exceptions.CheckViolationError):
+                await backfill.run(
+                    connection,
+                    'items_doubled',
+                    table='items',
+                    statement=STATEMENT,
+                    chunk_size=50,
+                )
+            await connection.execute('alter table items drop constraint items_limit')
+            return await backfill.run(
+                connection,
+                'items_doubled',
+                table='items',
+                statement=STATEMENT,
+                chunk_size=50,
+                parallel=2,
+                connect=functools.partial(asyncpg.connect, dsn=db_dsn),
+            )
+        finally:
+            await connection.close()
+
+    try:
+        # same backfill of both tenants at the same time
+        assert (await asyncio.gather(*(_backfill(s) for s in schemas))) == [150, 150]
+        for schema in schemas:
+            assert (
+                await db_connection.fetchval(
+                    f'select count(*) from {schema}.items where doubled = value * 2',
+                )
+            ) == 300
+            assert (
+                await db_connection.fetchval(
+                    f"select to_regclass('{schema}._migrations__backfill') is not null",
+                )
+            )
+        assert (
+            await db_connection.fetchval(f"select to_regclass('{CHECKPOINTS}')")
+        ) is None
+    finally:
+        for schema in schemas:
+            await db_connection.execute(f'drop schema {schema} cascade')
+
+
+@pytest.mark.asyncio
+async def test_backfill_empty_table(db_connection: asyncpg.Connection) -> None:
+    await db_connection.execute('create table items (id bigint, doubled integer)')
+
+    assert (
+        await backfill.run(
+            db_connection,
+            'items_doubled',
+            table='items',
+            statement='update items set doubled = 1 where id >= $1 and id < $2',
+        )
+    ) == 0
+
+
+@pytest.mark.asyncio
+async def test_backfill_resumes(
+    db_connection: asyncpg.Connection,
+    items: int,
+) -> None:
+    # chunks with value of 500 or more fail
+    await db_connection.execute(
+        'alter table items add constraint items_limit check (doubled < 1000)',
+    )
+
+    with pytest.raises(asyncpg.exceptions.CheckViolationError):
+        await backfill.run(
+            db_connection,
+            'items_doubled',
+            table='items',
+            statement=STATEMENT,
+            chunk_size=100,
+        )
+
+    # chunks that succeeded stay committed
+    assert (
+        await db_connection.fetchval(
+            'select count(*) from items where doubled is not null',
+        )
+    ) == 400
+    assert (await db_connection.fetchval(f'select position from {CHECKPOINTS}')) == 1203
+
+    await db_connection.execute('alter table items drop constraint items_limit')
+    assert (
+        await backfill.run(
+            db_connection,
+            'items_doubled',
+            table='items',
+            statement=STATEMENT,
+            chunk_size=100,
+        )
+    ) == items - 400
+
+
+@pytest.mark.asyncio
+async def test_backfill_parallel_without_connect(
+    db_connection: asyncpg.Connection,
+    items: int,
+) -> None:
+    with pytest.raises(ValueError, match='needs connect'):
+        await backfill.run(
+            db_connection,
+            'items_doubled',
+            table='items',
+            statement=STATEMENT,
+            parallel=2,
+        )
+    assert not await db_connection.fetchval(
+        'select count(*) from items where doubled is not null',
+    )
+
+
+@pytest.mark.asyncio
+async def test_backfill_in_transaction(db_connection: asyncpg.Connection) -> None:
+    async with db_connection.transaction():
+        with pytest.raises(ValueError):
+            await backfill.run(
+                db_connection,
+                'items_doubled',
+                table='items',
+                statement=STATEMENT,
+            )
@@ -1,3 +1,4 @@
+from pathlib import Path
 import typing as t
 
 import asyncpg
@@ -147,3 +148,40 @@ async def test_downgrade_stepped(
 
         assert (await migration.latest_revision(db_connection)) is not None
         assert (await migration.latest_revision(db_connection)) == 0
+
+
+@pytest.mark.asyncio
+async def test_downgrade_sparse_revisions(
+    tmp_path: Path,
+    db_name: str,
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    revisions = [2, 5, 9, 10]
+    for rev in revisions:
+        (tmp_path / f'migration_{rev}.py').write_text(
+            '\n'.join([
+                f'revision = {rev}',
+                '',
+                'async def upgrade(c):',
+                f'    await c.execute("create table table_{rev} (id int)")',
+                '',
+                'async def downgrade(c):',
+                f'    await c.execute("drop table table_{rev}")',
+            ]),
+        )
+    config = model.Config(
+        script_location=tmp_path,
+        database_name=db_name,
+        database_dsn=db_dsn,
+    )
+
+    assert (await upgrade.run(config, 5, db_connection)) == 5
+    assert (await upgrade.run(config, 'head', db_connection)) == 10
+
+    assert (await downgrade.run(config, -2, db_connection)) == 5
+    assert (await migration.latest_revision(db_connection)) == 5
+    assert (await downgrade.run(config, 'base', db_connection)) == 0
+
+    history = await migration.list(db_connection)
+    assert [h.revision for h in history] == [2, 5, 9, 10, 9, 5, 2, 0]
@@ -0,0 +1,58 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import fanout
+from asyncpg_migrate.engine import migration
+
+
+@pytest.mark.asyncio
+async def test_fan_out_failure_isolated(
+    migration_config: t.Tuple[model.Config, int],
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+    broken_dsn = db_dsn.rsplit('/', 1)[0] + '/database_that_does_not_exist'
+
+    results = await fanout.run(
+        config=config,
+        target_revision='head',
+        dsns=[broken_dsn, db_dsn],
+        concurrency=1,
+    )
+
+    assert [r.target for r in results] == [
+        fanout.redact(broken_dsn),
+        fanout.redact(db_dsn),
+    ]
+    assert results[0].error is not None
+    assert results[1].error is None
+    assert results[1].revision == (migrations_count or None)
+    if migrations_count:
+        assert (await migration.latest_revision(db_connection)) == migrations_count
+
+
+@pytest.mark.asyncio
+async def test_fan_out_downgrade(
+    migration_config: t.Tuple[model.Config, int],
+    db_dsn: str,
+) -> None:
+    config, migrations_count = migration_config
+
+    await fanout.run(config=config, target_revision='head', dsns=[db_dsn])
+    results = await fanout.run(
+        config=config,
+        target_revision='base',
+        dsns=[db_dsn],
+        direction=model.MigrationDir.DOWN,
+    )
+
+    assert results == [
+        model.TargetResult(
+            target=fanout.redact(db_dsn),
+            revision=model.Revision(0) if migrations_count else None,
+        ),
+    ]
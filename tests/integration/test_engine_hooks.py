@@ -0,0 +1,118 @@
+import dataclasses
+from pathlib import Path
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import upgrade
+
+
+@pytest.mark.asyncio
+async def test_hooks(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+    config = dataclasses.replace(config, measure_wal=True)
+    events: t.List[model.Event] = []
+
+    async def _hook(event: model.Event) -> None:
+        events.append(event)
+
+    await upgrade.run(config, 'head', db_connection, hooks=[_hook])
+
+    migration_events = [
+        model.EventType.BEFORE_MIGRATION,
+        model.EventType.AFTER_MIGRATION,
+    ] * migrations_count
+    assert [e.type for e in events] == [
+        model.EventType.BEFORE_PLAN,
+        *migration_events,
+        model.EventType.AFTER_RUN,
+    ]
+    assert events[0].revision is None
+    assert events[-1].revision == (migrations_count or None)
+    assert events[-1].error is None
+    revisions = range(1, migrations_count + 1)
+    assert [e.revision for e in events[1:-1]] == sorted([*revisions, *revisions])
+    for event in events[2:-1:2]:
+        assert event.duration is not None
+        assert event.wal_bytes is not None
+
+    events.clear()
+    await downgrade.run(config, 'base', db_connection, hooks=[_hook])
+    assert [e.type for e in events][1:-1] == migration_events
+    assert all(e.direction == model.MigrationDir.DOWN for e in events)
+
+
+@pytest.mark.asyncio
+async def test_hooks_on_error(
+    tmp_path: Path,
+    db_name: str,
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            '',
+            'async def upgrade(c):',
+            '    await c.execute("select * from not_there")',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+    config = model.Config(
+        script_location=tmp_path,
+        database_name=db_name,
+        database_dsn=db_dsn,
+    )
+    events: t.List[model.Event] = []
+
+    async def _hook(event: model.Event) -> None:
+        events.append(event)
+
+    with pytest.raises(RuntimeError):
+        await upgrade.run(config, 'head', db_connection, hooks=[_hook])
+
+    assert [e.type for e in events] == [
+        model.EventType.BEFORE_PLAN,
+        model.EventType.BEFORE_MIGRATION,
+        model.EventType.ON_ERROR,
+        model.EventType.AFTER_RUN,
+    ]
+    assert events[2].migration is not None
+    assert events[2].revision == 1
+    assert events[2].error is not None
+    assert events[3].error is events[2].error
+
+
+@pytest.mark.asyncio
+async def test_metrics_textfile(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    tmp_path: Path,
+) -> None:
+    config, migrations_count = migration_config
+    textfile = tmp_path / 'aiomig.prom'
+    config = dataclasses.replace(config, metrics_textfile=textfile)
+
+    await upgrade.run(config, 'head', db_connection)
+
+    content = textfile.read_text()
+    labels = f'database="{config.database_name}",direction="UP",schema="public"'
+    assert f'asyncpg_migrate_lock_wait_seconds{{{labels}}}' in content
+    assert f'asyncpg_migrate_run_duration_seconds{{{labels}}}' in content
+    if migrations_count:
+        assert (
+            f'asyncpg_migrate_migrations_applied_total{{{labels}}} {migrations_count}'
+        ) in content
+        assert (
+            f'asyncpg_migrate_revision{{database="{config.database_name}",'
+            f'schema="public"}} '
+            f'{migrations_count}'
+        ) in content
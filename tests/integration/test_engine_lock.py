@@ -0,0 +1,143 @@
+import asyncio
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import lock
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+LOCK_KEY = lock.default_key(constants.MIGRATIONS_SCHEMA, constants.MIGRATIONS_TABLE)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_upgrade(
+    migration_config: t.Tuple[model.Config, int],
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+
+    connections = [await asyncpg.connect(dsn=db_dsn) for _ in range(4)]
+    try:
+        revisions = await asyncio.gather(
+            *(
+                upgrade.run(
+                    config=config,
+                    target_revision='head',
+                    connection=connection,
+                ) for connection in connections
+            ),
+        )
+    finally:
+        for connection in connections:
+            await connection.close()
+
+    if migrations_count:
+        # exactly one node migrated, others found database at head
+        assert sorted(revisions, key=bool) == [None, None, None, migrations_count]
+        assert len(await migration.list(db_connection)) == migrations_count
+    else:
+        assert revisions == [None, None, None, None]
+
+
+@pytest.mark.parametrize('engine_run', [upgrade.run, downgrade.run])
+@pytest.mark.asyncio
+async def test_try_lock_skips(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    db_dsn: str,
+    engine_run: t.Callable[..., t.Awaitable[t.Optional[model.Revision]]],
+) -> None:
+    config, _ = migration_config
+
+    await db_connection.execute('select pg_advisory_lock($1)', LOCK_KEY)
+
+    connection = await asyncpg.connect(dsn=db_dsn)
+    try:
+        assert (
+            await engine_run(
+                config=config,
+                target_revision='base' if engine_run is downgrade.run else 'head',
+                connection=connection,
+                lock_mode=model.LockMode.TRY,
+            )
+        ) is None
+    finally:
+        await connection.close()
+
+    # nothing, not even migrations table, has been created
+    assert (
+        await db_connection.fetchval(
+            f"select to_regclass('{constants.MIGRATIONS_SCHEMA}."
+            f"{constants.MIGRATIONS_TABLE}')",
+        )
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_lock_timeout(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    db_dsn: str,
+) -> None:
+    config, _ = migration_config
+
+    await db_connection.execute('select pg_advisory_lock($1)', 1)
+
+    connection = await asyncpg.connect(dsn=db_dsn)
+    try:
+        with pytest.raises(lock.LockNotAcquired):
+            await upgrade.run(
+                config=config,
+                target_revision='head',
+                connection=connection,
+                lock_key=1,
+                lock_timeout=0.1,
+            )
+
+        # lock_timeout does not leak into the session
+        assert (await connection.fetchval('show lock_timeout')) == '0'
+    finally:
+        await connection.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('lock_timeout', ['0', '5s'])
+async def test_lock_timeout_in_transaction(
+    db_connection: asyncpg.Connection,
+    lock_timeout: str,
+) -> None:
+    async with db_connection.transaction():
+        await db_connection.execute(f"set local lock_timeout = '{lock_timeout}'")
+
+        async with lock.advisory_lock(db_connection, 1, timeout=0.1) as acquired:
+            assert acquired
+            # caller's setting is back once the lock is held
+            assert (await db_connection.fetchval('show lock_timeout')) == lock_timeout
+
+        assert (await db_connection.fetchval('show lock_timeout')) == lock_timeout
+
+
+@pytest.mark.asyncio
+async def test_lock_released(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, _ = migration_config
+
+    await upgrade.run(
+        config=config,
+        target_revision='head',
+        connection=db_connection,
+    )
+
+    assert (
+        await db_connection.fetchval(
+            "select count(*) from pg_locks where locktype = 'advisory'",
+        )
+    ) == 0
@@ -1,3 +1,5 @@
+import dataclasses
+import datetime as dt
 import typing as t
 
 import asyncpg
@@ -8,6 +10,7 @@ from asyncpg_migrate import constants
 from asyncpg_migrate import model
 from asyncpg_migrate.engine import downgrade
 from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import tenants
 from asyncpg_migrate.engine import upgrade
 
 
@@ -150,6 +153,63 @@ async def test_migration_history_no_revision(db_connection: asyncpg.Connection)
     assert not (await migration.list(db_connection))
 
 
+@pytest.mark.asyncio
+async def test_migration_history_filters(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+    if migrations_count:
+        await upgrade.run(config, 'HEAD', db_connection)
+        await downgrade.run(config, 'BASE', db_connection)
+        # entry N is recorded N days after 2020-01-01
+        await db_connection.execute(
+            f"""
+            update {constants.MIGRATIONS_SCHEMA}.{constants.MIGRATIONS_TABLE}
+                set timestamp = '2020-01-01'::timestamp + id * interval '1 day'
+            """,
+        )
+        history = await migration.list(db_connection)
+
+        async def _filtered(**filters: t.Any) -> t.List[model.MigrationHistoryEntry]:
+            return [
+                entry async for entry in migration.history(
+                    db_connection,
+                    prefetch=1,
+                    **filters,
+                )
+            ]
+
+        assert (await _filtered()) == history
+        assert (await _filtered(limit=1)) == history[:1]
+        assert (await _filtered(offset=1, limit=2)) == history[1:3]
+        since_2 = [entry for entry in history if entry.revision >= 2]
+        assert (await _filtered(since_revision=2)) == since_2
+        until_1 = [entry for entry in history if entry.revision <= 1]
+        assert (await _filtered(until_revision=1)) == until_1
+        since, until = dt.datetime(2020, 1, 3), dt.datetime(2020, 1, 4)
+        assert (await _filtered(since=since, until=until)) == history[1:3]
+        assert (await _filtered(since=dt.datetime(2020, 1, 3), limit=1)) == history[1:2]
+        assert (await _filtered(since=dt.datetime(2021, 1, 1))) == []
+
+
+@pytest.mark.asyncio
+async def test_migration_history_stream_closed_early(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+    if migrations_count:
+        await upgrade.run(config, 'HEAD', db_connection)
+
+        entries = migration.history(db_connection, prefetch=1)
+        first = await entries.__anext__()
+        await entries.aclose()
+
+        assert first.revision == 1
+        assert not db_connection.is_in_transaction()
+
+
 @pytest.mark.asyncio
 async def test_migration_history_up_head(
     migration_config: t.Tuple[model.Config, int],
@@ -228,3 +288,224 @@ async def test_migration_history_up_head_down_1(
         latest_rev = history[-1]
         assert latest_rev.revision == db_rev
         assert latest_rev.direction == model.MigrationDir.DOWN
+
+
+@pytest.mark.asyncio
+async def test_migration_history_order_same_timestamp(
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+) -> None:
+    frozen_now = dt.datetime.today()
+    mocker.patch(
+        'asyncpg_migrate.engine.migration.dt.datetime',
+        mocker.Mock(today=mocker.Mock(return_value=frozen_now)),
+    )
+
+    await migration.create_table(db_connection)
+    for direction, revision in [
+        (model.MigrationDir.UP, 1),
+        (model.MigrationDir.UP, 2),
+        (model.MigrationDir.DOWN, 2),
+        (model.MigrationDir.UP, 2),
+        (model.MigrationDir.DOWN, 2),
+    ]:
+        await migration.save(
+            connection=db_connection,
+            migration=model.Migration(
+                revision=model.Revision(revision),
+                label=__name__,
+                path=mocker.stub(),
+                upgrade=mocker.stub(),
+                downgrade=mocker.stub(),
+            ),
+            direction=direction,
+        )
+
+    history = await migration.list(db_connection)
+
+    assert [(h.revision, h.direction) for h in history] == [
+        (1, model.MigrationDir.UP),
+        (2, model.MigrationDir.UP),
+        (1, model.MigrationDir.DOWN),
+        (2, model.MigrationDir.UP),
+        (1, model.MigrationDir.DOWN),
+    ]
+    assert (await migration.latest_revision(db_connection)) == 1
+
+
+@pytest.mark.asyncio
+async def test_create_table_idempotent(db_connection: asyncpg.Connection) -> None:
+    await migration.create_table(db_connection)
+    await migration.create_table(db_connection)
+
+    layout = await db_connection.fetchval(
+        "select obj_description('{schema}.{table}'::regclass, 'pg_class')".format(
+            schema=constants.MIGRATIONS_SCHEMA,
+            table=constants.MIGRATIONS_TABLE,
+        ),
+    )
+    assert int(layout) == migration.LAYOUT
+
+
+@pytest.mark.parametrize('schema', [constants.MIGRATIONS_SCHEMA, "tenant_o'c"])
+@pytest.mark.asyncio
+async def test_create_table_upgrades_legacy_layout(
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+    schema: str,
+) -> None:
+    table_schema = tenants.quote_ident(schema)
+    await db_connection.execute(f'create schema if not exists {table_schema}')
+    await db_connection.execute(
+        """
+        create type {schema}.{table}_direction as enum ('UP', 'DOWN');
+        create table {schema}.{table} (
+            revision integer not null,
+            label text not null,
+            timestamp timestamp not null,
+            direction {schema}.{table}_direction not null,
+
+            check(revision >= 0)
+        );
+        insert into {schema}.{table} values
+            (2, 'migration_2.py', '2020-01-01 00:00:02', 'UP'),
+            (1, 'migration_1.py', '2020-01-01 00:00:01', 'UP'),
+            (1, 'migration_2.py', '2020-01-01 00:00:03', 'DOWN');
+        """.format(
+            schema=table_schema,
+            table=constants.MIGRATIONS_TABLE,
+        ),
+    )
+
+    try:
+        await migration.create_table(db_connection, table_schema)
+
+        history = await migration.list(db_connection, table_schema)
+        assert [(h.revision, h.direction) for h in history] == [
+            (1, model.MigrationDir.UP),
+            (2, model.MigrationDir.UP),
+            (1, model.MigrationDir.DOWN),
+        ]
+        assert (await migration.latest_revision(db_connection, table_schema)) == 1
+
+        await migration.save(
+            connection=db_connection,
+            migration=model.Migration(
+                revision=model.Revision(2),
+                label='migration_2.py',
+                path=mocker.stub(),
+                upgrade=mocker.stub(),
+                downgrade=mocker.stub(),
+            ),
+            direction=model.MigrationDir.UP,
+            table_schema=table_schema,
+        )
+        assert (await migration.latest_revision(db_connection, table_schema)) == 2
+        assert len(await migration.list(db_connection, table_schema)) == 4
+    finally:
+        if schema != constants.MIGRATIONS_SCHEMA:
+            await db_connection.execute(f'drop schema {table_schema} cascade')
+
+
+@pytest.mark.asyncio
+async def test_check_layout(db_connection: asyncpg.Connection) -> None:
+    with pytest.raises(migration.MigrationTableMissing):
+        await migration.check_layout(db_connection)
+    assert (await migration.table_layout(db_connection)) is None
+
+    await migration.create_table(db_connection)
+    await db_connection.execute(
+        "comment on table {schema}.{table} is '2'".format(
+            schema=constants.MIGRATIONS_SCHEMA,
+            table=constants.MIGRATIONS_TABLE,
+        ),
+    )
+    with pytest.raises(migration.MigrationTableOutdated):
+        await migration.check_layout(db_connection)
+    # read-only check leaves the table alone
+    assert (await migration.table_layout(db_connection)) == 2
+
+    await db_connection.execute(
+        "comment on table {schema}.{table} is '{layout}'".format(
+            schema=constants.MIGRATIONS_SCHEMA,
+            table=constants.MIGRATIONS_TABLE,
+            layout=migration.LAYOUT,
+        ),
+    )
+    await migration.check_layout(db_connection)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('batch', [True, False])
+async def test_history_writer(
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+    batch: bool,
+) -> None:
+    await migration.create_table(db_connection)
+    history = migration.HistoryWriter(db_connection, batch=batch)
+
+    for revision in range(1, 6):
+        await history.save(
+            migration=model.Migration(
+                revision=model.Revision(revision),
+                label=__name__,
+                path=mocker.stub(),
+                upgrade=mocker.stub(),
+                downgrade=mocker.stub(),
+            ),
+            direction=model.MigrationDir.UP,
+        )
+
+    assert len(await migration.list(db_connection)) == (0 if batch else 5)
+    await history.flush()
+
+    history_entries = await migration.list(db_connection)
+    assert [h.revision for h in history_entries] == [1, 2, 3, 4, 5]
+    assert (await migration.latest_revision(db_connection)) == 5
+
+
+@pytest.mark.asyncio
+async def test_migration_history_batch(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+) -> None:
+    config, migrations_count = migration_config
+    if migrations_count:
+        executemany_spy = mocker.spy(asyncpg.Connection, 'executemany')
+
+        await upgrade.run(config, 'HEAD', db_connection, batch_history=True)
+        await downgrade.run(config, 'BASE', db_connection, batch_history=True)
+
+        history = await migration.list(db_connection)
+        assert executemany_spy.call_count == 2
+        ups = [(rev, model.MigrationDir.UP) for rev in range(1, migrations_count + 1)]
+        downs = [(rev - 1, model.MigrationDir.DOWN) for rev, _ in reversed(ups)]
+        assert [(h.revision, h.direction) for h in history] == ups + downs
+        assert (await migration.latest_revision(db_connection)) == 0
+
+
+@pytest.mark.parametrize('measure_wal', [False, True])
+@pytest.mark.asyncio
+async def test_migration_history_stats(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    measure_wal: bool,
+) -> None:
+    config, migrations_count = migration_config
+    config = dataclasses.replace(config, measure_wal=measure_wal)
+
+    await upgrade.run(config, 'HEAD', db_connection)
+
+    history = await migration.list(db_connection)
+    assert len(history) == migrations_count
+    for entry in history:
+        assert entry.duration is not None
+        assert entry.duration > dt.timedelta(0)
+        if measure_wal:
+            # every migration creates a table
+            assert entry.wal_bytes is not None
+            assert entry.wal_bytes > 0
+        else:
+            assert entry.wal_bytes is None
@@ -0,0 +1,81 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+MIGRATIONS = [
+    """
+async def upgrade(c):
+    await c.execute('create table items (id integer)')
+    await c.execute('insert into items values {values}')
+
+async def downgrade(c):
+    await c.execute('drop table items')
+""",
+    """
+transactional = False
+
+async def upgrade(c):
+    await c.execute('create unique index concurrently items_id on items (id)')
+
+async def downgrade(c):
+    await c.execute('drop index concurrently items_id')
+""",
+    """
+async def upgrade(c):
+    await c.execute('alter table items add column name text')
+
+async def downgrade(c):
+    await c.execute('alter table items drop column name')
+""",
+]
+
+
+@pytest.mark.asyncio
+async def test_non_transactional(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts(MIGRATIONS, values='(1), (2)')
+
+    assert (await upgrade.run(config, 'head', db_connection)) == 3
+    assert (await migration.invalid_indexes(db_connection)) == set()
+    assert (
+        await db_connection.fetchval("select to_regclass('items_id')::text")
+    ) == 'items_id'
+    history = await migration.list(db_connection)
+    assert [(entry.revision, entry.direction) for entry in history] == [
+        (1, model.MigrationDir.UP),
+        (2, model.MigrationDir.UP),
+        (3, model.MigrationDir.UP),
+    ]
+
+    assert (await downgrade.run(config, 'base', db_connection)) == 0
+    assert (await migration.latest_revision(db_connection)) == 0
+
+
+@pytest.mark.parametrize('batch_history', [False, True])
+@pytest.mark.asyncio
+async def test_non_transactional_invalid_index(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    batch_history: bool,
+) -> None:
+    config = config_with_scripts(MIGRATIONS, values='(1), (1)')
+
+    with pytest.raises(RuntimeError, match='items_id'):
+        await upgrade.run(
+            config,
+            'head',
+            db_connection,
+            batch_history=batch_history,
+        )
+
+    # migration preceding failed one has been committed on its own
+    assert (await migration.latest_revision(db_connection)) == 1
+    assert (await migration.invalid_indexes(db_connection)) == {'items_id'}
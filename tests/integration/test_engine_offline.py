@@ -0,0 +1,120 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import offline
+from asyncpg_migrate.engine import upgrade
+
+
+@pytest.mark.asyncio
+async def test_offline_round_trip(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+
+    up_script = await offline.run(config, 'head', model.MigrationDir.UP)
+    if not migrations_count:
+        assert up_script is None
+        return
+    assert up_script is not None
+    assert '-1 -f' in up_script
+    # fresh table is created in the latest layout, nothing is read
+    assert 'to_regclass' not in up_script
+    assert 'alter table' not in up_script
+
+    async with db_connection.transaction():
+        await db_connection.execute(up_script)
+
+    assert (await migration.latest_revision(db_connection)) == migrations_count
+    history = await migration.list(db_connection)
+    assert [(entry.revision, entry.direction) for entry in history] == [
+        (revision, model.MigrationDir.UP) for revision in range(1, migrations_count + 1)
+    ]
+    for revision in range(1, migrations_count + 1):
+        assert await db_connection.fetchval(
+            f"select to_regclass('table_{revision}') is not null",
+        )
+
+    down_script = await offline.run(config, 'base', model.MigrationDir.DOWN)
+    assert down_script is not None
+
+    async with db_connection.transaction():
+        await db_connection.execute(down_script)
+
+    assert (await migration.latest_revision(db_connection)) == 0
+    assert not await db_connection.fetchval("select to_regclass('table_1')")
+
+
+@pytest.mark.parametrize('migration_config', [5], indirect=True)
+@pytest.mark.asyncio
+async def test_offline_from_revision(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config, migrations_count = migration_config
+
+    assert (await upgrade.run(config, 1, db_connection)) == 1
+
+    script = await offline.run(
+        config,
+        'head',
+        model.MigrationDir.UP,
+        from_revision=1,
+    )
+    assert script is not None
+    assert 'table_1 ' not in script
+    assert 'create table if not exists' not in script
+
+    async with db_connection.transaction():
+        await db_connection.execute(script)
+
+    assert (await migration.latest_revision(db_connection)) == migrations_count
+    assert (
+        await offline.run(
+            config,
+            'head',
+            model.MigrationDir.UP,
+            from_revision='head',
+        )
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_offline_non_transactional(
+    config_with_scripts: t.Callable[..., model.Config],
+) -> None:
+    config = config_with_scripts([
+        """
+        async def upgrade(c):
+            await c.execute('create table items (id integer)')
+
+        async def downgrade(c):
+            await c.execute('drop table items')
+        """,
+        """
+        transactional = False
+        lock_timeout = 5
+
+        async def upgrade(c):
+            await c.execute('create index concurrently items_id on items (id)')
+
+        async def downgrade(c):
+            await c.execute('drop index concurrently items_id')
+        """,
+    ])
+
+    script = await offline.run(config, 'head', model.MigrationDir.UP)
+
+    assert script is not None
+    assert '-1 -f' not in script
+    statements = [line for line in script.splitlines() if not line.startswith('--')]
+    create_index = statements.index('create index concurrently items_id on items (id);')
+    assert statements[create_index - 1] == "set lock_timeout = '5000ms';"
+    assert statements[create_index + 1] == 'reset lock_timeout;'
+    # only transactional migrations are wrapped in begin and commit
+    assert statements.count('begin;') == statements.count('commit;') == 2
+    assert 'begin;' not in statements[create_index - 2:create_index + 4]
@@ -0,0 +1,113 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import tenants
+
+TENANTS = ['tenant_a', 'tenant_b', 'Tenant C', "tenant_o'c"]
+
+
+@pytest.fixture()
+async def tenant_schemas(
+    db_connection: asyncpg.Connection,
+) -> t.AsyncGenerator[t.List[str], None]:
+    for schema in TENANTS:
+        await db_connection.execute(f'create schema {tenants.quote_ident(schema)}')
+    yield TENANTS
+    for schema in TENANTS:
+        await db_connection.execute(
+            f'drop schema if exists {tenants.quote_ident(schema)} cascade',
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'pattern,query,expected',
+    [
+        ('tenant_%', None, ['tenant_a', 'tenant_b', "tenant_o'c"]),
+        ('tenant_b', None, ['tenant_b']),
+        (
+            None,
+            "select nspname from pg_namespace where nspname ilike 'tenant%' "
+            'order by 1',
+            ['Tenant C', 'tenant_a', 'tenant_b', "tenant_o'c"],
+        ),
+    ],
+)
+async def test_discover(
+    db_connection: asyncpg.Connection,
+    tenant_schemas: t.List[str],
+    pattern: t.Optional[str],
+    query: t.Optional[str],
+    expected: t.List[str],
+) -> None:
+    assert (await tenants.discover(db_connection, pattern, query)) == expected
+
+
+@pytest.mark.asyncio
+async def test_tenants_upgrade_downgrade(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    tenant_schemas: t.List[str],
+) -> None:
+    config, migrations_count = migration_config
+
+    results = await tenants.run(
+        config=config,
+        target_revision='head',
+        schemas=tenant_schemas,
+        concurrency=2,
+    )
+
+    assert [r.target for r in results] == tenant_schemas
+    assert all(r.error is None for r in results)
+    assert all(r.revision == (migrations_count or None) for r in results)
+
+    for schema in tenant_schemas:
+        table_schema = tenants.quote_ident(schema)
+        revision = await migration.latest_revision(db_connection, table_schema)
+        assert revision == (migrations_count or None)
+        tables = await db_connection.fetchval(
+            'select count(*) from pg_tables '
+            "where schemaname = $1 and tablename like 'table_%'",
+            schema,
+        )
+        assert tables == migrations_count
+
+    # nothing leaked into default migrations table
+    assert (
+        await db_connection.fetchval(
+            'select to_regclass($1)',
+            f'{constants.MIGRATIONS_SCHEMA}.{constants.MIGRATIONS_TABLE}',
+        )
+    ) is None
+
+    results = await tenants.run(
+        config=config,
+        target_revision='base',
+        schemas=tenant_schemas,
+        direction=model.MigrationDir.DOWN,
+    )
+    assert all(r.error is None for r in results)
+    assert all(r.revision == (0 if migrations_count else None) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_tenants_failure_isolated(
+    migration_config: t.Tuple[model.Config, int],
+    tenant_schemas: t.List[str],
+) -> None:
+    config, migrations_count = migration_config
+
+    results = await tenants.run(
+        config=config,
+        target_revision='head',
+        schemas=['missing_tenant', *tenant_schemas],
+    )
+
+    assert results[0].error is not None
+    assert all(r.error is None for r in results[1:])
@@ -0,0 +1,121 @@
+import asyncio
+import dataclasses
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+MIGRATIONS = [
+    """
+
+async def upgrade(c):
+    await c.execute('create table first (id integer)')
+
+async def downgrade(c):
+    await c.execute('drop table first')
+""",
+    """
+lock_timeout = 0.1
+lock_retries = {lock_retries}
+lock_retry_delay = 0.05
+
+async def upgrade(c):
+    await c.execute('alter table blocked add column name text')
+
+async def downgrade(c):
+    await c.execute('alter table blocked drop column name')
+""",
+    """
+
+async def upgrade(c):
+    await c.execute(
+        "create table seen as select current_setting('lock_timeout') as value"
+    )
+
+async def downgrade(c):
+    await c.execute('drop table seen')
+""",
+]
+
+
+@pytest.fixture
+async def blocker(
+    db_connection: asyncpg.Connection,
+    db_dsn: str,
+) -> asyncpg.Connection:
+    await db_connection.execute('create table blocked (id integer)')
+
+    connection = await asyncpg.connect(dsn=db_dsn)
+    await connection.execute('begin; lock table blocked')
+    yield connection
+    await connection.close()
+
+
+@pytest.mark.asyncio
+async def test_lock_timeout_retried(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    blocker: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts(MIGRATIONS, lock_retries=20)
+
+    async def _release() -> None:
+        await asyncio.sleep(0.3)
+        await blocker.execute('commit')
+
+    release = asyncio.ensure_future(_release())
+    assert (await upgrade.run(config, 'head', db_connection)) == 3
+    await release
+
+    assert [entry.revision for entry in await migration.list(db_connection)] == [
+        1,
+        2,
+        3,
+    ]
+    # module level lock_timeout did not leak into following migration
+    assert (await db_connection.fetchval('select value from seen')) == '0'
+    assert (await db_connection.fetchval('show lock_timeout')) == '0'
+
+
+@pytest.mark.asyncio
+async def test_lock_timeout_retries_exhausted(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    blocker: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts(MIGRATIONS, lock_retries=1)
+
+    with pytest.raises(RuntimeError, match='lock timeout'):
+        await upgrade.run(config, 'head', db_connection)
+    assert (await migration.latest_revision(db_connection)) is None
+
+
+@pytest.mark.asyncio
+async def test_statement_timeout(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts([
+        """
+        async def upgrade(c):
+            await c.execute('select pg_sleep(5)')
+
+        async def downgrade(c):
+            ...
+        """,
+    ])
+
+    with pytest.raises(RuntimeError, match='statement timeout'):
+        await upgrade.run(
+            dataclasses.replace(
+                config,
+                timeouts=model.Timeouts(statement_timeout=0.1, lock_retries=3),
+            ),
+            'head',
+            db_connection,
+        )
+    assert (await db_connection.fetchval('show statement_timeout')) == '0'
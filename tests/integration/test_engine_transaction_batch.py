@@ -0,0 +1,80 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+
+@pytest.fixture
+def config(
+    config_with_scripts: t.Callable[[t.Sequence[str]], model.Config],
+) -> model.Config:
+    return config_with_scripts([
+        f"""
+        async def upgrade(c):
+            await c.execute('create table table_{revision} (id integer)')
+
+        async def downgrade(c):
+            await c.execute('drop table table_{revision}')
+        """ for revision in range(1, 6)
+    ])
+
+
+@pytest.mark.parametrize(
+    'transaction_batch,committed_revision',
+    [
+        (None, None),
+        (1, 3),
+        (2, 2),
+        (5, None),
+    ],
+)
+@pytest.mark.asyncio
+async def test_upgrade_resumes(
+    config: model.Config,
+    db_connection: asyncpg.Connection,
+    transaction_batch: t.Optional[int],
+    committed_revision: t.Optional[int],
+) -> None:
+    # makes 4th migration fail
+    await db_connection.execute('create table table_4 (id integer)')
+
+    with pytest.raises(RuntimeError):
+        await upgrade.run(
+            config,
+            'head',
+            db_connection,
+            transaction_batch=transaction_batch,
+        )
+    assert (await migration.latest_revision(db_connection)) == committed_revision
+
+    await db_connection.execute('drop table table_4')
+    assert (
+        await upgrade.run(
+            config,
+            'head',
+            db_connection,
+            transaction_batch=transaction_batch,
+        )
+    ) == 5
+
+    # committed migrations have not been applied again
+    history = await migration.list(db_connection)
+    assert [entry.revision for entry in history] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_downgrade_per_migration(
+    config: model.Config,
+    db_connection: asyncpg.Connection,
+) -> None:
+    await upgrade.run(config, 'head', db_connection)
+    await db_connection.execute('drop table table_2')
+
+    with pytest.raises(RuntimeError):
+        await downgrade.run(config, 'base', db_connection, transaction_batch=1)
+    assert (await migration.latest_revision(db_connection)) == 2
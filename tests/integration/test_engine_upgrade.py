@@ -3,6 +3,7 @@ import typing as t
 
 import asyncpg
 import pytest
+import pytest_mock as ptm
 
 from asyncpg_migrate import model
 from asyncpg_migrate.engine import migration
@@ -131,3 +132,33 @@ async def test_upgrade_to_lower_revision(
         assert (await migration.latest_revision(db_connection)) is not None
         assert (await migration.latest_revision(db_connection)) == first_run_rev
         assert (await migration.latest_revision(db_connection)) == last_revision
+
+
+@pytest.mark.asyncio
+async def test_upgrade_reload_schema_state(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+) -> None:
+    config, migrations_count = migration_config
+    reload_spy = mocker.spy(asyncpg.Connection, 'reload_schema_state')
+
+    await upgrade.run(config, 'HEAD', db_connection)
+    assert reload_spy.call_count == (1 if migrations_count else 0)
+
+    # already at head, caches of connection are left intact
+    await upgrade.run(config, 'HEAD', db_connection)
+    assert reload_spy.call_count == (1 if migrations_count else 0)
+
+
+@pytest.mark.asyncio
+async def test_upgrade_no_reload_schema_state(
+    migration_config: t.Tuple[model.Config, int],
+    db_connection: asyncpg.Connection,
+    mocker: ptm.MockFixture,
+) -> None:
+    config, _ = migration_config
+    reload_spy = mocker.spy(asyncpg.Connection, 'reload_schema_state')
+
+    await upgrade.run(config, 'HEAD', db_connection, reload_schema_state=False)
+    assert not reload_spy.called
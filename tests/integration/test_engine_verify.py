@@ -0,0 +1,155 @@
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import constants
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import verify
+
+MIGRATION = """
+async def upgrade(c):
+    await c.execute('create type state_{revision} as enum (\\'on\\', \\'off\\')')
+    await c.execute('''
+        create table items_{revision} (
+            id serial primary key,
+            name text not null default 'item',
+            state state_{revision}
+        )
+    ''')
+    await c.execute('create index items_{revision}_name on items_{revision} (name)')
+
+async def downgrade(c):
+    await c.execute('drop table items_{revision}')
+    await c.execute('drop type state_{revision}')
+"""
+
+KEEP_INDEX = """
+async def upgrade(c):
+    await c.execute('create index if not exists items_1_id on items_1 (id)')
+
+async def downgrade(c):
+    pass
+"""
+
+NOT_REPEATABLE = """
+calls = []
+
+async def upgrade(c):
+    calls.append(c)
+    column_type = 'integer' if len(calls) == 1 else 'bigint'
+    await c.execute(f'create table items_2 (id {{column_type}})')
+
+async def downgrade(c):
+    await c.execute('drop table items_2')
+"""
+
+
+async def _scratch_databases(connection: asyncpg.Connection) -> t.List[str]:
+    return [
+        record['datname'] for record in await connection.fetch(
+            "select datname from pg_database where datname like '%\\_verify\\_%'",
+        )
+    ]
+
+
+@pytest.mark.parametrize('count,concurrency', [(1, 4), (5, 1), (5, 2), (6, 3)])
+@pytest.mark.asyncio
+async def test_verify(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    count: int,
+    concurrency: int,
+) -> None:
+    config = config_with_scripts([MIGRATION] * count)
+
+    results = await verify.run(config, concurrency=concurrency)
+
+    assert results == [
+        model.TargetResult(
+            target=f'migration_{revision}.py',
+            revision=model.Revision(revision),
+        ) for revision in range(1, count + 1)
+    ]
+    assert await _scratch_databases(db_connection) == []
+    # configured database is left alone
+    assert (await db_connection.fetchval("select to_regclass('items_1')")) is None
+
+
+@pytest.mark.parametrize('concurrency', [1, 2, 3])
+@pytest.mark.asyncio
+async def test_verify_downgrade_not_reverting(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    concurrency: int,
+) -> None:
+    config = config_with_scripts([MIGRATION, KEEP_INDEX, *[MIGRATION] * 4])
+
+    results = await verify.run(config, concurrency=concurrency)
+
+    assert [result.revision for result in results] == [1, 2, 3, 4, 5, 6]
+    assert results[0].error is None
+    assert results[1].error is not None
+    assert 'downgrade does not revert upgrade' in results[1].error
+    assert 'unexpected index' in results[1].error
+    assert 'items_1_id' in results[1].error
+
+    # the rest of range of revision 2 is not verified, others are
+    size = -(-6 // concurrency)
+    for result in results[2:size]:
+        assert result.error == 'not verified, migration_2.py has failed'
+    for result in results[max(size, 2):]:
+        assert result.error is None
+    assert await _scratch_databases(db_connection) == []
+
+
+@pytest.mark.asyncio
+async def test_verify_upgrade_not_repeatable(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts([MIGRATION, NOT_REPEATABLE])
+
+    results = await verify.run(config, concurrency=1)
+
+    assert results[0].error is None
+    assert results[1].error is not None
+    assert 'upgrade after downgrade differs' in results[1].error
+    assert 'missing column public.items_2.id integer' in results[1].error
+    assert 'unexpected column public.items_2.id bigint' in results[1].error
+
+
+@pytest.mark.asyncio
+async def test_verify_no_migrations(
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts([])
+    assert (await verify.run(config)) == []
+    assert await _scratch_databases(db_connection) == []
+
+
+@pytest.mark.asyncio
+async def test_fingerprint(db_connection: asyncpg.Connection) -> None:
+    await migration.create_table(db_connection)
+    await db_connection.execute('create schema verify_fp')
+    try:
+        before = await verify.fingerprint(db_connection)
+        await db_connection.execute(
+            'create table verify_fp.items (id integer primary key, name text)',
+        )
+        created = await verify.fingerprint(db_connection)
+        await db_connection.execute(
+            'alter table verify_fp.items alter column name type varchar(10)',
+        )
+        altered = await verify.fingerprint(db_connection)
+    finally:
+        await db_connection.execute('drop schema verify_fp cascade')
+
+    assert before < created
+    assert 'column verify_fp.items.name text' in created
+    assert 'column verify_fp.items.name character varying(10)' in altered
+    assert created - altered == {'column verify_fp.items.name text'}
+    # migrations table changes with every run
+    assert not any(constants.MIGRATIONS_TABLE in line for line in created)
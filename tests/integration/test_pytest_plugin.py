@@ -0,0 +1,135 @@
+from pathlib import Path
+import typing as t
+from urllib.parse import urlsplit
+
+import asyncpg
+import pytest
+
+import asyncpg_migrate
+from asyncpg_migrate.engine import databases
+
+pytest_plugins = ['pytester']
+
+TESTS = """
+import asyncio
+
+import asyncpg
+
+
+def _fetchval(dsn, query):
+    async def _query():
+        connection = await asyncpg.connect(dsn=dsn)
+        try:
+            return await connection.fetchval(query)
+        finally:
+            await connection.close()
+
+    return asyncio.new_event_loop().run_until_complete(_query())
+
+
+def test_first(asyncpg_migrate_dsn):
+    assert _fetchval(asyncpg_migrate_dsn, 'select count(*) from items') == 0
+    _fetchval(asyncpg_migrate_dsn, 'insert into items values (1)')
+
+
+def test_second(asyncpg_migrate_dsn):
+    assert _fetchval(asyncpg_migrate_dsn, 'select count(*) from items') == 0
+
+
+def test_session(asyncpg_migrate_session_dsn, asyncpg_migrate_template):
+    revision = _fetchval(
+        asyncpg_migrate_session_dsn,
+        'select revision from public._migrations__revision',
+    )
+    assert revision == 2
+    assert asyncpg_migrate_template in asyncpg_migrate_session_dsn
+"""
+
+
+def _templates(db_name: str) -> str:
+    # LIKE pattern of templates the plugin names after configured database
+    return db_name[:20].replace('_', '\\_') + '\\_tpl\\_%'
+
+
+async def _template_oids(connection: asyncpg.Connection, db_name: str) -> t.List[int]:
+    records = await connection.fetch(
+        'select oid from pg_database where datname like $1 order by oid',
+        _templates(db_name),
+    )
+    return [record['oid'] for record in records]
+
+
+@pytest.mark.asyncio
+async def test_pytest_plugin(
+    pytester: t.Any,
+    monkeypatch: pytest.MonkeyPatch,
+    db_name: str,
+    db_dsn: str,
+    db_connection: asyncpg.Connection,
+) -> None:
+    # sessions run in subprocess that might not have the package installed
+    monkeypatch.setenv(
+        'PYTHONPATH',
+        str(Path(asyncpg_migrate.__file__).parent.parent),
+    )
+    parts = urlsplit(db_dsn)
+    pytester.makefile(
+        '.ini',
+        migrations='\n'.join([
+            '[migrations]',
+            'script_location = scripts',
+            f'db_user = {parts.username}',
+            f'db_password = {parts.password}',
+            f'db_host = {parts.hostname}',
+            f'db_port = {parts.port}',
+            f'db_name = {parts.path.lstrip("/")}',
+        ]),
+    )
+    scripts = pytester.mkdir('scripts')
+    for revision, statement in enumerate(
+        ['create table items (id integer)', 'create index on items (id)'],
+            start=1,
+    ):
+        (scripts / f'migration_{revision}.py').write_text(
+            '\n'.join([
+                f'revision = {revision}',
+                '',
+                'async def upgrade(c):',
+                f'    await c.execute({statement!r})',
+                '',
+                'async def downgrade(c):',
+                '    ...',
+            ]),
+        )
+    pytester.makepyfile(TESTS)
+
+    assert (await _template_oids(db_connection, db_name)) == []
+    try:
+        for _ in range(2):
+            result = pytester.runpytest_subprocess(
+                # plugin is loaded by module name whether installed or not
+                '-p',
+                'no:asyncpg_migrate',
+                '-p',
+                'asyncpg_migrate.pytest_plugin',
+                '-p',
+                'no:randomly',
+                '--rootdir',
+                str(pytester.path),
+            )
+            result.assert_outcomes(passed=3)
+            # template is migrated once and reused by the next session
+            assert len(await _template_oids(db_connection, db_name)) == 1
+
+        # copies are dropped at the end of each session
+        assert not await db_connection.fetchval(
+            'select count(*) from pg_database where datname like $1',
+            _templates(db_name) + '\\_%\\_%',
+        )
+    finally:
+        templates = await db_connection.fetch(
+            'select datname from pg_database where datname like $1',
+            _templates(db_name),
+        )
+        for record in templates:
+            await databases.drop(db_connection, record['datname'])
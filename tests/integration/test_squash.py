@@ -0,0 +1,147 @@
+from pathlib import Path
+import typing as t
+
+import asyncpg
+import pytest
+
+from asyncpg_migrate import loader
+from asyncpg_migrate import model
+from asyncpg_migrate import squash
+from asyncpg_migrate.engine import downgrade
+from asyncpg_migrate.engine import migration
+from asyncpg_migrate.engine import upgrade
+
+MIGRATION = """
+async def upgrade(c):
+    await c.execute('create table items_{revision} (id integer, name text)')
+    await c.execute('insert into items_{revision} values ($1, $2)', 1, "it's")
+    await c.execute('create index on items_{revision} (id)')
+
+async def downgrade(c):
+    await c.execute('drop table items_{revision}')
+"""
+
+NON_TRANSACTIONAL = """
+transactional = False
+
+async def upgrade(c):
+    await c.execute('create table items_{revision} (id integer, name text)')
+    await c.execute('insert into items_{revision} values ($1, $2)', 1, "it's")
+    await c.execute('create index concurrently on items_{revision} (id)')
+
+async def downgrade(c):
+    await c.execute('drop table items_{revision}')
+"""
+
+
+async def _tables(connection: asyncpg.Connection) -> int:
+    return int(
+        await connection.fetchval(
+            "select count(*) from pg_tables where tablename like 'items_%'",
+        ),
+    )
+
+
+@pytest.mark.parametrize('non_transactional', [0, 2])
+@pytest.mark.asyncio
+async def test_squash_fresh_database(
+    tmp_path: Path,
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+    non_transactional: int,
+) -> None:
+    config = config_with_scripts([
+        NON_TRANSACTIONAL if revision == non_transactional else MIGRATION
+        for revision in range(1, 5)
+    ])
+
+    path = await squash.run(config, 3)
+
+    assert path == tmp_path / 'baseline_3.py'
+    migrations = loader.load_migrations(config)
+    assert migrations.revisions() == [3, 4]
+    assert migrations[migrations.base].baseline
+    assert migrations[migrations.base].transactional is not non_transactional
+
+    assert (await upgrade.run(config, 'head', db_connection)) == 4
+    history = await migration.list(db_connection)
+    assert [(entry.revision, entry.label) for entry in history] == [
+        (3, 'baseline_3.py'),
+        (4, 'migration_4.py'),
+    ]
+    assert (await _tables(db_connection)) == 4
+    assert (await db_connection.fetchval('select name from items_1')) == "it's"
+
+    assert (await downgrade.run(config, 'base', db_connection)) == 0
+    assert (await _tables(db_connection)) == 0
+
+
+@pytest.mark.asyncio
+async def test_squash_database_past_baseline(
+    tmp_path: Path,
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts([MIGRATION] * 4)
+    assert (await upgrade.run(config, 'head', db_connection)) == 4
+
+    await squash.run(config, 3, delete_squashed=True)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'baseline_3.py',
+        'migration_4.py',
+    ]
+    assert (await upgrade.run(config, 'head', db_connection)) is None
+    assert (await downgrade.run(config, -1, db_connection)) == 3
+    for target in (1, 2):
+        with pytest.raises(ValueError, match='squashed into baseline'):
+            await downgrade.run(config, target, db_connection)
+    assert (await _tables(db_connection)) == 3
+    assert (await upgrade.run(config, 'head', db_connection)) == 4
+
+
+@pytest.mark.asyncio
+async def test_squash_database_before_baseline(
+    tmp_path: Path,
+    config_with_scripts: t.Callable[..., model.Config],
+    db_connection: asyncpg.Connection,
+) -> None:
+    config = config_with_scripts([MIGRATION] * 4)
+    assert (await upgrade.run(config, 1, db_connection)) == 1
+
+    await squash.run(config, 'head')
+
+    with pytest.raises(ValueError, match='squashed into baseline'):
+        await upgrade.run(config, 'head', db_connection)
+    with pytest.raises(ValueError, match='squashed into baseline'):
+        await downgrade.run(config, 'base', db_connection)
+    assert (await _tables(db_connection)) == 1
+    with pytest.raises(FileExistsError):
+        await squash.run(config, 'head')
+
+
+@pytest.mark.parametrize('step', ['upgrade', 'downgrade'])
+@pytest.mark.asyncio
+async def test_squash_reading_migration(
+    tmp_path: Path,
+    config_with_scripts: t.Callable[..., model.Config],
+    step: str,
+) -> None:
+    reading = """
+async def upgrade(c):
+    {upgrade}
+
+async def downgrade(c):
+    {downgrade}
+"""
+    config = config_with_scripts(
+        [MIGRATION, reading],
+        upgrade="await c.fetchval('select count(*) from items_1')"
+        if step == 'upgrade' else 'pass',
+        downgrade="await c.fetch('select id from items_1')"
+        if step == 'downgrade' else 'pass',
+    )
+
+    with pytest.raises(ValueError, match=f'2/migration_2.py reads .* in {step}'):
+        await squash.run(config, 'head')
+    assert not (tmp_path / 'baseline_2.py').exists()
@@ -1,6 +1,8 @@
+import dataclasses
 from pathlib import Path
 import typing as t
 
+import pytest
 import pytest_mock as ptm
 
 from asyncpg_migrate import model
@@ -35,3 +37,378 @@ def test_load_migrations(
 
     assert migrations
     assert len(migrations) == migrations_count
+
+
+def test_load_migrations_lazy(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+    mocker: ptm.MockFixture,
+) -> None:
+    from asyncpg_migrate import loader
+
+    config = config_with_migrations[1]
+    import_spy = mocker.spy(loader, 'load_python_module')
+
+    migrations = loader.load_migrations(config)
+    assert not import_spy.called
+
+    loader.import_migrations(migrations.slice(start=2, end=3))
+    imported = {c.args[0] for c in import_spy.call_args_list}
+    assert imported == {
+        migrations[model.Revision(2)].path,
+        migrations[model.Revision(3)].path,
+    }
+
+
+def test_load_migrations_dynamic_revision(tmp_path: Path) -> None:
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = int("1")',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    assert list(migrations) == [1]
+
+
+def test_import_migrations_missing_downgrade(tmp_path: Path) -> None:
+    from asyncpg_migrate import exceptions
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    with pytest.raises(exceptions.MigrationLoadError):
+        loader.import_migrations(migrations)
+
+
+def test_load_migrations_manifest_cache(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+    mocker: ptm.MockFixture,
+) -> None:
+    from asyncpg_migrate import loader
+
+    script_location, config, migrations_count = config_with_migrations
+    config = dataclasses.replace(config, manifest_cache=True)
+    manifest_path = loader.manifest_path(config)
+
+    assert not manifest_path.exists()
+    cold_migrations = loader.load_migrations(config)
+    assert manifest_path.exists()
+
+    read_spy = mocker.spy(Path, 'read_bytes')
+    warm_migrations = loader.load_migrations(config)
+    assert not read_spy.called
+    assert cold_migrations.revisions() == warm_migrations.revisions()
+
+    changed_script = script_location / 'migration_0.py'
+    changed_script.write_text(changed_script.read_text() + '\n# changed\n')
+    loader.load_migrations(config)
+    assert read_spy.call_count == 1
+    assert read_spy.call_args.args[0] == changed_script
+
+    assert len(loader.load_manifest(config)) == migrations_count
+
+
+def test_load_migrations_without_manifest_cache(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+    mocker: ptm.MockFixture,
+) -> None:
+    from asyncpg_migrate import loader
+
+    _, config, migrations_count = config_with_migrations
+    sha256_spy = mocker.patch.object(
+        loader.hashlib,
+        'sha256',
+        wraps=loader.hashlib.sha256,
+    )
+
+    assert len(loader.load_migrations(config)) == migrations_count
+    # scripts are hashed only for the manifest
+    assert not sha256_spy.called
+    assert not loader.manifest_path(config).exists()
+
+
+def test_load_migrations_manifest_corrupted(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+) -> None:
+    from asyncpg_migrate import loader
+
+    _, config, migrations_count = config_with_migrations
+    config = dataclasses.replace(config, manifest_cache=True)
+    loader.manifest_path(config).write_text('{')
+
+    assert len(loader.load_migrations(config)) == migrations_count
+    assert len(loader.load_manifest(config)) == migrations_count
+
+
+@pytest.mark.parametrize(
+    'declaration,transactional',
+    [
+        ('', True),
+        ('transactional = True', True),
+        ('transactional = False', False),
+        ('transactional: bool = False  # concurrent index', False),
+    ],
+)
+def test_load_migrations_transactional(
+    tmp_path: Path,
+    declaration: str,
+    transactional: bool,
+) -> None:
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            declaration,
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    assert migrations[model.Revision(1)].transactional is transactional
+    loader.import_migrations(migrations)
+
+
+def test_import_migrations_dynamic_transactional(tmp_path: Path) -> None:
+    from asyncpg_migrate import exceptions
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            'transactional = bool(0)',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    with pytest.raises(exceptions.MigrationLoadError):
+        loader.import_migrations(migrations)
+
+
+def test_import_migrations_revision_mismatch(tmp_path: Path) -> None:
+    from asyncpg_migrate import exceptions
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            '"""Replaces',
+            'revision = 3',
+            '"""',
+            'revision = 1',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    assert migrations.revisions() == [3]
+    with pytest.raises(exceptions.MigrationLoadError, match='revision=1'):
+        loader.import_migrations(migrations)
+
+
+def test_migrations_hash(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+) -> None:
+    from asyncpg_migrate import loader
+
+    script_location, config, _ = config_with_migrations
+    cached_config = dataclasses.replace(config, manifest_cache=True)
+
+    migrations_hash = loader.migrations_hash(config)
+    assert loader.migrations_hash(config) == migrations_hash
+    assert loader.migrations_hash(cached_config) == migrations_hash
+
+    changed_script = script_location / 'migration_0.py'
+    changed_script.write_text(changed_script.read_text() + '\n# changed\n')
+    assert loader.migrations_hash(config) != migrations_hash
+    assert loader.migrations_hash(cached_config) == loader.migrations_hash(config)
+
+
+@pytest.mark.parametrize('manifest_cache', [False, True])
+def test_load_migrations_baseline(
+    config_with_migrations: t.Tuple[Path, model.Config, int],
+    manifest_cache: bool,
+) -> None:
+    from asyncpg_migrate import loader
+
+    script_location, config, migrations_count = config_with_migrations
+    config = dataclasses.replace(config, manifest_cache=manifest_cache)
+    for revision in (3, 6):
+        (script_location / f'baseline_{revision}.py').write_text(
+            '\n'.join([
+                f'revision = {revision}',
+                'baseline = True',
+                '',
+                'async def upgrade(c):',
+                '    ...',
+                '',
+                'async def downgrade(c):',
+                '    ...',
+            ]),
+        )
+
+    for _ in range(2):
+        migrations = loader.load_migrations(config)
+
+        assert migrations.revisions() == list(range(6, migrations_count + 1))
+        assert migrations.base == 6
+        assert migrations[migrations.base].baseline
+        assert migrations[migrations.base].label == 'baseline_6.py'
+        assert not migrations[migrations.head].baseline
+        loader.import_migrations(migrations)
+
+
+def test_import_migrations_dynamic_baseline(tmp_path: Path) -> None:
+    from asyncpg_migrate import exceptions
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            'baseline = not False',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    assert not migrations[model.Revision(1)].baseline
+    with pytest.raises(exceptions.MigrationLoadError):
+        loader.import_migrations(migrations)
+
+
+def test_load_configuration_options(tmp_path: Path) -> None:
+    from asyncpg_migrate import loader
+
+    cf = tmp_path / 'migrations.ini'
+    cf.write_text(
+        '\n'.join([
+            '[migrations]',
+            f'script_location = {tmp_path}',
+            'db_user = test',
+            'db_password = test',
+            'db_host = test',
+            'db_port = 5432',
+            'db_name = test',
+            'lock_timeout = 2',
+            'statement_timeout = 60',
+            'lock_retries = 5',
+            'hooks = tracing:span, metrics:record',
+            'metrics_textfile = /var/lib/node_exporter/aiomig.prom',
+            'measure_wal = yes',
+        ]),
+    )
+
+    config = loader.load_configuration(cf)
+    assert config.timeouts == model.Timeouts(
+        lock_timeout=2.0,
+        statement_timeout=60.0,
+        lock_retries=5,
+        lock_retry_delay=0.5,
+    )
+    assert config.hooks == ('tracing:span', 'metrics:record')
+    assert config.metrics_textfile == Path('/var/lib/node_exporter/aiomig.prom')
+    assert config.metrics_push_url is None
+    assert config.measure_wal
+
+
+def test_migration_timeouts(tmp_path: Path) -> None:
+    from asyncpg_migrate import loader
+
+    (tmp_path / 'migration.py').write_text(
+        '\n'.join([
+            'revision = 1',
+            'lock_timeout = 0.5',
+            '',
+            'async def upgrade(c):',
+            '    ...',
+            '',
+            'async def downgrade(c):',
+            '    ...',
+        ]),
+    )
+
+    migrations = loader.load_migrations(
+        model.Config(
+            script_location=tmp_path,
+            database_name='test',
+            database_dsn='test',
+        ),
+    )
+    timeouts = loader.migration_timeouts(
+        migrations[model.Revision(1)],
+        model.Timeouts(lock_timeout=3, statement_timeout=10),
+    )
+
+    assert timeouts == model.Timeouts(lock_timeout=0.5, statement_timeout=10)
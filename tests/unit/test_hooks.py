@@ -0,0 +1,83 @@
+from pathlib import Path
+import typing as t
+
+import pytest
+import pytest_mock as ptm
+
+from asyncpg_migrate import hooks
+from asyncpg_migrate import model
+
+
+async def recording_hook(event: model.Event) -> None:
+    ...
+
+
+@pytest.mark.parametrize(
+    'spec,expected',
+    [
+        ('asyncio:sleep', True),
+        ('foo', ValueError),
+        (':foo', ValueError),
+        ('asyncio:not_there', ValueError),
+        ('asyncio:__name__', ValueError),
+        ('not_a_module_at_all:foo', ImportError),
+    ],
+)
+def test_from_spec(spec: str, expected: object) -> None:
+    if expected is True:
+        assert callable(hooks.from_spec(spec))
+    else:
+        with pytest.raises(expected):  # type: ignore
+            hooks.from_spec(spec)
+
+
+def test_resolve(mocker: ptm.MockFixture) -> None:
+    registered = mocker.stub()
+    given = mocker.stub()
+    config = model.Config(
+        script_location=Path.cwd(),
+        database_dsn='test',
+        database_name='test',
+        hooks=(f'{__name__}:recording_hook', ),
+    )
+
+    hooks.register(registered)
+    try:
+        assert hooks.resolve(config, [given]) == (registered, recording_hook, given)
+    finally:
+        hooks.unregister(registered)
+
+    assert hooks.resolve(config) == (recording_hook, )
+
+
+@pytest.mark.asyncio
+async def test_emitter(mocker: ptm.MockFixture) -> None:
+    events: t.List[model.Event] = []
+
+    async def _failing_hook(event: model.Event) -> None:
+        raise ValueError('hook is broken')
+
+    async def _hook(event: model.Event) -> None:
+        events.append(event)
+
+    connection = mocker.stub()
+    error = RuntimeError('migration is broken')
+
+    emitter = hooks.Emitter([_failing_hook, _hook], model.MigrationDir.UP, connection)
+    with pytest.raises(RuntimeError):
+        async with emitter:
+            emitter.revision = model.Revision(1)
+            await emitter.emit(model.EventType.BEFORE_PLAN)
+            raise error
+
+    assert [e.type for e in events] == [
+        model.EventType.BEFORE_PLAN,
+        model.EventType.ON_ERROR,
+        model.EventType.AFTER_RUN,
+    ]
+    assert all(e.connection is connection for e in events)
+    assert all(e.direction == model.MigrationDir.UP for e in events)
+    assert events[1].error is error
+    assert events[2].error is error
+    assert events[2].revision == 1
+    assert events[2].duration is not None
@@ -0,0 +1,136 @@
+import dataclasses
+import datetime as dt
+from pathlib import Path
+
+import pytest
+import pytest_mock as ptm
+
+from asyncpg_migrate import metrics
+from asyncpg_migrate import model
+
+
+def _event(event_type: model.EventType, **kwargs: object) -> model.Event:
+    return model.Event(
+        type=event_type,
+        direction=model.MigrationDir.UP,
+        connection=None,
+        **kwargs,  # type: ignore
+    )
+
+
+@pytest.mark.asyncio
+async def test_exporter_textfile(tmp_path: Path) -> None:
+    textfile = tmp_path / 'aiomig.prom'
+    exporter = metrics.Exporter(textfile=textfile, labels={'database': 'te"st'})
+
+    lock_wait = dt.timedelta(seconds=0.5)
+    await exporter(_event(model.EventType.BEFORE_PLAN, duration=lock_wait))
+    for revision in (1, 2):
+        await exporter(
+            _event(
+                model.EventType.AFTER_MIGRATION,
+                revision=model.Revision(revision),
+                duration=dt.timedelta(seconds=revision),
+                wal_bytes=1024 * revision,
+            ),
+        )
+    await exporter(
+        _event(
+            model.EventType.AFTER_RUN,
+            revision=model.Revision(2),
+            duration=dt.timedelta(seconds=4),
+        ),
+    )
+
+    lines = textfile.read_text().splitlines()
+    assert lines[-1] == '# EOF'
+    assert '# TYPE asyncpg_migrate_migrations_applied counter' in lines
+    assert (
+        'asyncpg_migrate_migrations_applied_total'
+        '{database="te\\"st",direction="UP"} 2'
+    ) in lines
+    assert (
+        'asyncpg_migrate_migration_duration_seconds'
+        '{database="te\\"st",direction="UP",revision="2"} 2.0'
+    ) in lines
+    assert (
+        'asyncpg_migrate_migration_wal_bytes'
+        '{database="te\\"st",direction="UP",revision="1"} 1024'
+    ) in lines
+    assert 'asyncpg_migrate_revision{database="te\\"st"} 2' in lines
+    assert (
+        'asyncpg_migrate_run_duration_seconds'
+        '{database="te\\"st",direction="UP"} 4.0'
+    ) in lines
+    assert not any(line.startswith('asyncpg_migrate_failures_total') for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_exporter_push(mocker: ptm.MockFixture) -> None:
+    urlopen_patch = mocker.patch('urllib.request.OpenerDirector.open')
+    exporter = metrics.Exporter(push_url='http://localhost:9091/metrics/job/aiomig')
+
+    await exporter(_event(model.EventType.ON_ERROR, error=RuntimeError()))
+    await exporter(_event(model.EventType.AFTER_RUN))
+
+    request = urlopen_patch.call_args.args[0]
+    assert request.method == 'PUT'
+    assert request.full_url == 'http://localhost:9091/metrics/job/aiomig'
+    assert request.get_header('Content-type') == metrics.CONTENT_TYPE
+    assert b'asyncpg_migrate_failures_total{direction="UP"} 1' in request.data
+
+
+@pytest.mark.parametrize(
+    'push_url',
+    [
+        'file:///etc/passwd',
+        'ftp://localhost/metrics',
+        'localhost:9091/metrics/job/aiomig',
+    ],
+)
+def test_exporter_push_url(push_url: str) -> None:
+    with pytest.raises(ValueError, match='http'):
+        metrics.Exporter(push_url=push_url)
+
+
+def test_from_config(tmp_path: Path) -> None:
+    config = model.Config(
+        script_location=tmp_path,
+        database_dsn='test',
+        database_name='test',
+    )
+    assert metrics.from_config(config) is None
+
+    config = dataclasses.replace(config, metrics_textfile=tmp_path / 'aiomig.prom')
+    exporter = metrics.from_config(config)
+    assert exporter is not None
+    # counters are kept across runs
+    assert metrics.from_config(config) is exporter
+
+
+@pytest.mark.asyncio
+async def test_hook_targets(tmp_path: Path) -> None:
+    config = model.Config(
+        script_location=tmp_path,
+        database_dsn='test',
+        database_name='test',
+        metrics_textfile=tmp_path / 'aiomig.prom',
+    )
+    targets = [
+        (config, '"tenant_a"', 2),
+        (config, '"tenant ""b"""', 3),
+        (dataclasses.replace(config, database_name='other'), 'public', 4),
+    ]
+
+    for target_config, table_schema, revision in targets:
+        hook = metrics.hook(target_config, table_schema)
+        assert hook is not None
+        await hook(_event(model.EventType.AFTER_RUN, revision=revision))
+
+    lines = (tmp_path / 'aiomig.prom').read_text().splitlines()
+    # every target keeps own samples in the shared textfile
+    assert [line for line in lines if line.startswith('asyncpg_migrate_revision')] == [
+        'asyncpg_migrate_revision{database="other",schema="public"} 4',
+        'asyncpg_migrate_revision{database="test",schema="tenant \\"b\\""} 3',
+        'asyncpg_migrate_revision{database="test",schema="tenant_a"} 2',
+    ]
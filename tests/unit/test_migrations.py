@@ -0,0 +1,160 @@
+import typing as t
+
+import pytest
+import pytest_mock as ptm
+
+from asyncpg_migrate import model
+
+
+@pytest.fixture()
+def migrations(mocker: ptm.MockFixture) -> model.Migrations:
+    all_migrations = model.Migrations()
+    for rev in (5, 1, 9, 2, 7):
+        revision = model.Revision(rev)
+        all_migrations[revision] = model.Migration(
+            revision=revision,
+            label=f'migration_{rev}.py',
+            path=mocker.stub(),
+            upgrade=mocker.stub(),
+            downgrade=mocker.stub(),
+        )
+    return all_migrations
+
+
+def test_migrations_sorted(migrations: model.Migrations) -> None:
+    assert migrations.revisions() == [1, 2, 5, 7, 9]
+    assert list(migrations) == [1, 2, 5, 7, 9]
+    assert [m.revision for m in migrations.upgrade_iterator()] == [1, 2, 5, 7, 9]
+    assert [m.revision for m in migrations.downgrade_iterator()] == [9, 7, 5, 2, 1]
+    assert (migrations.base, migrations.head) == (1, 9)
+    assert len(migrations) == 5
+    assert 5 in migrations
+    assert 3 not in migrations
+
+
+@pytest.mark.parametrize(
+    'start,end,expected',
+    [
+        (1, None, [1, 2, 5, 7, 9]),
+        (1, 9, [1, 2, 5, 7, 9]),
+        (3, 7, [5, 7]),
+        (2, 6, [2, 5]),
+        (3, 4, []),
+        (10, None, []),
+        (9, 9, [9]),
+        (0, 1, [1]),
+        (5, 2, ValueError),
+    ],
+)
+def test_migrations_slice(
+    migrations: model.Migrations,
+    start: int,
+    end: t.Optional[int],
+    expected: t.Union[t.List[int], t.Type[Exception]],
+) -> None:
+    if isinstance(expected, list):
+        sliced = migrations.slice(start=start, end=end)
+        assert sliced.revisions() == expected
+        assert list(sliced) == expected
+        assert all(sliced[rev] is migrations[rev] for rev in sliced)
+    else:
+        with pytest.raises(expected):
+            migrations.slice(start=start, end=end)
+
+
+@pytest.mark.parametrize(
+    'revision,steps,expected',
+    [
+        (9, 1, 7),
+        (9, 2, 5),
+        (2, 1, 1),
+        (1, 1, 0),
+        (10, 1, 9),
+        (10, 3, 5),
+        (6, 1, 5),
+        (9, 10, 0),
+    ],
+)
+def test_migrations_previous(
+    migrations: model.Migrations,
+    revision: int,
+    steps: int,
+    expected: int,
+) -> None:
+    assert migrations.previous(revision, steps=steps) == expected
+
+
+def test_revision_decode_registry(migrations: model.Migrations) -> None:
+    assert model.Revision.decode('head', migrations.revisions()) == 9
+    assert model.Revision.decode('base', migrations.revisions()) == 1
+
+
+def test_migrations_view(migrations: model.Migrations) -> None:
+    view = migrations.slice(start=2, end=7)
+
+    assert isinstance(view, model.MigrationsView)
+    assert not isinstance(view, model.Migrations)
+    assert (view.base, view.head) == (2, 7)
+    assert list(reversed(view)) == [7, 5, 2]
+    assert [m.revision for m in view.downgrade_iterator()] == [7, 5, 2]
+    assert 1 not in view
+    assert 9 not in view
+    with pytest.raises(KeyError):
+        view[model.Revision(9)]
+
+    assert view.slice(start=3).revisions() == [5, 7]
+    assert view.slice(start=0, end=2).revisions() == [2]
+    assert view.previous(5) == 2
+    assert view.previous(2) == 0
+
+    empty_view = view.slice(start=3, end=4)
+    assert not empty_view
+    assert 5 not in empty_view
+    assert list(empty_view.upgrade_iterator()) == []
+
+
+def test_slotted_models(mocker: ptm.MockFixture) -> None:
+    import copy
+    import datetime as dt
+
+    entry = model.MigrationHistoryEntry(
+        revision=model.Revision(1),
+        timestamp=model.Timestamp(dt.datetime.today()),
+        direction=model.MigrationDir.UP,
+        label='migration_1.py',
+    )
+    migration = model.Migration(
+        revision=model.Revision(1),
+        label='migration_1.py',
+        path=mocker.stub(),
+        upgrade=mocker.stub(),
+        downgrade=mocker.stub(),
+    )
+
+    for obj in (entry, migration):
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.label = 'foo'  # type: ignore
+
+    # copy goes through __reduce_ex__ just like pickle does
+    assert copy.deepcopy(entry) == entry
+    assert hash(copy.copy(entry)) == hash(entry)
+
+
+@pytest.mark.parametrize('direction', ['upgrade', 'downgrade'])
+@pytest.mark.asyncio
+async def test_run_unknown_option(mocker: ptm.MockFixture, direction: str) -> None:
+    from asyncpg_migrate.engine import downgrade
+    from asyncpg_migrate.engine import upgrade
+
+    engine_run = upgrade.run if direction == 'upgrade' else downgrade.run
+    connection = mocker.Mock()
+
+    with pytest.raises(TypeError, match='lock_mod'):
+        await engine_run(
+            mocker.stub(),
+            'head',
+            connection,
+            lock_mod=model.LockMode.TRY,
+        )
+    assert not connection.method_calls
@@ -0,0 +1,63 @@
+import datetime as dt
+import typing as t
+
+import pytest
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import offline
+
+
+@pytest.mark.parametrize(
+    'value,expected',
+    [
+        (None, 'null'),
+        (True, 'true'),
+        (12, '12'),
+        (1.5, '1.5'),
+        ("it's", "'it''s'"),
+        (model.MigrationDir.UP, "'UP'"),
+        (dt.date(2020, 1, 2), "'2020-01-02'"),
+        (dt.timedelta(milliseconds=1500), "interval '1.5 seconds'"),
+        (b'\x00\xff', "'\\x00ff'::bytea"),
+        ([1, 'a'], "array[1, 'a']"),
+        (offline.Raw('now()'), 'now()'),
+    ],
+)
+def test_literal(value: t.Any, expected: str) -> None:
+    assert offline.literal(value) == expected
+
+
+def test_literal_unknown_type() -> None:
+    with pytest.raises(TypeError):
+        offline.literal(object())
+
+
+@pytest.mark.asyncio
+async def test_recording_connection() -> None:
+    connection = offline.RecordingConnection()
+
+    assert (await connection.execute('create table t (a int, b text)')) == ''
+    await connection.executemany(
+        'insert into t values ($1, $2)',
+        [(1, 'a'), (2, None)],
+    )
+    assert (await connection.fetchval('select $1::int', 10)) is None
+    assert (await connection.fetch('select * from t;')) == []
+    async with connection.transaction():
+        await connection.execute(
+            """
+            update t set b = $2
+            where a = $1 and b <> '$1'
+            """,
+            1,
+            '$2',
+        )
+
+    assert connection.statements == [
+        'create table t (a int, b text);',
+        "insert into t values (1, 'a');",
+        'insert into t values (2, null);',
+        'select 10::int;',
+        'select * from t;',
+        "update t set b = '$2'\nwhere a = 1 and b <> '$1';",
+    ]
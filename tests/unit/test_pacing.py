@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+import pytest_mock as ptm
+
+from asyncpg_migrate import model
+from asyncpg_migrate.engine import pacing
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('seconds', [0, 0.5, 10])
+async def test_fixed_delay(mocker: ptm.MockFixture, seconds: float) -> None:
+    sleep_patch = mocker.patch(
+        'asyncio.sleep',
+        side_effect=asyncio.coroutine(lambda *args, **kwargs: None),
+    )
+
+    await pacing.fixed_delay(seconds)(mocker.stub(), model.MigrationDir.UP)
+
+    sleep_patch.assert_called_once_with(seconds)
+
+
+def test_fixed_delay_negative() -> None:
+    with pytest.raises(ValueError):
+        pacing.fixed_delay(-1)
+
+
+@pytest.mark.parametrize(
+    'spec,expected',
+    [
+        ('1', True),
+        ('0.25', True),
+        ('asyncio:sleep', True),
+        ('-1', ValueError),
+        ('foo', ValueError),
+        ('asyncio:not_there', ValueError),
+        ('asyncio:__name__', ValueError),
+        ('not_a_module_at_all:foo', ImportError),
+    ],
+)
+def test_from_spec(spec: str, expected: object) -> None:
+    if expected is True:
+        assert callable(pacing.from_spec(spec))
+    else:
+        with pytest.raises(expected):  # type: ignore
+            pacing.from_spec(spec)